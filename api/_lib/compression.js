@@ -0,0 +1,47 @@
+import { gunzipSync, gzipSync } from 'zlib';
+
+// At-rest format for task results. Set RESULT_COMPRESSION=gzip to store new
+// results gzipped (base64, since the Upstash REST API carries strings) with a
+// `resultEncoding` marker; results without a marker are plain text.
+export const RESULT_COMPRESSION = process.env.RESULT_COMPRESSION || '';
+export const GZIP_BASE64 = 'gzip+base64';
+
+// Results shorter than this are stored raw; gzip overhead outweighs the gain
+const MIN_COMPRESS_BYTES = 1024;
+
+// Hash fields for storing `result`, compressed when enabled
+export function encodeResult(result) {
+  if (!result) {
+    return { result: null, resultEncoding: null };
+  }
+  if (RESULT_COMPRESSION === 'gzip' && Buffer.byteLength(result) >= MIN_COMPRESS_BYTES) {
+    return { result: gzipSync(result).toString('base64'), resultEncoding: GZIP_BASE64 };
+  }
+  return { result, resultEncoding: null };
+}
+
+// Plain-text result of a task hash, whichever format it was stored in
+export function decodeResult(task) {
+  if (!task || !task.result) {
+    return null;
+  }
+  if (task.resultEncoding === GZIP_BASE64) {
+    return gunzipSync(Buffer.from(task.result, 'base64')).toString('utf8');
+  }
+  return task.result;
+}
+
+// JSON request body, inflating it first when the client sent
+// `Content-Encoding: gzip`. Must run before anything touches `req.body`,
+// which would otherwise consume the raw stream as uncompressed JSON.
+export async function readJsonBody(req) {
+  const encoding = (req.headers['content-encoding'] || '').toLowerCase();
+  if (encoding !== 'gzip') {
+    return req.body || {};
+  }
+  const chunks = [];
+  for await (const chunk of req) {
+    chunks.push(chunk);
+  }
+  return JSON.parse(gunzipSync(Buffer.concat(chunks)).toString('utf8'));
+}
@@ -0,0 +1,39 @@
+import { redis } from './redis.js';
+import { TASK_TTL_SECONDS } from './video.js';
+
+// Upper bound on segments accepted by a single append call
+export const MAX_APPEND_SEGMENTS = 200;
+
+// Redis list holding the transcript segments streamed so far for a task
+export function segmentsKey(taskId) {
+  return `${taskId}:segments`;
+}
+
+// Append segments only while the task is leased to this worker, so a worker
+// that lost its lease cannot interleave output with the new holder.
+// KEYS: task hash, segments list; ARGV: worker ID, ttl seconds, segments...
+// Returns the new list length, or -1 when the task is not held by the worker
+const APPEND_SCRIPT = `
+if redis.call('HGET', KEYS[1], 'status') ~= 'processing' then
+  return -1
+end
+if ARGV[1] ~= '' and redis.call('HGET', KEYS[1], 'workerId') ~= ARGV[1] then
+  return -1
+end
+local length = redis.call('RPUSH', KEYS[2], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return length
+`;
+
+export async function appendSegments(taskId, workerId, segments) {
+  return redis.eval(
+    APPEND_SCRIPT,
+    [taskId, segmentsKey(taskId)],
+    [workerId || '', String(TASK_TTL_SECONDS), ...segments.map(String)],
+  );
+}
+
+// Segments from index `from` onwards
+export async function readSegments(taskId, from = 0) {
+  return (await redis.lrange(segmentsKey(taskId), Math.max(0, from), -1)) || [];
+}
@@ -0,0 +1,601 @@
+import { redis, pairsToObject } from './redis.js';
+import { decodeResult, encodeResult } from './compression.js';
+import { segmentsKey } from './partial.js';
+import {
+  ANONYMOUS_SUBMITTER,
+  DEFAULT_PRIORITY,
+  PRIORITIES,
+  classQueueKey,
+  queueScore,
+  submitterQueueKey,
+} from './scheduling.js';
+import { TASK_TTL_SECONDS, activeTaskKey, extractPart } from './video.js';
+
+// FIFO list used before priority classes; still drained first on lease so
+// tasks queued by an older deployment are not stranded
+export const PENDING_QUEUE = 'pending_tasks';
+
+// Upper bound on tasks handed out by a single lease call
+export const MAX_LEASE_BATCH = 50;
+
+// Longest a lease request may be held open; keep below the function timeout
+export const MAX_WAIT_SECONDS = parseInt(process.env.LONG_POLL_MAX_SECONDS || '25', 10);
+
+export const PROCESSING_SET = 'processing_tasks';
+
+// Every queued task with the time (seconds) it entered the queue, so the age
+// of the oldest pending task is a single ZRANGE
+export const PENDING_SINCE_SET = 'pending_since';
+
+// A leased task must be heartbeated within this many seconds or it is re-queued
+export const LEASE_SECONDS = parseInt(process.env.LEASE_SECONDS || '120', 10);
+
+// Leases handed out before a task is given up on and marked failed
+export const MAX_ATTEMPTS = parseInt(process.env.MAX_ATTEMPTS || '3', 10);
+
+// Completed tasks per result source (subtitles / asr / cache)
+export const RESULT_SOURCES_KEY = 'stats:result_sources';
+export const RESULT_SOURCES = ['subtitles', 'asr', 'cache'];
+
+// Extra renderings of the transcript a worker may upload with its result
+// (`txt` is the result itself). Each is stored in the task hash as
+// `output:<format>`, encoded like the result, and the hash field `outputs`
+// lists the formats present.
+export const OUTPUT_FORMATS = ['srt', 'vtt', 'json'];
+
+export function outputField(format) {
+  return `output:${format}`;
+}
+
+// Upper bound on child tasks a single expansion may create
+export const MAX_CHILDREN = parseInt(process.env.MAX_CHILD_TASKS || '500', 10);
+
+// Ordered child task IDs of an expanded parent task
+export function childrenKey(taskId) {
+  return `${taskId}:children`;
+}
+
+// Lua helper: count a finished child towards its parent.
+// Returns the parent ID once its last child has finished, otherwise false.
+const CHILD_DONE_LUA = `
+local function child_done(id)
+  local parent = redis.call('HGET', id, 'parentId')
+  if not parent then
+    return false
+  end
+  local done = redis.call('HINCRBY', parent, 'childrenDone', 1)
+  if done == tonumber(redis.call('HGET', parent, 'childCount') or '-1') then
+    return parent
+  end
+  return false
+end
+`;
+
+// Lua helpers for the in-flight task index (see activeTaskKey).
+// claim_active registers `id` under `key` and returns false, unless a live
+// task is already registered there, in which case that task's ID is returned.
+// release_active drops the entry once the task it points to has finished.
+const ACTIVE_INDEX_LUA = `
+local ACTIVE_STATUSES = {pending = true, processing = true, waiting_children = true, aggregating = true}
+
+local function claim_active(key, id, ttl)
+  local existing = redis.call('GET', key)
+  if existing and existing ~= id and ACTIVE_STATUSES[redis.call('HGET', existing, 'status')] then
+    return existing
+  end
+  redis.call('SET', key, id, 'EX', ttl)
+  redis.call('HSET', id, 'activeKey', key)
+  return false
+end
+
+local function release_active(id)
+  local key = redis.call('HGET', id, 'activeKey')
+  if key and redis.call('GET', key) == id then
+    redis.call('DEL', key)
+  end
+end
+`;
+
+// Lua helpers for the fair queue (see scheduling.js). A submitter is in its
+// class ring exactly while its sorted set is non-empty.
+// push_task queues a task under the priority, submitter and queueScore
+// stored on its hash and notes when it was queued in pending_since;
+// pop_task takes the next task in priority order,
+// rotating through the submitters of a class, and returns false when
+// nothing is queued. unqueue_task drops a task that finished while queued
+// (a late report after its lease was reaped) and takes its submitter out of
+// the ring once the sorted set is empty, so the next push_task does not
+// add the submitter a second time.
+// Popped IDs may be stale (hash expired, or finished while queued), so
+// callers check the task's status before using one.
+const FAIR_QUEUE_LUA = `
+local PRIORITIES = {${PRIORITIES.map((p) => `'${p}'`).join(', ')}}
+
+local function push_task(id, now_seconds)
+  local info = redis.call('HMGET', id, 'priority', 'submitter', 'queueScore')
+  local priority = info[1] or '${DEFAULT_PRIORITY}'
+  local submitter = info[2] or '${ANONYMOUS_SUBMITTER}'
+  local queue = 'pending:' .. priority .. ':' .. submitter
+  if redis.call('ZADD', queue, info[3] or now_seconds, id) == 1 and redis.call('ZCARD', queue) == 1 then
+    redis.call('RPUSH', 'pending:' .. priority, submitter)
+  end
+  redis.call('ZADD', '${PENDING_SINCE_SET}', now_seconds, id)
+end
+
+local function unqueue_task(id)
+  local info = redis.call('HMGET', id, 'priority', 'submitter')
+  local ring = 'pending:' .. (info[1] or '${DEFAULT_PRIORITY}')
+  local submitter = info[2] or '${ANONYMOUS_SUBMITTER}'
+  local queue = ring .. ':' .. submitter
+  if redis.call('ZREM', queue, id) == 1 and redis.call('ZCARD', queue) == 0 then
+    redis.call('LREM', ring, 0, submitter)
+  end
+  redis.call('ZREM', '${PENDING_SINCE_SET}', id)
+end
+
+local function pop_task()
+  for _, priority in ipairs(PRIORITIES) do
+    local ring = 'pending:' .. priority
+    local submitter = redis.call('LPOP', ring)
+    while submitter do
+      local queue = ring .. ':' .. submitter
+      local popped = redis.call('ZPOPMIN', queue)
+      if redis.call('ZCARD', queue) > 0 then
+        redis.call('RPUSH', ring, submitter)
+      end
+      if popped[1] then
+        redis.call('ZREM', '${PENDING_SINCE_SET}', popped[1])
+        return popped[1]
+      end
+      submitter = redis.call('LPOP', ring)
+    end
+  end
+  return false
+end
+`;
+
+// Reap expired leases (dropping any partial output) unless ARGV[7] is '0',
+// then pop up to ARGV[1] task IDs and lease them. Stale IDs are dropped
+// without being leased, and at most ARGV[1] + 100 are popped per call.
+// KEYS: legacy pending list, processing zset (score = lease expiry in ms)
+// ARGV: count, now ISO, worker ID, now ms, lease ms, max attempts, reap ('1' / '0')
+// Returns {[[taskId, [field, value, ...]], ...], [parent IDs whose last child was reaped as failed]}
+const LEASE_SCRIPT = `
+${CHILD_DONE_LUA}
+${ACTIVE_INDEX_LUA}
+${FAIR_QUEUE_LUA}
+local now = tonumber(ARGV[4])
+local ready = {}
+if ARGV[7] ~= '0' then
+  local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, 100)
+  for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], id)
+    if redis.call('HGET', id, 'status') == 'processing' then
+      local attempts = tonumber(redis.call('HGET', id, 'attempts') or '0')
+      if attempts >= tonumber(ARGV[6]) then
+        redis.call('HSET', id, 'status', 'failed', 'error', 'Lease expired after ' .. attempts .. ' attempts', 'completedAt', ARGV[2])
+        release_active(id)
+        local parent = child_done(id)
+        if parent then
+          table.insert(ready, parent)
+        end
+      else
+        redis.call('HSET', id, 'status', 'pending')
+        redis.call('DEL', id .. ':segments')
+        push_task(id, now / 1000)
+      end
+    end
+  end
+end
+
+local leased = {}
+local count = tonumber(ARGV[1])
+local popped = 0
+while #leased < count and popped < count + 100 do
+  local id = redis.call('RPOP', KEYS[1]) or pop_task()
+  if not id then break end
+  popped = popped + 1
+  if redis.call('HGET', id, 'status') == 'pending' then
+    redis.call('HSET', id, 'status', 'processing', 'processingStartedAt', ARGV[2], 'workerId', ARGV[3])
+    redis.call('HINCRBY', id, 'attempts', 1)
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[5]), id)
+    table.insert(leased, {id, redis.call('HGETALL', id)})
+  end
+end
+return {leased, ready}
+`;
+
+// Extend the leases of tasks still held by this worker.
+// KEYS: processing zset; ARGV: new expiry ms, worker ID, task IDs...
+// Returns the IDs whose lease was extended
+const HEARTBEAT_SCRIPT = `
+local extended = {}
+for i = 3, #ARGV do
+  local id = ARGV[i]
+  if redis.call('ZSCORE', KEYS[1], id) and redis.call('HGET', id, 'workerId') == ARGV[2] then
+    redis.call('ZADD', KEYS[1], ARGV[1], id)
+    table.insert(extended, id)
+  end
+end
+return extended
+`;
+
+// Lease up to `max` pending tasks in one round-trip, re-queueing expired leases
+// first unless `reap` is false
+export async function leaseTasks(max, workerId, { reap = true } = {}) {
+  const count = Math.max(1, Math.min(MAX_LEASE_BATCH, max | 0));
+  const now = Date.now();
+  const [leased, ready] = await redis.eval(
+    LEASE_SCRIPT,
+    [PENDING_QUEUE, PROCESSING_SET],
+    [
+      String(count),
+      new Date(now).toISOString(),
+      workerId || '',
+      String(now),
+      String(LEASE_SECONDS * 1000),
+      String(MAX_ATTEMPTS),
+      reap ? '1' : '0',
+    ],
+  );
+  for (const parentId of ready || []) {
+    await finalizeParent(parentId);
+  }
+  return (leased || []).map(([taskId, fields]) => ({ taskId, ...pairsToObject(fields) }));
+}
+
+// Push lease expiry forward for tasks the worker is still processing
+export async function heartbeatTasks(taskIds, workerId) {
+  if (taskIds.length === 0) {
+    return [];
+  }
+  const extended = await redis.eval(
+    HEARTBEAT_SCRIPT,
+    [PROCESSING_SET],
+    [String(Date.now() + LEASE_SECONDS * 1000), workerId || '', ...taskIds],
+  );
+  return extended || [];
+}
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Keys that exist while something may be leasable: the class rings (a ring
+// is deleted once its last submitter's queue empties) and the legacy list
+const QUEUED_KEYS = [...PRIORITIES.map(classQueueKey), PENDING_QUEUE];
+
+// Long-poll variant of leaseTasks: when the queue is empty, poll a single
+// EXISTS on the queue keys (100ms, 200ms, ... up to 1s apart) and only re-run
+// the lease script once something is queued, until a task is leased or
+// `waitSeconds` expires. Expired leases are reaped once, by the first attempt.
+export async function leaseTasksWaiting(max, workerId, waitSeconds) {
+  const deadline = Date.now() + Math.min(Math.max(0, waitSeconds), MAX_WAIT_SECONDS) * 1000;
+  let delay = 100;
+  let tasks = await leaseTasks(max, workerId);
+
+  for (;;) {
+    const remaining = deadline - Date.now();
+    if (tasks.length > 0 || remaining <= 0) {
+      return tasks;
+    }
+    await sleep(Math.min(delay, remaining));
+    delay = Math.min(delay * 2, 1000);
+    if ((await redis.exists(...QUEUED_KEYS)) > 0) {
+      tasks = await leaseTasks(max, workerId, { reap: false });
+    }
+  }
+}
+
+// Create a task hash and enqueue it in one round-trip. `fields` should carry
+// priority, submitter and queueScore; missing ones fall back to the defaults.
+// With an active key, a submission for a video already pending or processing
+// is coalesced into that task instead (its `duplicates` count is bumped).
+// KEYS: task hash, active key (optional); ARGV: ttl seconds, now seconds, field, value, ...
+// Returns the ID of the task that will produce the transcript
+const ENQUEUE_SCRIPT = `
+${ACTIVE_INDEX_LUA}
+${FAIR_QUEUE_LUA}
+if KEYS[2] then
+  local existing = claim_active(KEYS[2], KEYS[1], ARGV[1])
+  if existing then
+    redis.call('HINCRBY', existing, 'duplicates', 1)
+    return existing
+  end
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+push_task(KEYS[1], ARGV[2])
+return KEYS[1]
+`;
+
+export async function enqueueTask(taskId, fields, { activeKey } = {}) {
+  const args = [];
+  for (const [field, value] of Object.entries(fields)) {
+    args.push(field, String(value));
+  }
+  return redis.eval(
+    ENQUEUE_SCRIPT,
+    activeKey ? [taskId, activeKey] : [taskId],
+    [String(TASK_TTL_SECONDS), String(Date.now() / 1000), ...args],
+  );
+}
+
+// Time (seconds) the oldest pending task was queued, or false when nothing
+// is queued. Entries whose hash expired or that are no longer pending are
+// dropped first (at most 100 per call), so a stale ID cannot pin the age.
+// KEYS: pending_since zset
+const OLDEST_PENDING_SCRIPT = `
+${FAIR_QUEUE_LUA}
+for _ = 1, 100 do
+  local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+  if not oldest[1] then return false end
+  local status = redis.call('HGET', oldest[1], 'status')
+  if status == 'pending' then return oldest[2] end
+  if status then
+    unqueue_task(oldest[1])
+  else
+    redis.call('ZREM', KEYS[1], oldest[1])
+  end
+end
+return false
+`;
+
+// Queue depth per priority class and submitter, leased task count and the
+// age of the oldest pending task (null when nothing is queued)
+export async function queueStats() {
+  // prune stale entries first so the depths below do not count them
+  const oldest = await redis.eval(OLDEST_PENDING_SCRIPT, [PENDING_SINCE_SET], []);
+  const pipeline = redis.pipeline();
+  for (const priority of PRIORITIES) {
+    pipeline.lrange(classQueueKey(priority), 0, -1);
+  }
+  pipeline.llen(PENDING_QUEUE);
+  pipeline.zcard(PROCESSING_SET);
+  const replies = await pipeline.exec();
+  // a ring written before unqueue_task kept it in sync may list a submitter twice
+  const rings = replies.slice(0, PRIORITIES.length).map((ring) => [...new Set(ring || [])]);
+  const [legacy, processing] = replies.slice(PRIORITIES.length);
+  const oldestPendingSeconds = oldest
+    ? Math.max(0, Math.round(Date.now() / 1000 - Number(oldest)))
+    : null;
+
+  const depths = [];
+  if (rings.some((ring) => ring.length > 0)) {
+    const counts = redis.pipeline();
+    PRIORITIES.forEach((priority, i) => {
+      for (const submitter of rings[i]) {
+        counts.zcard(submitterQueueKey(priority, submitter));
+      }
+    });
+    depths.push(...(await counts.exec()));
+  }
+
+  const classes = {};
+  let pending = legacy || 0;
+  PRIORITIES.forEach((priority, i) => {
+    const submitters = {};
+    let depth = 0;
+    for (const submitter of rings[i]) {
+      const count = depths.shift() || 0;
+      submitters[submitter] = count;
+      depth += count;
+    }
+    classes[priority] = { depth, submitters };
+    pending += depth;
+  });
+
+  return { pending, processing: processing || 0, legacy: legacy || 0, oldestPendingSeconds, classes };
+}
+
+// Finish a task, touching only the fields that change: status, result,
+// resultEncoding, error and completedAt. A completed task is final, so a
+// late failure report from a worker that lost its lease cannot clobber it.
+// `source` records how the transcript was produced (subtitles, asr, cache)
+// and is tallied in the stats:result_sources hash.
+// A worker report (non-empty worker ID) is only accepted from the task's
+// last lease holder. While processing, the report is accepted as is.
+// After the lease was reaped (pending again, or failed after max attempts),
+// only a non-empty result is accepted: the transcript is still good, and
+// the task is taken off the queue so it is not leased again. A late
+// failure report is refused so it cannot cancel the retry.
+// KEYS: task hash, processing zset, segments list, result source stats hash
+// ARGV: status, completedAt, result ('' = none), resultEncoding, error, source,
+// worker ID ('' = internal), then per extra output format: format, content, encoding
+// Returns {videoId, videoUrl, parent ID ready for aggregation or false},
+// 0 when the task is missing, -1 when already completed, -2 when the
+// worker no longer holds the task
+const COMPLETE_SCRIPT = `
+${CHILD_DONE_LUA}
+${ACTIVE_INDEX_LUA}
+${FAIR_QUEUE_LUA}
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status then
+  return 0
+end
+if status == 'completed' then
+  return -1
+end
+if ARGV[7] ~= '' then
+  if redis.call('HGET', KEYS[1], 'workerId') ~= ARGV[7] then
+    return -2
+  end
+  if status ~= 'processing'
+    and not ((status == 'pending' or status == 'failed') and ARGV[1] == 'completed' and ARGV[3] ~= '') then
+    return -2
+  end
+end
+if status == 'pending' then
+  unqueue_task(KEYS[1])
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[1], 'completedAt', ARGV[2])
+if ARGV[3] ~= '' then
+  redis.call('HSET', KEYS[1], 'result', ARGV[3])
+  if ARGV[4] ~= '' then
+    redis.call('HSET', KEYS[1], 'resultEncoding', ARGV[4])
+  else
+    redis.call('HDEL', KEYS[1], 'resultEncoding')
+  end
+end
+if ARGV[5] ~= '' then
+  redis.call('HSET', KEYS[1], 'error', ARGV[5])
+else
+  redis.call('HDEL', KEYS[1], 'error')
+end
+if ARGV[6] ~= '' then
+  redis.call('HSET', KEYS[1], 'source', ARGV[6])
+  if ARGV[1] == 'completed' then
+    redis.call('HINCRBY', KEYS[4], ARGV[6], 1)
+  end
+end
+if ARGV[1] == 'completed' and #ARGV > 7 then
+  local formats = {}
+  for i = 8, #ARGV, 3 do
+    local field = 'output:' .. ARGV[i]
+    redis.call('HSET', KEYS[1], field, ARGV[i + 1])
+    if ARGV[i + 2] ~= '' then
+      redis.call('HSET', KEYS[1], field .. ':encoding', ARGV[i + 2])
+    else
+      redis.call('HDEL', KEYS[1], field .. ':encoding')
+    end
+    table.insert(formats, ARGV[i])
+  end
+  redis.call('HSET', KEYS[1], 'outputs', table.concat(formats, ','))
+end
+redis.call('ZREM', KEYS[2], KEYS[1])
+redis.call('DEL', KEYS[3])
+release_active(KEYS[1])
+-- a child reported failed and then completed is only counted once
+local parent = false
+if status ~= 'failed' then
+  parent = child_done(KEYS[1])
+end
+local info = redis.call('HMGET', KEYS[1], 'videoId', 'videoUrl')
+return {info[1], info[2], parent}
+`;
+
+// Returns {videoId, videoUrl} of the finished task, or null / 'completed' /
+// 'lost' when it does not exist / was already completed / is no longer held
+// by `workerId`. Finishing the last child of an expanded task aggregates the parent.
+// `outputs` is a list of {format, result, resultEncoding} extra renderings.
+export async function completeTask(taskId, {
+  status, result, resultEncoding, error, source, workerId, outputs = [],
+}) {
+  const reply = await redis.eval(
+    COMPLETE_SCRIPT,
+    [taskId, PROCESSING_SET, segmentsKey(taskId), RESULT_SOURCES_KEY],
+    [
+      status, new Date().toISOString(), result || '', resultEncoding || '', error || '', source || '',
+      workerId || '',
+      ...outputs.flatMap((output) => [output.format, output.result, output.resultEncoding || '']),
+    ],
+  );
+  if (reply === 0) {
+    return null;
+  }
+  if (reply === -1) {
+    return 'completed';
+  }
+  if (reply === -2) {
+    return 'lost';
+  }
+  const [videoId, videoUrl, readyParent] = reply;
+  if (readyParent) {
+    await finalizeParent(readyParent);
+  }
+  return { videoId, videoUrl };
+}
+
+// Turn a leased task into a parent of one child task per video part and
+// queue the children. Only the worker holding the parent's lease may expand it.
+// Children inherit the parent's priority and submitter, and are scored by
+// their own duration. Each child is registered in the in-flight index unless
+// another task is already transcribing that video part.
+// KEYS: parent hash, processing zset, children list
+// ARGV: worker ID, ttl seconds, now ISO, now seconds, then per child: ID, URL, video ID, title, queue score, active key
+// Returns the child count, or -1 when the parent is not held by the worker
+const EXPAND_SCRIPT = `
+${ACTIVE_INDEX_LUA}
+${FAIR_QUEUE_LUA}
+if redis.call('HGET', KEYS[1], 'status') ~= 'processing' or redis.call('HGET', KEYS[1], 'workerId') ~= ARGV[1] then
+  return -1
+end
+local owner = redis.call('HMGET', KEYS[1], 'priority', 'submitter')
+local count = 0
+for i = 5, #ARGV, 6 do
+  local id = ARGV[i]
+  count = count + 1
+  redis.call('HSET', id, 'videoUrl', ARGV[i + 1], 'videoId', ARGV[i + 2], 'title', ARGV[i + 3],
+    'status', 'pending', 'createdAt', ARGV[3], 'parentId', KEYS[1], 'index', count,
+    'priority', owner[1] or '${DEFAULT_PRIORITY}', 'submitter', owner[2] or '${ANONYMOUS_SUBMITTER}',
+    'queueScore', ARGV[i + 4])
+  redis.call('EXPIRE', id, ARGV[2])
+  claim_active(ARGV[i + 5], id, ARGV[2])
+  redis.call('RPUSH', KEYS[3], id)
+  push_task(id, ARGV[4])
+end
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+redis.call('HSET', KEYS[1], 'status', 'waiting_children', 'childCount', count, 'childrenDone', 0)
+redis.call('ZREM', KEYS[2], KEYS[1])
+return count
+`;
+
+// children: [{videoUrl, videoId, title, duration}] in playlist order
+export async function expandTask(taskId, workerId, children) {
+  const now = Date.now();
+  const args = [];
+  children.forEach((child, i) => {
+    args.push(
+      `${taskId}_p${i + 1}`,
+      child.videoUrl,
+      child.videoId,
+      child.title || '',
+      String(queueScore(child.duration, { now, index: i })),
+      activeTaskKey(child.videoId, `p${extractPart(child.videoUrl)}`),
+    );
+  });
+  return redis.eval(
+    EXPAND_SCRIPT,
+    [taskId, PROCESSING_SET, childrenKey(taskId)],
+    [workerId || '', String(TASK_TTL_SECONDS), new Date(now).toISOString(), String(now / 1000), ...args],
+  );
+}
+
+// Only one caller gets to aggregate a parent
+const CLAIM_PARENT_SCRIPT = `
+if redis.call('HGET', KEYS[1], 'status') ~= 'waiting_children' then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'status', 'aggregating')
+return 1
+`;
+
+// Join the children's transcripts, in part order, into the parent's result
+export async function finalizeParent(parentId) {
+  if (!(await redis.eval(CLAIM_PARENT_SCRIPT, [parentId], []))) {
+    return;
+  }
+
+  const childIds = (await redis.lrange(childrenKey(parentId), 0, -1)) || [];
+  const pipeline = redis.pipeline();
+  for (const id of childIds) {
+    pipeline.hmget(id, 'status', 'title', 'result', 'resultEncoding', 'error');
+  }
+  const children = childIds.length > 0 ? await pipeline.exec() : [];
+
+  const sections = [];
+  let completed = 0;
+  children.forEach((child, i) => {
+    const header = `=== P${i + 1}${child && child.title ? ` ${child.title}` : ''} ===`;
+    if (child && child.status === 'completed') {
+      completed += 1;
+      sections.push(`${header}\n${decodeResult(child) || ''}`);
+    } else {
+      sections.push(`${header}\n[转写失败: ${(child && child.error) || 'unknown error'}]`);
+    }
+  });
+
+  if (completed === 0) {
+    await completeTask(parentId, { status: 'failed', error: `All ${children.length} parts failed` });
+    return;
+  }
+  await completeTask(parentId, { status: 'completed', ...encodeResult(sections.join('\n\n')) });
+}
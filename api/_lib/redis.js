@@ -0,0 +1,16 @@
+import { Redis } from '@upstash/redis';
+
+// Shared Upstash client for all API routes
+export const redis = new Redis({
+  url: process.env.UPSTASH_REDIS_REST_URL,
+  token: process.env.UPSTASH_REDIS_REST_TOKEN,
+});
+
+// Convert a flat [field, value, field, value, ...] reply into an object
+export function pairsToObject(pairs) {
+  const obj = {};
+  for (let i = 0; i + 1 < (pairs || []).length; i += 2) {
+    obj[pairs[i]] = pairs[i + 1];
+  }
+  return obj;
+}
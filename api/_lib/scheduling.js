@@ -0,0 +1,48 @@
+// Priority classes and per-submitter fair queuing for pending tasks.
+//
+// Each priority class has a ring of submitters with queued work
+// (`pending:<class>`, a list) and one sorted set per submitter
+// (`pending:<class>:<submitter>`). Leasing serves classes in strict priority
+// order and, within a class, takes one task from each submitter in turn, so a
+// bulk submission cannot starve everyone else. Within a submitter's queue,
+// tasks are ordered by queue score (see queueScore).
+
+// Highest priority first
+export const PRIORITIES = ['high', 'normal', 'low'];
+export const DEFAULT_PRIORITY = 'normal';
+
+// Submitter used when a request carries no identity
+export const ANONYMOUS_SUBMITTER = 'anonymous';
+
+// Seconds of queue delay per second of estimated video duration, so short
+// videos overtake long ones submitted up to that much earlier
+export const DURATION_WEIGHT = parseFloat(process.env.QUEUE_DURATION_WEIGHT || '1');
+
+// Duration assumed for videos whose length is not known at enqueue time
+export const DEFAULT_DURATION_SECONDS = parseInt(process.env.QUEUE_DEFAULT_DURATION || '600', 10);
+
+export function classQueueKey(priority) {
+  return `pending:${priority}`;
+}
+
+export function submitterQueueKey(priority, submitter) {
+  return `pending:${priority}:${submitter}`;
+}
+
+// Earliest-first score in seconds: enqueue time pushed back by the estimated
+// duration. `index` keeps the order of children enqueued together.
+export function queueScore(durationSeconds, { now = Date.now(), index = 0 } = {}) {
+  const duration = Number(durationSeconds) > 0 ? Number(durationSeconds) : DEFAULT_DURATION_SECONDS;
+  return now / 1000 + DURATION_WEIGHT * duration + index / 1000;
+}
+
+// Submitter identity: an explicit `submitter` field, otherwise the client IP
+export function resolveSubmitter(req, submitter) {
+  let id = typeof submitter === 'string' ? submitter.trim() : '';
+  if (!id) {
+    const forwarded = req.headers['x-forwarded-for'];
+    id = (forwarded ? String(forwarded).split(',')[0] : req.socket?.remoteAddress || '').trim();
+  }
+  id = id.replace(/[^\w.@:-]/g, '_').slice(0, 64);
+  return id || ANONYMOUS_SUBMITTER;
+}
@@ -0,0 +1,47 @@
+// Helpers for identifying Bilibili videos, shared by the API routes.
+// Files under api/_lib are not deployed as serverless functions.
+
+// Task hashes and transcript pointers expire after 24 hours
+export const TASK_TTL_SECONDS = 86400;
+
+export function extractVideoId(videoUrl) {
+  const match = videoUrl.match(/(?:BV[\w]+|av\d+)/i);
+  return match ? match[0] : null;
+}
+
+// Part number from the ?p= query parameter, defaulting to 1
+export function extractPart(videoUrl) {
+  try {
+    const part = parseInt(new URL(videoUrl).searchParams.get('p'), 10);
+    return part > 0 ? part : 1;
+  } catch {
+    return 1;
+  }
+}
+
+// Pointer from a video part to the task holding its completed transcript
+export function transcriptKey(videoId, part) {
+  return `transcript:${videoId}:p${part}`;
+}
+
+// How long a completed transcript is reused for new submissions of the same
+// video part (TRANSCRIPT_REUSE_SECONDS, 0 disables reuse)
+export const TRANSCRIPT_REUSE_SECONDS = parseInt(process.env.TRANSCRIPT_REUSE_SECONDS || String(TASK_TTL_SECONDS), 10);
+
+// Pointer from a video part (`p<N>`, or `all` for a multi-part expansion) to
+// the pending or processing task transcribing it, so duplicate submissions
+// attach to that task instead of transcribing the video again
+export function activeTaskKey(videoId, scope) {
+  return `active:${videoId}:${scope}`;
+}
+
+// Collections, series and favourite lists have no single BV ID; they are
+// expanded into one child task per video by a worker (yt-dlp --flat-playlist)
+const COLLECTION_PATTERNS = [
+  /space\.bilibili\.com\/\d+\/(?:channel\/(?:collectiondetail|seriesdetail)|lists\/\d+|favlist)/i,
+  /bilibili\.com\/(?:medialist\/(?:play|detail)|list)\//i,
+];
+
+export function isCollectionUrl(videoUrl) {
+  return COLLECTION_PATTERNS.some((pattern) => pattern.test(videoUrl));
+}
@@ -0,0 +1,59 @@
+import { MAX_CHILDREN, expandTask } from './_lib/queue.js';
+import { extractVideoId } from './_lib/video.js';
+
+export default async function handler(req, res) {
+  // Enable CORS
+  res.setHeader('Access-Control-Allow-Origin', '*');
+  res.setHeader('Access-Control-Allow-Methods', 'POST, OPTIONS');
+  res.setHeader('Access-Control-Allow-Headers', 'Content-Type');
+
+  if (req.method === 'OPTIONS') {
+    res.status(200).end();
+    return;
+  }
+
+  if (req.method !== 'POST') {
+    return res.status(405).json({ error: 'Method not allowed' });
+  }
+
+  // Fan a leased playlist/multi-part task out into one child task per video.
+  // The worker resolves the entries with yt-dlp --flat-playlist.
+  const { taskId, workerId, children } = req.body;
+
+  if (!taskId || !workerId || !Array.isArray(children)) {
+    return res.status(400).json({ error: 'taskId, workerId and children are required' });
+  }
+
+  const entries = children
+    .filter((child) => child && typeof child.videoUrl === 'string')
+    .map((child) => ({
+      videoUrl: child.videoUrl,
+      videoId: extractVideoId(child.videoUrl),
+      title: typeof child.title === 'string' ? child.title : '',
+      duration: Number(child.duration) || 0,
+    }))
+    .filter((child) => child.videoId);
+
+  if (entries.length === 0) {
+    return res.status(400).json({ error: 'No valid Bilibili videos in children' });
+  }
+  if (entries.length > MAX_CHILDREN) {
+    return res.status(413).json({ error: `At most ${MAX_CHILDREN} children per task` });
+  }
+
+  try {
+    const count = await expandTask(taskId, workerId, entries);
+    if (count < 0) {
+      return res.status(409).json({ error: 'Task is not processing under this worker' });
+    }
+
+    res.status(200).json({
+      success: true,
+      childCount: count,
+      childIds: entries.map((_, i) => `${taskId}_p${i + 1}`),
+    });
+  } catch (error) {
+    console.error('Error expanding task:', error);
+    res.status(500).json({ error: 'Failed to expand task' });
+  }
+}
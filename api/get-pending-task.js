@@ -1,9 +1,11 @@
-import { Redis } from '@upstash/redis';
+import { redis } from './_lib/redis.js';
+import { encodeResult, readJsonBody } from './_lib/compression.js';
+import { MAX_APPEND_SEGMENTS, appendSegments, readSegments } from './_lib/partial.js';
+import { LEASE_SECONDS, OUTPUT_FORMATS, RESULT_SOURCES, completeTask, leaseTasksWaiting } from './_lib/queue.js';
+import { TASK_TTL_SECONDS, TRANSCRIPT_REUSE_SECONDS, extractPart, transcriptKey } from './_lib/video.js';
 
-const redis = new Redis({
-  url: process.env.UPSTASH_REDIS_REST_URL,
-  token: process.env.UPSTASH_REDIS_REST_TOKEN,
-});
+// Long-poll requests (?wait=S) are held open for up to LONG_POLL_MAX_SECONDS
+export const config = { maxDuration: 30 };
 
 export default async function handler(req, res) {
   // Enable CORS
@@ -17,61 +19,111 @@ export default async function handler(req, res) {
   }
 
   if (req.method === 'GET') {
-    // Get a pending task
+    // Lease pending tasks: ?max=N returns up to N tasks as `tasks`,
+    // otherwise a single task is returned as `task`.
+    // ?wait=S holds the request for up to S seconds until a task arrives.
+    const { max, wait, worker_id: workerId } = req.query;
+
     try {
-      const taskId = await redis.rpop('pending_tasks');
-      
-      if (!taskId) {
-        return res.status(200).json({ task: null });
-      }
+      const tasks = await leaseTasksWaiting(
+        max ? parseInt(max, 10) : 1,
+        workerId,
+        parseFloat(wait) || 0,
+      );
 
-      const task = await redis.hgetall(taskId);
-      
-      if (!task || Object.keys(task).length === 0) {
-        return res.status(200).json({ task: null });
+      if (max) {
+        return res.status(200).json({ tasks, leaseSeconds: LEASE_SECONDS });
       }
-
-      // Update task status to processing
-      await redis.hset(taskId, {
-        ...task,
-        status: 'processing',
-        processingStartedAt: new Date().toISOString(),
-      });
-
-      res.status(200).json({
-        task: {
-          taskId,
-          ...task,
-        },
-      });
+      res.status(200).json({ task: tasks[0] || null, leaseSeconds: LEASE_SECONDS });
     } catch (error) {
       console.error('Error getting pending task:', error);
       res.status(500).json({ error: 'Failed to get pending task' });
     }
   } else if (req.method === 'POST') {
-    // Update task result
-    const { taskId, result, error } = req.body;
+    // Workers may gzip large completion payloads (Content-Encoding: gzip)
+    let body;
+    try {
+      body = await readJsonBody(req);
+    } catch (err) {
+      return res.status(400).json({ error: 'Invalid request body' });
+    }
+    const { taskId, result, error, partial, segments, workerId, source, outputs } = body;
 
     if (!taskId) {
       return res.status(400).json({ error: 'Task ID is required' });
     }
 
+    if (partial) {
+      // Append streamed transcript segments while the task is still processing
+      if (!Array.isArray(segments) || segments.length === 0) {
+        return res.status(400).json({ error: 'segments must be a non-empty array' });
+      }
+      if (segments.length > MAX_APPEND_SEGMENTS) {
+        return res.status(413).json({ error: `At most ${MAX_APPEND_SEGMENTS} segments per append` });
+      }
+
+      try {
+        const length = await appendSegments(taskId, workerId, segments);
+        if (length < 0) {
+          return res.status(409).json({ error: 'Task is not processing under this worker' });
+        }
+        return res.status(200).json({ success: true, segmentCount: length });
+      } catch (err) {
+        console.error('Error appending segments:', err);
+        return res.status(500).json({ error: 'Failed to append segments' });
+      }
+    }
+
+    // Extra formats rendered from the same transcription: {srt: '...', ...}
+    const outputEntries = outputs && !error ? Object.entries(outputs) : [];
+    if (outputs && !error && (typeof outputs !== 'object' || Array.isArray(outputs)
+      || outputEntries.some(([format, text]) => !OUTPUT_FORMATS.includes(format) || typeof text !== 'string' || !text))) {
+      return res.status(400).json({ error: `outputs must map ${OUTPUT_FORMATS.join(' / ')} to non-empty strings` });
+    }
+
+    // Update task result
     try {
-      const task = await redis.hgetall(taskId);
-      
-      if (!task || Object.keys(task).length === 0) {
-        return res.status(404).json({ error: 'Task not found' });
+      // A worker that streamed every segment may omit `result`;
+      // the transcript is then assembled from the appended segments
+      let finalResult = result;
+      if (!error && !finalResult) {
+        finalResult = (await readSegments(taskId)).join('\n');
       }
 
-      // Update task with result
-      await redis.hset(taskId, {
-        ...task,
+      const task = await completeTask(taskId, {
         status: error ? 'failed' : 'completed',
-        result: result || null,
-        error: error || null,
-        completedAt: new Date().toISOString(),
+        ...(error ? {} : encodeResult(finalResult)),
+        error,
+        source: RESULT_SOURCES.includes(source) ? source : null,
+        workerId,
+        outputs: outputEntries.map(([format, text]) => ({ format, ...encodeResult(text) })),
       });
 
+      if (!task) {
+        return res.status(404).json({ error: 'Task not found' });
+      }
+      if (task === 'completed') {
+        return res.status(409).json({ error: 'Task already completed' });
+      }
+      if (task === 'lost') {
+        return res.status(409).json({ error: 'Task is no longer leased to this worker' });
+      }
+
+      // Let later submissions of the same video part reuse this transcript,
+      // keeping the task itself alive for as long as the pointer
+      if (!error && finalResult && task.videoId && TRANSCRIPT_REUSE_SECONDS > 0) {
+        const pipeline = redis.pipeline();
+        pipeline.set(
+          transcriptKey(task.videoId, extractPart(task.videoUrl || '')),
+          taskId,
+          { ex: TRANSCRIPT_REUSE_SECONDS },
+        );
+        if (TRANSCRIPT_REUSE_SECONDS > TASK_TTL_SECONDS) {
+          pipeline.expire(taskId, TRANSCRIPT_REUSE_SECONDS);
+        }
+        await pipeline.exec();
+      }
+
       res.status(200).json({
         success: true,
         message: 'Task updated successfully',
@@ -0,0 +1,39 @@
+import { LEASE_SECONDS, heartbeatTasks } from './_lib/queue.js';
+
+export default async function handler(req, res) {
+  // Enable CORS
+  res.setHeader('Access-Control-Allow-Origin', '*');
+  res.setHeader('Access-Control-Allow-Methods', 'POST, OPTIONS');
+  res.setHeader('Access-Control-Allow-Headers', 'Content-Type');
+
+  if (req.method === 'OPTIONS') {
+    res.status(200).end();
+    return;
+  }
+
+  if (req.method !== 'POST') {
+    return res.status(405).json({ error: 'Method not allowed' });
+  }
+
+  // Extend the leases of tasks this worker is still processing
+  const { taskIds, workerId } = req.body;
+
+  if (!Array.isArray(taskIds) || !workerId) {
+    return res.status(400).json({ error: 'taskIds and workerId are required' });
+  }
+
+  try {
+    const extended = await heartbeatTasks(taskIds, workerId);
+    const lost = taskIds.filter((id) => !extended.includes(id));
+
+    res.status(200).json({
+      success: true,
+      extended,
+      lost,
+      leaseSeconds: LEASE_SECONDS,
+    });
+  } catch (error) {
+    console.error('Error extending leases:', error);
+    res.status(500).json({ error: 'Failed to extend leases' });
+  }
+}
@@ -0,0 +1,27 @@
+import { queueStats } from './_lib/queue.js';
+
+export default async function handler(req, res) {
+  // Enable CORS
+  res.setHeader('Access-Control-Allow-Origin', '*');
+  res.setHeader('Access-Control-Allow-Methods', 'GET, OPTIONS');
+  res.setHeader('Access-Control-Allow-Headers', 'Content-Type');
+
+  if (req.method === 'OPTIONS') {
+    res.status(200).end();
+    return;
+  }
+
+  if (req.method !== 'GET') {
+    return res.status(405).json({ error: 'Method not allowed' });
+  }
+
+  // Pending depth per priority class and submitter, leased task count and
+  // the age of the oldest pending task
+  try {
+    const stats = await queueStats();
+    res.status(200).json({ ...stats, timestamp: new Date().toISOString() });
+  } catch (error) {
+    console.error('Error reading queue stats:', error);
+    res.status(500).json({ error: 'Failed to read queue stats' });
+  }
+}
@@ -1,9 +1,15 @@
-import { Redis } from '@upstash/redis';
-
-const redis = new Redis({
-  url: process.env.UPSTASH_REDIS_REST_URL,
-  token: process.env.UPSTASH_REDIS_REST_TOKEN,
-});
+import { redis } from './_lib/redis.js';
+import { decodeResult } from './_lib/compression.js';
+import { enqueueTask } from './_lib/queue.js';
+import { DEFAULT_PRIORITY, PRIORITIES, queueScore, resolveSubmitter } from './_lib/scheduling.js';
+import {
+  TRANSCRIPT_REUSE_SECONDS,
+  activeTaskKey,
+  extractPart,
+  extractVideoId,
+  isCollectionUrl,
+  transcriptKey,
+} from './_lib/video.js';
 
 export default async function handler(req, res) {
   // Enable CORS
@@ -20,40 +26,105 @@ export default async function handler(req, res) {
     return res.status(405).json({ error: 'Method not allowed' });
   }
 
-  const { videoUrl } = req.body;
+  // expand: also transcribe every other part (分P) of a multi-part video
+  // priority: high / normal / low; submitter: fair-queuing identity
+  // (defaults to the client IP); duration: estimated length in seconds;
+  // dryRun: validate and look up only, without queueing (synthetic checks)
+  const { videoUrl, expand, priority = DEFAULT_PRIORITY, submitter, duration, dryRun } = req.body;
 
   if (!videoUrl) {
     return res.status(400).json({ error: 'Video URL is required' });
   }
+  if (!PRIORITIES.includes(priority)) {
+    return res.status(400).json({ error: `priority must be one of ${PRIORITIES.join(', ')}` });
+  }
+
+  // Collections/series, and multi-part videos submitted with `expand` and no
+  // explicit ?p=, become a parent task that a worker expands into one child
+  // task per video with yt-dlp --flat-playlist
+  const collection = isCollectionUrl(videoUrl);
 
   // Extract video ID from URL
-  const videoIdMatch = videoUrl.match(/(?:BV[\w]+|av\d+)/i);
-  if (!videoIdMatch) {
+  const videoId = extractVideoId(videoUrl);
+  if (!videoId && !collection) {
     return res.status(400).json({ error: 'Invalid Bilibili video URL' });
   }
+  const fanOut = collection || (Boolean(expand) && !/[?&]p=\d+/.test(videoUrl));
 
-  const videoId = videoIdMatch[0];
   const taskId = `task_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
+  const activeKey = videoId ? activeTaskKey(videoId, fanOut ? 'all' : `p${extractPart(videoUrl)}`) : null;
 
   try {
-    // Store task in Redis
-    await redis.hset(taskId, {
+    // Read-only: report what a real submission would do, touching no state
+    if (dryRun) {
+      const [cachedTaskId, activeTaskId] = videoId
+        ? await Promise.all([
+          fanOut ? null : redis.get(transcriptKey(videoId, extractPart(videoUrl))),
+          redis.get(activeKey),
+        ])
+        : [null, null];
+      return res.status(200).json({
+        success: true,
+        dryRun: true,
+        videoId,
+        expand: fanOut,
+        cachedTaskId: cachedTaskId || null,
+        activeTaskId: activeTaskId || null,
+        message: 'Validated; nothing was queued',
+      });
+    }
+
+    // Serve an existing transcript of the same video part without enqueueing
+    if (!fanOut && TRANSCRIPT_REUSE_SECONDS > 0) {
+      const cachedTaskId = await redis.get(transcriptKey(videoId, extractPart(videoUrl)));
+      if (cachedTaskId) {
+        const cached = await redis.hmget(cachedTaskId, 'status', 'result', 'resultEncoding');
+        if (cached && cached.status === 'completed' && cached.result) {
+          await redis.incr('stats:transcript_cache_hits');
+          return res.status(200).json({
+            success: true,
+            taskId: cachedTaskId,
+            status: 'completed',
+            cached: true,
+            result: decodeResult(cached),
+            message: 'Transcript already available',
+          });
+        }
+      }
+      await redis.incr('stats:transcript_cache_misses');
+    }
+
+    // Store the task (expiring after 24 hours) and queue it in one round-trip.
+    // Expansion is quick, so a parent is scored as a zero-length video.
+    // A video part that is already pending or processing is not queued again:
+    // the submission attaches to the in-flight task and shares its result.
+    const now = Date.now();
+    const queuedTaskId = await enqueueTask(taskId, {
       videoUrl,
-      videoId,
+      videoId: videoId || '',
       status: 'pending',
-      createdAt: new Date().toISOString(),
-      result: null,
-    });
-
-    // Add to pending queue
-    await redis.lpush('pending_tasks', taskId);
+      createdAt: new Date(now).toISOString(),
+      priority,
+      submitter: resolveSubmitter(req, submitter),
+      queueScore: fanOut ? now / 1000 : queueScore(duration, { now }),
+      ...(fanOut ? { kind: 'expand' } : {}),
+    }, { activeKey });
 
-    // Set expiration (24 hours)
-    await redis.expire(taskId, 86400);
+    if (queuedTaskId !== taskId) {
+      await redis.incr('stats:coalesced_submissions');
+      return res.status(200).json({
+        success: true,
+        taskId: queuedTaskId,
+        coalesced: true,
+        ...(fanOut ? { expand: true } : {}),
+        message: 'Attached to the task already transcribing this video',
+      });
+    }
 
     res.status(200).json({
       success: true,
       taskId,
+      ...(fanOut ? { expand: true } : {}),
       message: 'Task submitted successfully',
     });
   } catch (error) {
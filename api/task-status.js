@@ -0,0 +1,93 @@
+import { redis } from './_lib/redis.js';
+import { decodeResult } from './_lib/compression.js';
+import { readSegments, segmentsKey } from './_lib/partial.js';
+import { OUTPUT_FORMATS, outputField } from './_lib/queue.js';
+
+export default async function handler(req, res) {
+  // Enable CORS
+  res.setHeader('Access-Control-Allow-Origin', '*');
+  res.setHeader('Access-Control-Allow-Methods', 'GET, OPTIONS');
+  res.setHeader('Access-Control-Allow-Headers', 'Content-Type');
+
+  if (req.method === 'OPTIONS') {
+    res.status(200).end();
+    return;
+  }
+
+  if (req.method !== 'GET') {
+    return res.status(405).json({ error: 'Method not allowed' });
+  }
+
+  // Task status plus transcript segments streamed since index ?from=N,
+  // so clients can poll and render output while the task is processing.
+  // ?format=srt|vtt|json returns that rendering of a completed transcript
+  // instead of the plain-text result.
+  const { taskId, from, format = 'txt' } = req.query;
+
+  if (!taskId) {
+    return res.status(400).json({ error: 'Task ID is required' });
+  }
+  if (format !== 'txt' && !OUTPUT_FORMATS.includes(format)) {
+    return res.status(400).json({ error: `format must be one of txt, ${OUTPUT_FORMATS.join(', ')}` });
+  }
+
+  try {
+    // Only the fields this response needs; `result` can be large
+    const task = await redis.hmget(
+      taskId,
+      'status', 'createdAt', 'processingStartedAt', 'completedAt', 'error',
+      'childCount', 'childrenDone', 'source', 'outputs',
+    );
+
+    if (!task || !task.status) {
+      return res.status(404).json({ error: 'Task not found' });
+    }
+
+    const offset = Math.max(0, parseInt(from, 10) || 0);
+    const response = {
+      taskId,
+      status: task.status,
+      createdAt: task.createdAt,
+      processingStartedAt: task.processingStartedAt || null,
+      completedAt: task.completedAt || null,
+      source: task.source || null,
+    };
+
+    if (task.status === 'processing') {
+      // segmentCount lets clients notice the list was reset by a re-leased attempt
+      const [segments, segmentCount] = await Promise.all([
+        readSegments(taskId, offset),
+        redis.llen(segmentsKey(taskId)),
+      ]);
+      response.segments = segments;
+      response.segmentCount = segmentCount;
+      response.next = offset + segments.length;
+    } else if (task.status === 'completed') {
+      const formats = task.outputs ? String(task.outputs).split(',') : [];
+      response.formats = ['txt', ...formats];
+      if (format === 'txt') {
+        response.result = decodeResult(await redis.hmget(taskId, 'result', 'resultEncoding'));
+      } else if (!formats.includes(format)) {
+        return res.status(404).json({ error: `Format ${format} not available`, formats: response.formats });
+      } else {
+        const field = outputField(format);
+        const stored = await redis.hmget(taskId, field, `${field}:encoding`);
+        response.format = format;
+        response.output = decodeResult({ result: stored[field], resultEncoding: stored[`${field}:encoding`] });
+      }
+    } else if (task.status === 'failed') {
+      response.error = task.error;
+    }
+
+    // Expanded playlist/multi-part task: progress over its child tasks
+    if (task.childCount) {
+      response.childCount = Number(task.childCount);
+      response.childrenDone = Number(task.childrenDone || 0);
+    }
+
+    res.status(200).json(response);
+  } catch (error) {
+    console.error('Error getting task status:', error);
+    res.status(500).json({ error: 'Failed to get task status' });
+  }
+}
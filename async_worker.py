@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Bilibili Video Transcript Worker（asyncio 版）
+领取任务、租约心跳、片段追加、结果上报和 yt-dlp / ffmpeg 子进程都在同一个事件循环里并发执行，
+所有 API 请求共用一个带连接池的 httpx 客户端（安装 h2 时使用 HTTP/2 多路复用），每个请求都有明确的超时；
+CPU 密集的语音识别放到线程池（长音频再分块交给进程池），不阻塞事件循环
+
+    pip install "httpx[http2]"
+    python async_worker.py https://your-app.vercel.app --concurrency 4
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import importlib.util
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+import metrics
+from audio import PCMAudio, stream_pcm_async
+from backoff import AdaptiveBackoff
+from calibration import load_calibration, select_model
+from compression import encode_json_body
+from heartbeat import LeaseHeartbeat, LeaseLost
+from playlist import FLAT_PLAYLIST_TIMEOUT, flat_playlist_command, parse_flat_playlist
+from postprocess import format_timings, get_postprocessor
+from segment_stream import SegmentUploader
+from subtitles import PROBE_TIMEOUT, parse_track, pick_track, probe_command, subtitle_tracks
+from transcript_cache import TranscriptCache, extract_part, extract_video_id
+from transcriber import LONG_AUDIO_SECONDS, Segment, TranscriptionResult, get_engine, transcribe_long
+from transcript_formats import parse_formats, render_outputs
+from worker_stats import WorkerStats
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('worker.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+# httpx 默认每个请求记一条 INFO 日志，长轮询和心跳会刷屏
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# 转录配置（参与缓存寻址：模型或语言不同的结果不会互相命中）
+# auto：同 worker-enhanced.py，按 calibration.py 在本机测得的实时率选择模型和线程数（未校准时使用 base），
+# 只在启动时选定一次，运行期间不随队列积压切换模型；也可指定为 base、faster-whisper:small 等固定模型
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'auto')
+FALLBACK_MODEL = 'base'
+WHISPER_LANGUAGE = os.getenv('WHISPER_LANGUAGE', 'zh')
+
+# 租约心跳间隔（秒），需明显小于服务端 LEASE_SECONDS（默认 120）
+HEARTBEAT_INTERVAL = int(os.getenv('HEARTBEAT_INTERVAL', '30'))
+
+# 字幕快速通道与片段流式上传，含义同 worker.py
+SUBTITLE_FAST_PATH = os.getenv('SUBTITLE_FAST_PATH', '1') != '0'
+STREAM_PARTIAL_RESULTS = os.getenv('STREAM_PARTIAL_RESULTS', '1') != '0'
+PARTIAL_FLUSH_SECONDS = float(os.getenv('PARTIAL_FLUSH_SECONDS', '5'))
+# 每次追加的最多片段数（不应超过服务端 MAX_APPEND_SEGMENTS）
+PARTIAL_MAX_BATCH = 50
+
+OUTPUT_FORMATS = parse_formats(os.getenv('OUTPUT_FORMATS', 'txt'))
+
+# 各类请求的超时（秒）：连接超时统一较短，读取超时按请求类型区分
+CONNECT_TIMEOUT = 5
+POLL_TIMEOUT_MARGIN = 10  # 长轮询在 wait 秒数之外额外等待的时间
+HEARTBEAT_TIMEOUT = 10
+PARTIAL_TIMEOUT = 10
+RESULT_TIMEOUT = 30
+SUBTITLE_DOWNLOAD_TIMEOUT = 30
+
+# 安装了 h2 才能启用 HTTP/2，否则退回 HTTP/1.1 连接池
+HTTP2 = importlib.util.find_spec('h2') is not None
+
+
+def _timeout(read: float) -> httpx.Timeout:
+    return httpx.Timeout(read, connect=CONNECT_TIMEOUT)
+
+
+def resolve_model(spec: str = WHISPER_MODEL) -> Tuple[str, Optional[int]]:
+    """把 WHISPER_MODEL 解析为 (模型, 线程数)，线程数为 None 时由后端决定"""
+    if spec != 'auto':
+        return spec, None
+    report = load_calibration()
+    choice = select_model(report) if report else None
+    if choice is None:
+        logger.info(f"ℹ️  本机尚未校准，使用 {FALLBACK_MODEL} 模型（运行 python calibration.py 后可自动选择模型）")
+        return FALLBACK_MODEL, None
+    spec, threads, rtf = choice
+    logger.info(f"🎚️  自动选择模型: {spec} × {threads} 线程 (RTF {rtf:.2f})")
+    return spec, threads
+
+
+class AsyncTranscriptWorker:
+    def __init__(self, api_base_url: str, poll_interval: int = 5, concurrency: int = 4,
+                 transcribe_workers: Optional[int] = None, long_poll: int = 20):
+        """
+        Args:
+            api_base_url: API 基础URL (例如: https://your-app.vercel.app)
+            poll_interval: 队列为空时的最长退避间隔（秒）
+            concurrency: 同时处理的任务数（下载、上传等 I/O 在事件循环内并发）
+            transcribe_workers: 语音识别线程数（默认 min(concurrency, CPU 核数)）
+            long_poll: 长轮询等待时长（秒），0 表示不等待
+        """
+        self.api_base_url = api_base_url.rstrip('/')
+        self.poll_interval = poll_interval
+        self.concurrency = max(1, concurrency)
+        self.transcribe_workers = transcribe_workers or min(self.concurrency, os.cpu_count() or 1)
+        self.long_poll = max(0, long_poll)
+        self.backoff = AdaptiveBackoff(initial=0.5, maximum=poll_interval)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.model, self.threads = resolve_model()
+
+        self.cache = TranscriptCache() if os.getenv('TRANSCRIPT_CACHE', '1') != '0' else None
+
+        # 由 run() 在事件循环内创建
+        self.client: Optional[httpx.AsyncClient] = None
+        self.asr_pool: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+        # 心跳线程与片段上传（SegmentUploader）同 worker.py，请求通过 _run_on_loop 交回事件循环发送
+        self.heartbeat = LeaseHeartbeat(
+            lambda task_ids: self._run_on_loop(self.send_heartbeat(task_ids), HEARTBEAT_TIMEOUT + CONNECT_TIMEOUT),
+            interval=HEARTBEAT_INTERVAL)
+        self.stats = WorkerStats()
+
+    def _run_on_loop(self, coro: Awaitable, timeout: float) -> Any:
+        """
+        供心跳线程、识别线程调用：在事件循环中执行协程并等待结果，
+        不能在事件循环线程内调用（会阻塞循环），事件循环中需经 asyncio.to_thread
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    # ---- API 请求 ----
+
+    async def lease_tasks(self, max_tasks: int) -> List[Dict[str, Any]]:
+        """批量领取最多 max_tasks 个任务，队列为空时由服务端挂起最多 long_poll 秒"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(
+                "/api/get-pending-task",
+                params={"max": max_tasks, "wait": self.long_poll, "worker_id": self.worker_id},
+                timeout=_timeout(self.long_poll + POLL_TIMEOUT_MARGIN),
+            )
+            response.raise_for_status()
+            tasks = response.json().get('tasks') or []
+        except (httpx.HTTPError, ValueError) as e:
+            metrics.POLL_SECONDS.observe(time.perf_counter() - started, outcome='error')
+            metrics.record_failure('poll', e)
+            logger.error(f"获取任务失败: {e}")
+            return []
+        metrics.POLL_SECONDS.observe(time.perf_counter() - started, outcome='task' if tasks else 'empty')
+        for task in tasks:
+            metrics.record_queue_wait(task.get('createdAt'))
+            self.heartbeat.add(task['taskId'])
+        return tasks
+
+    async def send_heartbeat(self, task_ids: List[str]) -> List[str]:
+        """为持有的任务续租，返回租约已丢失的任务 ID"""
+        response = await self.client.post(
+            "/api/heartbeat-task",
+            json={"taskIds": task_ids, "workerId": self.worker_id},
+            timeout=_timeout(HEARTBEAT_TIMEOUT),
+        )
+        response.raise_for_status()
+        return response.json().get('lost', [])
+
+    async def append_segments(self, task_id: str, lines: List[str]):
+        # 租约已丢失时停止追加，SegmentUploader 随之放弃后续片段
+        self.heartbeat.check(task_id)
+        with metrics.UPLOAD_SECONDS.time(kind='partial'):
+            response = await self.client.post(
+                "/api/get-pending-task",
+                json={"taskId": task_id, "workerId": self.worker_id, "partial": True, "segments": lines},
+                timeout=_timeout(PARTIAL_TIMEOUT),
+            )
+        response.raise_for_status()
+
+    async def update_task(self, task_id: str, result: str = None, error: str = None, source: str = None,
+                          outputs: Optional[Dict[str, str]] = None) -> bool:
+        """上报结果或错误，参数含义同 worker.py 的 update_task"""
+        payload = {"taskId": task_id, "workerId": self.worker_id}
+        if source:
+            payload["source"] = source
+        if result:
+            payload["result"] = result
+        if outputs:
+            payload["outputs"] = outputs
+        if error:
+            payload["error"] = error
+        body, headers = encode_json_body(payload)
+        try:
+            with metrics.UPLOAD_SECONDS.time(kind='result'):
+                response = await self.client.post(
+                    "/api/get-pending-task", content=body, headers=headers, timeout=_timeout(RESULT_TIMEOUT))
+            response.raise_for_status()
+            return response.json().get('success', False)
+        except (httpx.HTTPError, ValueError) as e:
+            metrics.record_failure('upload', e)
+            logger.error(f"更新任务失败: {e}")
+            return False
+
+    # ---- 子进程 ----
+
+    @staticmethod
+    async def run_command(cmd: List[str], timeout: float) -> bytes:
+        """
+        在事件循环中执行子进程并返回 stdout，超时或被取消时结束子进程
+
+        Raises:
+            subprocess.CalledProcessError: 退出码非 0
+            subprocess.TimeoutExpired: 超时
+        """
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+        return stdout
+
+    # ---- 任务处理 ----
+
+    async def expand_task(self, task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """展开多P视频/合集任务，返回值同 worker.py 的 expand_task"""
+        stdout = await self.run_command(flat_playlist_command(task['videoUrl']), FLAT_PLAYLIST_TIMEOUT)
+        videos = parse_flat_playlist(json.loads(stdout), task['videoUrl'])
+        if not videos:
+            raise Exception("链接中没有可处理的视频")
+        if len(videos) == 1:
+            video_url = videos[0]['videoUrl']
+            return {**task, 'videoUrl': video_url, 'videoId': extract_video_id(video_url) or task.get('videoId')}
+
+        response = await self.client.post(
+            "/api/expand-task",
+            json={"taskId": task['taskId'], "workerId": self.worker_id, "children": videos},
+            timeout=_timeout(RESULT_TIMEOUT),
+        )
+        response.raise_for_status()
+        logger.info(f"🗂️ 任务 {task['taskId']} 已展开为 {response.json().get('childCount')} 个子任务")
+        return None
+
+    async def fetch_subtitles(self, video_url: str) -> Optional[TranscriptionResult]:
+        """同 subtitles.fetch_subtitles，yt-dlp 和字幕下载都不占用线程"""
+        stdout = await self.run_command(probe_command(video_url), PROBE_TIMEOUT)
+        track = pick_track(subtitle_tracks(json.loads(stdout)))
+        if track is None:
+            return None
+        text = track.get("data")
+        if text is None:
+            response = await self.client.get(track["url"], timeout=_timeout(SUBTITLE_DOWNLOAD_TIMEOUT))
+            response.raise_for_status()
+            text = response.text
+        return parse_track(track, text)
+
+    def transcribe(self, audio: PCMAudio, on_segment: Optional[Callable[[Segment], None]]) -> TranscriptionResult:
+        """语音识别（在识别线程池中执行），长音频分块交给进程池"""
+        started = time.perf_counter()
+        if audio.duration > LONG_AUDIO_SECONDS:
+            result = transcribe_long(audio, self.model, WHISPER_LANGUAGE, on_segment=on_segment,
+                                     threads=self.threads)
+        else:
+            result = get_engine(self.model, WHISPER_LANGUAGE, self.threads).transcribe(audio, on_segment=on_segment)
+        if audio.duration > 0:
+            metrics.ASR_REAL_TIME_FACTOR.observe((time.perf_counter() - started) / audio.duration, model=self.model)
+            metrics.AUDIO_SECONDS.inc(audio.duration, model=self.model)
+        return result
+
+    async def process_video(self, task_id: str, video_url: str, video_id: str) -> Dict[str, Any]:
+        """
+        处理视频转文字
+
+        Returns:
+            {"text": 完整结果或 None（片段已全部追加，由服务端拼接）, "result": TranscriptionResult 或 None,
+             "source": cache / subtitles / asr}
+        """
+        part = extract_part(video_url)
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, video_id, part, self.model, WHISPER_LANGUAGE)
+            if cached is not None:
+                logger.info(f"⚡ 命中转录缓存: {video_id} P{part}")
+                result = TranscriptionResult.from_cache(cached)
+                if result is None:
+                    # 旧版本缓存的纯文本结果，只能输出 txt
+                    return {"text": cached, "result": None, "source": "cache"}
+                result = await self.postprocess(result)
+                return {"text": result.timestamped_text, "result": result, "source": "cache"}
+
+        uploader = None
+        if STREAM_PARTIAL_RESULTS:
+            uploader = SegmentUploader(
+                lambda lines: self._run_on_loop(self.append_segments(task_id, lines), PARTIAL_TIMEOUT + CONNECT_TIMEOUT),
+                flush_interval=PARTIAL_FLUSH_SECONDS, max_batch=PARTIAL_MAX_BATCH)
+
+        try:
+            result = None
+            source = None
+            if SUBTITLE_FAST_PATH:
+                try:
+                    with metrics.STAGE_SECONDS.time(stage='subtitles'):
+                        result = await self.fetch_subtitles(video_url)
+                except Exception as e:
+                    metrics.record_failure('subtitles', e)
+                    logger.warning(f"读取字幕失败，改用语音识别: {e}")
+                if result is not None:
+                    logger.info(f"💬 使用视频字幕 ({result.language}, {len(result.segments)} 段)，跳过语音识别")
+                    source = 'subtitles'
+                    if uploader:
+                        # add 攒够一批时会同步上传，放到线程里调用
+                        await asyncio.to_thread(self._feed, uploader, result.segments)
+
+            if result is None:
+                source = 'asr'
+                self.heartbeat.check(task_id)
+                logger.info(f"⬇️  下载并解码音频: {video_id}")
+                started = time.perf_counter()
+                with metrics.STAGE_SECONDS.time(stage='download'):
+                    audio = await stream_pcm_async(video_url)
+                elapsed = time.perf_counter() - started
+                metrics.DOWNLOAD_BYTES.inc(len(audio.data), mode='stream')
+                if elapsed > 0:
+                    metrics.DOWNLOAD_BYTES_PER_SECOND.observe(len(audio.data) / elapsed, mode='stream')
+
+                self.heartbeat.check(task_id)
+                logger.info(f"🎯 开始转写 ({audio.duration:.0f}秒, 模型: {self.model})...")
+                on_segment = (lambda segment: uploader.add(segment.timestamped_line)) if uploader else None
+                with metrics.STAGE_SECONDS.time(stage='transcribe'):
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.asr_pool, self.transcribe, audio, on_segment)
+                if self.cache:
+                    await asyncio.to_thread(self.cache.put, video_id, part, self.model, WHISPER_LANGUAGE,
+                                            result.render("json"))
+        finally:
+            streamed = await asyncio.to_thread(uploader.close) if uploader else False
+
+        if source == 'asr':
+            self.heartbeat.check(task_id)
+            raw_text = result.timestamped_text
+            result = await self.postprocess(result)
+            # 已流式追加的是处理前的片段，文本有变化时上传完整结果
+            streamed = streamed and result.timestamped_text == raw_text
+        return {"text": None if streamed else result.timestamped_text, "result": result, "source": source}
+
+    @staticmethod
+    def _feed(uploader: SegmentUploader, segments: List[Segment]):
+        for segment in segments:
+            uploader.add(segment.timestamped_line)
+
+    async def postprocess(self, result: TranscriptionResult) -> TranscriptionResult:
+        """识别结果的文本后处理（标点模型可能较慢，在识别线程池中执行）；字幕是人工内容不处理"""
+        with metrics.STAGE_SECONDS.time(stage='postprocess'):
+            result, timings = await asyncio.get_running_loop().run_in_executor(
+                self.asr_pool, get_postprocessor().process, result)
+        if timings:
+            logger.info(f"✏️  文本后处理: {format_timings(timings)}")
+        return result
+
+    def print_stats(self):
+        self.stats.print(self.cache)
+
+    def _record_result(self, success: bool, source: Optional[str] = None):
+        if self.stats.record(success, source):
+            self.print_stats()
+
+    async def handle_task(self, task: Dict[str, Any]) -> bool:
+        """处理单个任务并上报结果，返回结果是否成功上报"""
+        task_id = task['taskId']
+        logger.info(f"📋 获取到新任务: {task_id}")
+        try:
+            if task.get('kind') == 'expand':
+                try:
+                    task = await self.expand_task(task)
+                except Exception as e:
+                    metrics.record_failure('expand', e)
+                    error_msg = f"展开分P/合集失败: {str(e)}"
+                    logger.error(f"❌ {error_msg}")
+                    await self.update_task(task_id, error=error_msg)
+                    self._record_result(False)
+                    return False
+                if task is None:
+                    return True
+
+            try:
+                outcome = await self.process_video(task_id, task['videoUrl'], task['videoId'])
+                # 租约已丢失时任务已重新分配，不再上报
+                self.heartbeat.check(task_id)
+            except LeaseLost as e:
+                # 任务已由其他工作器处理，放弃本地结果，也不上报错误
+                metrics.record_failure('lease', e)
+                logger.warning(f"⚠️ {e}，放弃该任务")
+                self._record_result(False)
+                return False
+            except Exception as e:
+                metrics.record_failure('process', e)
+                error_msg = f"处理视频时出错: {str(e)}"
+                logger.error(f"❌ {error_msg}")
+                await self.update_task(task_id, error=error_msg)
+                self._record_result(False)
+                return False
+
+            source = outcome['source']
+            if await self.update_task(task_id, result=outcome['text'], source=source,
+                                      outputs=render_outputs(outcome['result'], OUTPUT_FORMATS)):
+                logger.info(f"✅ 任务完成: {task_id} (来源: {source})")
+                self._record_result(True, source)
+                return True
+            logger.warning(f"⚠️ 任务结果更新失败: {task_id}")
+            self._record_result(False)
+            return False
+        finally:
+            # 结果已上报（或放弃），停止续租
+            self.heartbeat.remove(task_id)
+
+    # ---- 主循环 ----
+
+    async def poll_loop(self):
+        """空闲槽位数 = concurrency - 进行中的任务数，每次按空闲槽位批量领取"""
+        while not self._stopping.is_set():
+            if len(self._in_flight) >= self.concurrency:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            tasks = await self.lease_tasks(self.concurrency - len(self._in_flight))
+            if not tasks:
+                delay = self.backoff.next_delay()
+                logger.info(f"暂无待处理任务，{delay:.1f} 秒后重试... (进行中: {len(self._in_flight)})")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.backoff.reset()
+            for task in tasks:
+                job = asyncio.create_task(self.handle_task(task))
+                self._in_flight.add(job)
+                job.add_done_callback(self._in_flight.discard)
+
+    def _on_signal(self):
+        if not self._stopping.is_set():
+            logger.info(f"收到中断信号，停止领取新任务，等待 {len(self._in_flight)} 个进行中的任务完成...")
+            self._stopping.set()
+        else:
+            logger.warning("再次收到中断信号，放弃未完成的任务")
+            for job in self._in_flight:
+                job.cancel()
+
+    async def run(self):
+        print(f"🚀 启动 Bilibili 转录工作器（asyncio）")
+        print(f"🌐 API URL: {self.api_base_url}")
+        print(f"⏱️  长轮询: {self.long_poll}秒, 空闲退避上限: {self.poll_interval}秒")
+        print(f"🧵 并发任务数: {self.concurrency}, 识别线程: {self.transcribe_workers}")
+        print(f"🧠 Whisper 模型: {self.model}" + (f" × {self.threads} 线程" if self.threads else ""))
+        print(f"🔗 HTTP/2: {'开启' if HTTP2 else '未安装 h2，使用 HTTP/1.1'}")
+        print(f"{'='*60}")
+
+        loop = self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._on_signal)
+
+        self.asr_pool = ThreadPoolExecutor(max_workers=self.transcribe_workers, thread_name_prefix='asr')
+        limits = httpx.Limits(max_connections=self.concurrency * 2 + 4, max_keepalive_connections=self.concurrency + 2)
+        async with httpx.AsyncClient(base_url=self.api_base_url, http2=HTTP2, limits=limits,
+                                     timeout=_timeout(RESULT_TIMEOUT)) as self.client:
+            self.heartbeat.start()
+            poller = asyncio.create_task(self.poll_loop())
+            stopping = asyncio.create_task(self._stopping.wait())
+            try:
+                await asyncio.wait([poller, stopping], return_when=asyncio.FIRST_COMPLETED)
+                # 取消挂起中的长轮询：服务端若已为这次请求分配了任务，租约到期后会重新入队
+                poller.cancel()
+                stopping.cancel()
+                error = (await asyncio.gather(poller, return_exceptions=True))[0]
+                if isinstance(error, Exception):
+                    logger.critical(f"工作器运行错误: {error}")
+                if self._in_flight:
+                    await asyncio.gather(*self._in_flight, return_exceptions=True)
+            finally:
+                # 心跳线程可能正等待事件循环发送请求，在线程中等待它退出
+                await asyncio.to_thread(self.heartbeat.stop)
+                self.asr_pool.shutdown(wait=False, cancel_futures=True)
+                self.asr_pool = None
+
+        self.print_stats()
+        print("\n👋 工作器已安全退出")
+
+
+def main():
+    print("🎬 Bilibili 视频转文字工作器（asyncio）")
+    print("=" * 40)
+
+    parser = argparse.ArgumentParser(description="Bilibili 视频转文字工作器（asyncio）")
+    parser.add_argument('api_url', nargs='?', help="API 基础URL (例如: https://your-app.vercel.app)")
+    parser.add_argument(
+        '--concurrency', type=int,
+        default=int(os.getenv('WORKER_CONCURRENCY', '4')),
+        help="同时处理的任务数（默认读取 WORKER_CONCURRENCY，否则为 4）"
+    )
+    parser.add_argument(
+        '--transcribe-workers', type=int,
+        default=int(os.getenv('TRANSCRIBE_WORKERS', '0')) or None,
+        help="语音识别线程数（默认读取 TRANSCRIBE_WORKERS，否则为 min(并发数, CPU 核数)）"
+    )
+    parser.add_argument(
+        '--metrics-port', type=int,
+        default=int(os.getenv('METRICS_PORT', '0')),
+        help="在该端口暴露 Prometheus 格式的 /metrics（默认读取 METRICS_PORT，0 表示不开启）"
+    )
+    args = parser.parse_args()
+
+    api_url = os.getenv('API_BASE_URL') or args.api_url
+    if not api_url:
+        print("❌ 请提供 API URL")
+        print("\n使用方法:")
+        print("   python async_worker.py https://your-app.vercel.app --concurrency 8")
+        print("   或设置环境变量 API_BASE_URL")
+        sys.exit(1)
+    if not api_url.startswith(('http://', 'https://')):
+        print("❌ 无效的 URL 格式，请使用 http:// 或 https:// 开头")
+        sys.exit(1)
+
+    poll_interval = int(os.getenv('POLL_INTERVAL', '5'))
+    long_poll = int(os.getenv('LONG_POLL_SECONDS', '20'))
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+        print(f"✅ 指标端点: http://localhost:{args.metrics_port}/metrics")
+
+    worker = AsyncTranscriptWorker(api_url, poll_interval, concurrency=args.concurrency,
+                                   transcribe_workers=args.transcribe_workers, long_poll=long_poll)
+    asyncio.run(worker.run())
+
+
+if __name__ == "__main__":
+    main()
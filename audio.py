@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+音频获取
+yt-dlp 下载最佳音频流，通过管道直接交给 ffmpeg 解码为 16kHz 单声道 PCM，不落地中间文件
+"""
+
+import asyncio
+import os
+import subprocess
+import tempfile
+import wave
+from typing import List, Optional, Tuple
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # s16le
+
+
+class PCMAudio:
+    def __init__(self, data: bytes, sample_rate: int = SAMPLE_RATE):
+        """16-bit 小端单声道原始 PCM"""
+        self.data = data
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self) -> float:
+        """时长（秒）"""
+        return len(self.data) / (SAMPLE_WIDTH * self.sample_rate)
+
+    @classmethod
+    def from_wav(cls, path: str) -> "PCMAudio":
+        """读取 16-bit 单声道 WAV 文件"""
+        with wave.open(path, "rb") as f:
+            if f.getnchannels() != 1 or f.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"需要 16-bit 单声道 WAV: {path}")
+            return cls(f.readframes(f.getnframes()), f.getframerate())
+
+    def slice(self, start: float, end: float) -> "PCMAudio":
+        """截取 [start, end) 秒之间的音频"""
+        begin = int(start * self.sample_rate) * SAMPLE_WIDTH
+        stop = min(int(end * self.sample_rate) * SAMPLE_WIDTH, len(self.data))
+        return PCMAudio(self.data[begin:stop], self.sample_rate)
+
+    def to_float32(self):
+        """转换为 whisper 所需的 float32 数组，取值范围 [-1, 1]"""
+        import numpy as np
+        return np.frombuffer(self.data, dtype=np.int16).astype(np.float32) / 32768.0
+
+    def write_wav(self, path: str):
+        """写出 WAV 文件（仅供必须读文件的后端使用，如 whisper CLI）"""
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(SAMPLE_WIDTH)
+            f.setframerate(self.sample_rate)
+            f.writeframes(self.data)
+
+
+def ytdlp_command(url: str, extra_args: Optional[List[str]] = None) -> List[str]:
+    """
+    下载最佳音频流并输出到 stdout 的 yt-dlp 命令
+
+    只下载链接指向的单个分P（--no-playlist），多P视频由 playlist.py 展开为子任务
+    """
+    return ["yt-dlp", "-f", "bestaudio/best", "--quiet", "--no-progress", "--no-playlist",
+            *(extra_args or []), "-o", "-", url]
+
+
+def ffmpeg_decode_command(source: str = "pipe:0") -> List[str]:
+    """将任意音频解码为 16kHz 单声道 s16le 并输出到 stdout 的 ffmpeg 命令"""
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-i", source,
+            "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "-f", "s16le", "pipe:1"]
+
+
+def stream_pcm(url: str) -> PCMAudio:
+    """
+    yt-dlp → ffmpeg 管道：边下载边解码，直接得到内存中的 PCM
+
+    Raises:
+        subprocess.CalledProcessError: yt-dlp 或 ffmpeg 执行失败
+    """
+    # yt-dlp 的错误输出写到临时文件，避免管道写满后阻塞
+    with tempfile.TemporaryFile() as download_log:
+        downloader = subprocess.Popen(ytdlp_command(url), stdout=subprocess.PIPE, stderr=download_log)
+        try:
+            decoder = subprocess.Popen(
+                ffmpeg_decode_command(),
+                stdin=downloader.stdout,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            # 关闭父进程持有的读端，ffmpeg 提前退出时 yt-dlp 能收到 SIGPIPE
+            downloader.stdout.close()
+            pcm, decode_err = decoder.communicate()
+        finally:
+            downloader.wait()
+            download_log.seek(0)
+            download_err = download_log.read()
+
+    if downloader.returncode != 0:
+        raise subprocess.CalledProcessError(downloader.returncode, "yt-dlp", stderr=download_err)
+    if decoder.returncode != 0:
+        raise subprocess.CalledProcessError(decoder.returncode, "ffmpeg", stderr=decode_err)
+    if not pcm:
+        raise RuntimeError("未解码出任何音频数据")
+    return PCMAudio(pcm)
+
+
+async def stream_pcm_async(url: str) -> PCMAudio:
+    """
+    与 stream_pcm 相同的 yt-dlp → ffmpeg 管道，子进程由 asyncio 事件循环管理，等待期间不占用线程
+
+    Raises:
+        subprocess.CalledProcessError: yt-dlp 或 ffmpeg 执行失败
+    """
+    # 两个子进程之间用操作系统管道直连，数据不经过事件循环
+    read_fd, write_fd = os.pipe()
+    try:
+        downloader = await asyncio.create_subprocess_exec(
+            *ytdlp_command(url), stdout=write_fd, stderr=asyncio.subprocess.PIPE)
+        try:
+            decoder = await asyncio.create_subprocess_exec(
+                *ffmpeg_decode_command(), stdin=read_fd,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except BaseException:
+            downloader.kill()
+            await downloader.wait()
+            raise
+    finally:
+        # 关闭父进程持有的两端，ffmpeg 提前退出时 yt-dlp 能收到 SIGPIPE
+        os.close(read_fd)
+        os.close(write_fd)
+
+    try:
+        (pcm, decode_err), (_, download_err) = await asyncio.gather(
+            decoder.communicate(), downloader.communicate())
+    except BaseException:
+        # 任务被取消时结束子进程，避免遗留 yt-dlp / ffmpeg
+        for process in (downloader, decoder):
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        raise
+
+    if downloader.returncode != 0:
+        raise subprocess.CalledProcessError(downloader.returncode, "yt-dlp", stderr=download_err)
+    if decoder.returncode != 0:
+        raise subprocess.CalledProcessError(decoder.returncode, "ffmpeg", stderr=decode_err)
+    if not pcm:
+        raise RuntimeError("未解码出任何音频数据")
+    return PCMAudio(pcm)
+
+
+# ---- 语音活动检测（VAD）与按静音切分 ----
+
+VAD_FRAME_MS = 30
+
+
+def _speech_flags_webrtc(audio: PCMAudio, aggressiveness: int) -> List[bool]:
+    import webrtcvad
+    vad = webrtcvad.Vad(aggressiveness)
+    frame_bytes = audio.sample_rate * VAD_FRAME_MS // 1000 * SAMPLE_WIDTH
+    data = audio.data
+    return [
+        vad.is_speech(data[i:i + frame_bytes], audio.sample_rate)
+        for i in range(0, len(data) - frame_bytes + 1, frame_bytes)
+    ]
+
+
+def _speech_flags_energy(audio: PCMAudio) -> List[bool]:
+    """没有 webrtcvad 时的兜底：按帧能量与整段噪声底噪比较"""
+    import numpy as np
+    frame_len = audio.sample_rate * VAD_FRAME_MS // 1000
+    samples = np.frombuffer(audio.data, dtype=np.int16)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return []
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len).astype(np.float32)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    # 以第 10 百分位作为底噪，高出底噪 3 倍（约 10dB）视为有声
+    threshold = max(np.percentile(rms, 10) * 3.0, 100.0)
+    return (rms > threshold).tolist()
+
+
+def speech_flags(audio: PCMAudio, aggressiveness: int = 2) -> List[bool]:
+    """逐帧（30ms）判断是否有人声，优先使用 webrtcvad"""
+    try:
+        return _speech_flags_webrtc(audio, aggressiveness)
+    except ImportError:
+        return _speech_flags_energy(audio)
+
+
+def split_on_silence(audio: PCMAudio,
+                     target_seconds: float = 300.0,
+                     max_seconds: float = 420.0,
+                     min_silence_seconds: float = 0.5) -> List[Tuple[float, PCMAudio]]:
+    """
+    在静音处把长音频切成若干块
+
+    每块长度尽量接近 target_seconds：在 [target, max] 区间内选最靠前的静音中点切开，
+    区间内没有足够长的静音时在 max_seconds 处硬切。
+
+    Returns:
+        [(块起始偏移秒数, 块音频), ...]
+    """
+    flags = speech_flags(audio)
+    frame_seconds = VAD_FRAME_MS / 1000
+
+    # 足够长的静音段中点作为候选切点
+    cut_points = []
+    run_start = None
+    for i, is_speech in enumerate(flags + [True]):
+        if not is_speech and run_start is None:
+            run_start = i
+        elif is_speech and run_start is not None:
+            if (i - run_start) * frame_seconds >= min_silence_seconds:
+                cut_points.append((run_start + i) / 2 * frame_seconds)
+            run_start = None
+
+    chunks = []
+    start = 0.0
+    candidates = iter(cut_points)
+    candidate = next(candidates, None)
+    while audio.duration - start > max_seconds:
+        while candidate is not None and candidate < start + target_seconds:
+            candidate = next(candidates, None)
+        if candidate is not None and candidate <= start + max_seconds:
+            end = candidate
+        else:
+            end = start + max_seconds
+        chunks.append((start, audio.slice(start, end)))
+        start = end
+    chunks.append((start, audio.slice(start, audio.duration)))
+    return chunks
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+本地音频缓存
+按 (视频ID, 分P) 保存解码好的 16kHz PCM，转写失败重试或换模型重跑时直接从语音识别开始；
+未完成的下载保留在 partial/ 下，重试时由 yt-dlp 断点续传。
+超出容量时按最近最少使用淘汰，正在处理（已固定）的条目不会被淘汰
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from audio import PCMAudio
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "bilibili-transcript" / "audio"
+DEFAULT_MAX_MB = 2048
+# 超过这个时长（秒）没有续传的未完成下载在启动时清理
+PARTIAL_MAX_AGE = 3 * 24 * 3600
+
+
+class AudioCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            cache_dir: 缓存目录（默认读取 AUDIO_CACHE_DIR）
+            max_bytes: 缓存容量上限（默认读取 AUDIO_CACHE_MAX_MB，单位 MB）
+        """
+        self.cache_dir = Path(cache_dir or os.getenv('AUDIO_CACHE_DIR') or DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.getenv('AUDIO_CACHE_MAX_MB', str(DEFAULT_MAX_MB))) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.index_file = self.cache_dir / 'index.json'
+        self.partial_root = self.cache_dir / 'partial'
+
+        self.hits = 0
+        self.misses = 0
+        self._pins: Counter = Counter()
+        self._lock = threading.Lock()
+
+        self.partial_root.mkdir(parents=True, exist_ok=True)
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        self._clean_partials()
+
+    @staticmethod
+    def make_key(video_id: str, part: int) -> str:
+        raw = f"{video_id.lower()}\0{part}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def pin(self, video_id: str, part: int):
+        """固定条目直到 unpin，期间不会被淘汰（可重复固定，按次数计）"""
+        with self._lock:
+            self._pins[self.make_key(video_id, part)] += 1
+
+    def unpin(self, video_id: str, part: int):
+        key = self.make_key(video_id, part)
+        with self._lock:
+            self._pins[key] -= 1
+            if self._pins[key] <= 0:
+                del self._pins[key]
+            self._evict()
+            self._save_index()
+
+    def get(self, video_id: str, part: int) -> Optional[PCMAudio]:
+        """查询缓存，命中时返回 PCM 并刷新访问时间（只改内存中的索引，随 put / unpin 写回）"""
+        key = self.make_key(video_id, part)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                try:
+                    data = self._entry_path(key).read_bytes()
+                except OSError:
+                    # 文件被外部删除，索引失效
+                    del self._index[key]
+                    self._save_index()
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry['last_access'] = time.time()
+            self.hits += 1
+            return PCMAudio(data, entry['sample_rate'])
+
+    def put(self, video_id: str, part: int, audio: PCMAudio):
+        """写入缓存并删除该条目的未完成下载，超出容量时淘汰最久未访问且未固定的条目"""
+        key = self.make_key(video_id, part)
+        if len(audio.data) > self.max_bytes:
+            self.discard_partial(video_id, part)
+            return
+
+        with self._lock:
+            path = self._entry_path(key)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_bytes(audio.data)
+            os.replace(tmp, path)
+
+            now = time.time()
+            self._index[key] = {
+                'video_id': video_id,
+                'part': part,
+                'sample_rate': audio.sample_rate,
+                'size': len(audio.data),
+                'created': now,
+                'last_access': now,
+            }
+            self._evict()
+            self._save_index()
+        self.discard_partial(video_id, part)
+
+    def partial_dir(self, video_id: str, part: int) -> Path:
+        """未完成下载的目录：下载中断后保留，下次下载同一视频时续传"""
+        path = self.partial_root / self.make_key(video_id, part)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def discard_partial(self, video_id: str, part: int):
+        shutil.rmtree(self.partial_root / self.make_key(video_id, part), ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._index),
+                'pinned': len(self._pins),
+                'bytes': sum(e['size'] for e in self._index.values()),
+            }
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pcm"
+
+    def _evict(self):
+        total = sum(e['size'] for e in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key in self._pins:
+                continue
+            total -= self._index.pop(key)['size']
+            try:
+                self._entry_path(key).unlink()
+            except OSError:
+                pass
+
+    def _clean_partials(self):
+        cutoff = time.time() - PARTIAL_MAX_AGE
+        for path in self.partial_root.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 丢弃文件已不存在的条目
+        return {k: v for k, v in index.items() if self._entry_path(k).exists()}
+
+    def _save_index(self):
+        tmp = self.index_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp, self.index_file)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+自适应退避
+队列为空时等待时间按倍数增长并加入随机抖动，领到任务后立即重置
+"""
+
+import random
+
+
+class AdaptiveBackoff:
+    def __init__(self, initial: float = 0.5, maximum: float = 30.0, factor: float = 2.0):
+        """
+        Args:
+            initial: 第一次等待的基准时长（秒）
+            maximum: 等待时长上限（秒）
+            factor: 每次连续落空后的增长倍数
+        """
+        self.initial = initial
+        self.maximum = max(initial, maximum)
+        self.factor = factor
+        self._current = initial
+
+    def next_delay(self) -> float:
+        """返回本次应等待的秒数，并增大下一次的基准"""
+        base = self._current
+        self._current = min(self.maximum, self._current * self.factor)
+        # 等量抖动：一半固定、一半随机，避免整个集群同时醒来
+        return base / 2 + random.uniform(0, base / 2)
+
+    def reset(self):
+        """领到任务后调用，下一次空闲从最短等待开始"""
+        self._current = self.initial
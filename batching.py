@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+短音频批量转写
+多个任务线程各自提交一段短音频，ClipBatcher 攒够 max_batch 段或等满 max_wait 秒后
+交给常驻模型一次批量解码，再把各段的结果分别交还给提交它的线程
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from audio import PCMAudio
+from transcriber import TranscriptionEngine, TranscriptionResult, on_engine_evicted
+
+
+class ClipBatcher:
+    def __init__(self, engine: TranscriptionEngine, max_batch: int = 4, max_wait: float = 2.0,
+                 model: Optional[str] = None):
+        """
+        Args:
+            engine: 常驻的识别引擎
+            max_batch: 每批最多的音频段数
+            max_wait: 第一段到达后最多等待多少秒再开始解码（未攒满也开始）
+            model: 指标中的模型标签（默认为引擎的模型名）
+        """
+        self.engine = engine
+        self.model = model or engine.model_name
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+
+        self._pending: List[Tuple[PCMAudio, Future]] = []
+        self._first_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.batches = 0
+        self.clips = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def submit(self, clip: PCMAudio) -> "Future[TranscriptionResult]":
+        """
+        提交一段音频，返回该段结果的 Future；
+        批量转写器已停止（例如引擎被移出常驻集合）时在调用方线程单独转写，任务不会因此失败
+        """
+        future: "Future[TranscriptionResult]" = Future()
+        with self._cond:
+            stopped = self._stopping
+            if not stopped:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="clip-batcher", daemon=True)
+                    self._thread.start()
+                if not self._pending:
+                    self._first_at = time.monotonic()
+                self._pending.append((clip, future))
+                self._cond.notify_all()
+        if stopped:
+            try:
+                future.set_result(self.engine.transcribe(clip))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def transcribe(self, clip: PCMAudio) -> TranscriptionResult:
+        """提交并等待结果"""
+        return self.submit(clip).result()
+
+    def stop(self):
+        """解码完已提交的音频后停止后台线程"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'batches': self.batches,
+                'clips': self.clips,
+                'mean_batch': self.clips / self.batches if self.batches else 0.0,
+                'audio_seconds': self.audio_seconds,
+                'busy_seconds': self.busy_seconds,
+                # 每秒解码时间处理的音频秒数，与单段转写的 1 / RTF 对比即为批量的加速比
+                'throughput': self.audio_seconds / self.busy_seconds if self.busy_seconds else 0.0,
+            }
+
+    def _take_batch(self) -> List[Tuple[PCMAudio, Future]]:
+        """等到攒满一批、等待超时或停止，取出一批（调用方持有锁）"""
+        while True:
+            if self._pending:
+                waited = time.monotonic() - self._first_at
+                if len(self._pending) >= self.max_batch or waited >= self.max_wait or self._stopping:
+                    break
+                self._cond.wait(self.max_wait - waited)
+            elif self._stopping:
+                return []
+            else:
+                self._cond.wait()
+        batch = self._pending[:self.max_batch]
+        self._pending = self._pending[self.max_batch:]
+        self._first_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            clips = [clip for clip, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = self.engine.transcribe_batch(clips)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"批量转写返回 {len(results)} 个结果，提交了 {len(batch)} 段音频")
+            except Exception as e:
+                # 结果无法与音频一一对应时整批失败，不让任何提交方拿到别人的结果或一直等待
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+            audio_seconds = sum(clip.duration for clip in clips)
+            with self._cond:
+                self.batches += 1
+                self.clips += len(batch)
+                self.audio_seconds += audio_seconds
+                self.busy_seconds += elapsed
+            metrics.ASR_BATCH_SIZE.observe(len(batch))
+            if audio_seconds > 0:
+                metrics.ASR_REAL_TIME_FACTOR.observe(elapsed / audio_seconds, model=self.model)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+_batchers: Dict[TranscriptionEngine, ClipBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(engine: TranscriptionEngine, max_batch: int, max_wait: float,
+                model: Optional[str] = None) -> ClipBatcher:
+    """
+    每个常驻引擎共用一个批量转写器，引擎被移出常驻集合时随之停止；
+    已移出的引擎返回一个停止状态、不登记的转写器，提交的音频在调用方线程单独转写
+    """
+    with _batchers_lock:
+        batcher = _batchers.get(engine)
+        if batcher is None:
+            batcher = ClipBatcher(engine, max_batch, max_wait, model)
+            if engine.retired:
+                batcher.stop()
+            else:
+                _batchers[engine] = batcher
+    return batcher
+
+
+def _stop_batcher(engine: TranscriptionEngine):
+    with _batchers_lock:
+        batcher = _batchers.pop(engine, None)
+    if batcher:
+        batcher.stop()
+
+
+on_engine_evicted(_stop_batcher)
+
+
+def shutdown_batchers():
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+        _batchers.clear()
+    for batcher in batchers:
+        batcher.stop()
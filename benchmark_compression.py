@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+转录结果压缩基准测试
+对真实转录文本比较原始存储与 gzip（以及已安装时的 zstd）压缩后的体积和耗时，
+用于评估开启 RESULT_COMPRESSION / COMPRESS_UPLOADS 能节省多少 Upstash 内存和流量
+"""
+
+import argparse
+import base64
+import gzip
+import sys
+import time
+from pathlib import Path
+
+# 与 worker-enhanced.py 的输出目录一致
+ICLOUD_BASE = Path.home() / "Library/Mobile Documents/com~apple~CloudDocs/bilibili transcripts"
+
+
+def collect_files(paths):
+    """展开参数中的目录，返回所有 .txt 转录文件"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*.txt") if not p.parent.name.startswith("_")))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+def timed(func, data, repeat=5):
+    """返回 (结果, 单次平均耗时秒)"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func(data)
+    return result, (time.perf_counter() - started) / repeat
+
+
+def codecs(level):
+    """待比较的压缩方式：名称 → (压缩, 解压)"""
+    available = {
+        f"gzip-{level}": (lambda d: gzip.compress(d, compresslevel=level), gzip.decompress),
+    }
+    try:
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3)
+        decompressor = zstandard.ZstdDecompressor()
+        available["zstd-3"] = (compressor.compress, decompressor.decompress)
+    except ImportError:
+        pass
+    return available
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较转录结果原始存储与压缩存储的体积")
+    parser.add_argument("paths", nargs="*", default=[str(ICLOUD_BASE)],
+                        help="转录文件或目录（默认 iCloud 转录目录）")
+    parser.add_argument("--level", type=int, default=6, help="gzip 压缩级别（默认 6，与 API 一致）")
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    if not files:
+        print(f"❌ 未找到转录文件: {', '.join(args.paths)}")
+        sys.exit(1)
+
+    texts = [f.read_bytes() for f in files]
+    raw_total = sum(len(t) for t in texts)
+    print(f"📄 转录文件: {len(files)} 个, 共 {raw_total / 1024:.1f} KB "
+          f"(平均 {raw_total / len(files) / 1024:.1f} KB)")
+
+    print(f"\n{'格式':<16}{'体积':>12}{'占原始':>10}{'压缩':>12}{'解压':>12}")
+    print(f"{'raw':<16}{raw_total / 1024:>10.1f}KB{1:>10.1%}{'-':>12}{'-':>12}")
+
+    for name, (compress, decompress) in codecs(args.level).items():
+        packed_total = stored_total = 0
+        compress_time = decompress_time = 0.0
+        for text in texts:
+            packed, seconds = timed(compress, text)
+            compress_time += seconds
+            restored, seconds = timed(decompress, packed)
+            decompress_time += seconds
+            assert restored == text
+            packed_total += len(packed)
+            # Upstash REST 只能存字符串，落盘前还要 base64 编码
+            stored_total += len(base64.b64encode(packed))
+
+        print(f"{name + ' (传输)':<16}{packed_total / 1024:>10.1f}KB{packed_total / raw_total:>10.1%}"
+              f"{compress_time * 1000:>10.1f}ms{decompress_time * 1000:>10.1f}ms")
+        print(f"{name + '+base64':<16}{stored_total / 1024:>10.1f}KB{stored_total / raw_total:>10.1%}"
+              f"{'':>12}{'':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Whisper 转写基准测试
+比较「每个任务启动一次 whisper CLI」与「进程内常驻模型」的单任务耗时；
+--batch N 时再比较 N 段短音频逐段转写与批量解码的吞吐
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from audio import PCMAudio
+from transcriber import WhisperCLIEngine, available_backends, create_engine, parse_model_spec
+
+
+def summarize(name, latencies, load_time=None):
+    """打印一组耗时的统计"""
+    print(f"\n📊 {name}")
+    if load_time is not None:
+        print(f"   模型加载: {load_time:.2f}s（仅一次）")
+    print(f"   任务数: {len(latencies)}")
+    print(f"   平均: {statistics.mean(latencies):.2f}s")
+    print(f"   中位数: {statistics.median(latencies):.2f}s")
+    print(f"   最慢: {max(latencies):.2f}s")
+
+
+def run_cli(audio, model, language, runs):
+    """每个任务都调用一次 whisper CLI"""
+    latencies = []
+    for i in range(runs):
+        engine = WhisperCLIEngine(model, language)
+        started = time.perf_counter()
+        engine.transcribe(audio)
+        latencies.append(time.perf_counter() - started)
+        print(f"   CLI 第 {i + 1}/{runs} 次: {latencies[-1]:.2f}s")
+    return latencies
+
+
+def run_persistent(audio, spec, language, runs):
+    """加载一次模型，之后每个任务复用"""
+    engine = create_engine(spec, language)
+    started = time.perf_counter()
+    engine.load()
+    load_time = time.perf_counter() - started
+
+    latencies = []
+    for i in range(runs):
+        started = time.perf_counter()
+        engine.transcribe(audio)
+        latencies.append(time.perf_counter() - started)
+        print(f"   {engine.backend} 第 {i + 1}/{runs} 次: {latencies[-1]:.2f}s")
+    return engine.backend, load_time, latencies
+
+
+def run_batch(audio_path, spec, language, batch_size, rounds):
+    """同一个常驻模型上，比较 batch_size 段音频逐段转写与一次批量解码的吞吐"""
+    clip = PCMAudio.from_wav(audio_path)
+    clips = [clip] * batch_size
+    engine = create_engine(spec, language).load()
+
+    def throughput(transcribe_all):
+        elapsed = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            transcribe_all()
+            elapsed.append(time.perf_counter() - started)
+        # 每秒处理的音频秒数（取最快一轮）
+        return clip.duration * batch_size / min(elapsed)
+
+    sequential = throughput(lambda: [engine.transcribe(c) for c in clips])
+    print(f"   逐段转写: {sequential:.1f} 倍实时")
+    batched = throughput(lambda: engine.transcribe_batch(clips))
+    print(f"   批量解码: {batched:.1f} 倍实时")
+    return sequential, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较 whisper CLI 与常驻模型的单任务耗时")
+    parser.add_argument("audio", help="用于测试的音频文件（建议 16kHz 单声道 WAV）")
+    parser.add_argument("--model", default=os.getenv("WHISPER_MODEL", "base"),
+                        help="模型，格式同 WHISPER_MODEL（默认 base）")
+    parser.add_argument("--language", default="zh", help="语言（默认 zh）")
+    parser.add_argument("--runs", type=int, default=5, help="每种方式执行的任务数（默认 5）")
+    parser.add_argument("--skip-cli", action="store_true", help="跳过 CLI 测试")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="比较 N 段音频逐段转写与批量解码的吞吐（音频需为 16kHz 单声道 WAV）")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.audio):
+        print(f"❌ 音频文件不存在: {args.audio}")
+        sys.exit(1)
+
+    backends = available_backends()
+    print(f"🔧 可用后端: {', '.join(backends) or '无'}")
+    _, model = parse_model_spec(args.model)
+
+    cli_latencies = None
+    if not args.skip_cli and "cli" in backends:
+        print(f"\n▶️  whisper CLI (模型: {model})")
+        cli_latencies = run_cli(args.audio, model, args.language, args.runs)
+
+    print(f"\n▶️  常驻模型 ({args.model})")
+    backend, load_time, latencies = run_persistent(args.audio, args.model, args.language, args.runs)
+
+    if cli_latencies:
+        summarize("whisper CLI", cli_latencies)
+    summarize(f"常驻模型 ({backend})", latencies, load_time)
+
+    if cli_latencies:
+        speedup = statistics.mean(cli_latencies) / statistics.mean(latencies)
+        print(f"\n🚀 单任务平均提速: {speedup:.1f}x")
+
+    if args.batch > 1:
+        print(f"\n▶️  批量解码 ({args.model}, {args.batch} 段)")
+        sequential, batched = run_batch(args.audio, args.model, args.language, args.batch, max(1, args.runs // 2))
+        print(f"\n🚀 批量解码吞吐提升: {batched / sequential:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Whisper 模型校准
+在参考音频上测量各模型、各线程数的实时率（RTF = 转写耗时 / 音频时长），结果保存到本机，
+Worker 据此自动选择能达到目标 RTF 的最大模型，并在队列积压时降级到更快的模型
+
+    python calibration.py --url https://www.bilibili.com/video/BV...   # 首次：下载并保存参考音频
+    python calibration.py                                              # 之后复用已保存的参考音频
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from audio import PCMAudio, stream_pcm
+from transcriber import available_backends, create_engine
+
+CALIBRATION_DIR = Path.home() / ".cache" / "bilibili-transcript"
+CALIBRATION_FILE = Path(os.getenv("WHISPER_CALIBRATION_FILE", str(CALIBRATION_DIR / "calibration.json")))
+# 参考音频：第一次用 --url 下载后保存，之后的校准复用同一段音频，结果可比
+REFERENCE_CLIP = CALIBRATION_DIR / "reference.wav"
+REFERENCE_SECONDS = 60
+
+# 从小到大（从快到慢）
+MODEL_SIZES = ("tiny", "base", "small", "medium")
+
+# 目标实时率：转写耗时不超过音频时长的这个比例
+TARGET_RTF = float(os.getenv("WHISPER_TARGET_RTF", "0.5"))
+# 队列中每积压这么多任务，自动选择的模型降一级（0 表示不降级）
+BACKLOG_PER_DOWNGRADE = int(os.getenv("WHISPER_BACKLOG_PER_DOWNGRADE", "10"))
+
+
+def default_thread_counts() -> List[int]:
+    """1, 2, 4, ... 直到 CPU 核数"""
+    cpus = os.cpu_count() or 1
+    counts = []
+    threads = 1
+    while threads < cpus:
+        counts.append(threads)
+        threads *= 2
+    counts.append(cpus)
+    return counts
+
+
+def load_reference_clip(path: Optional[str] = None, url: Optional[str] = None,
+                        seconds: float = REFERENCE_SECONDS) -> PCMAudio:
+    """读取参考音频；指定 url 时下载视频音频的前 seconds 秒并保存为默认参考音频"""
+    if url:
+        clip = stream_pcm(url)
+        clip = clip.slice(0, min(seconds, clip.duration))
+        REFERENCE_CLIP.parent.mkdir(parents=True, exist_ok=True)
+        clip.write_wav(str(REFERENCE_CLIP))
+        print(f"💾 参考音频已保存: {REFERENCE_CLIP} ({clip.duration:.0f}秒)")
+        return clip
+    path = Path(path) if path else REFERENCE_CLIP
+    if not path.exists():
+        raise FileNotFoundError(f"参考音频不存在: {path}（首次校准请用 --url 指定一个视频）")
+    return PCMAudio.from_wav(str(path))
+
+
+def measure(clip: PCMAudio, spec: str, threads: int, language: Optional[str], runs: int) -> Dict[str, Any]:
+    """加载一次模型，取 runs 次转写中最快的一次计算 RTF"""
+    engine = create_engine(spec, language, threads)
+    started = time.perf_counter()
+    engine.load()
+    load_seconds = time.perf_counter() - started
+
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        engine.transcribe(clip)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {
+        "model": engine.model_name,
+        "backend": engine.backend,
+        "threads": threads,
+        "rtf": round(best / clip.duration, 4),
+        "load_seconds": round(load_seconds, 2),
+    }
+
+
+def calibrate(clip: PCMAudio, models: List[str], thread_counts: List[int],
+              language: Optional[str] = "zh", runs: int = 2, backend: Optional[str] = None) -> Dict[str, Any]:
+    """依次测量每个模型 × 线程数组合，返回可保存的校准报告"""
+    results = []
+    for model in models:
+        spec = f"{backend}:{model}" if backend else model
+        for threads in thread_counts:
+            print(f"⏱️  {spec} × {threads} 线程 ...", end=" ", flush=True)
+            try:
+                result = measure(clip, spec, threads, language, runs)
+            except Exception as e:
+                print(f"失败: {e}")
+                continue
+            print(f"RTF {result['rtf']:.3f}（加载 {result['load_seconds']:.1f}s）")
+            results.append(result)
+
+    return {
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "clip_seconds": round(clip.duration, 1),
+        "language": language,
+        "calibrated_at": datetime.now().isoformat(),
+        "results": results,
+    }
+
+
+def save_calibration(report: Dict[str, Any], path: Path = CALIBRATION_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_calibration(path: Path = CALIBRATION_FILE) -> Optional[Dict[str, Any]]:
+    """读取本机的校准结果，不存在或不是本机测得的返回 None"""
+    try:
+        report = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if report.get("host") != platform.node() or not report.get("results"):
+        return None
+    return report
+
+
+def _size_rank(model: str) -> int:
+    return MODEL_SIZES.index(model) if model in MODEL_SIZES else len(MODEL_SIZES)
+
+
+def select_model(report: Dict[str, Any], target_rtf: float = TARGET_RTF, backlog: int = 0,
+                 backlog_per_downgrade: int = BACKLOG_PER_DOWNGRADE) -> Optional[Tuple[str, int, float]]:
+    """
+    选出达到目标 RTF 的最大模型及其最快的线程数；队列每积压 backlog_per_downgrade 个任务降一级。
+    没有模型达到目标时返回整体最快的组合
+
+    Returns:
+        (WHISPER_MODEL 格式的模型, 线程数, RTF)，报告为空时返回 None
+    """
+    fastest: Dict[str, Dict[str, Any]] = {}
+    for result in report.get("results") or []:
+        spec = f"{result['backend']}:{result['model']}"
+        if spec not in fastest or result["rtf"] < fastest[spec]["rtf"]:
+            fastest[spec] = result
+    if not fastest:
+        return None
+
+    candidates = sorted(fastest.items(), key=lambda item: _size_rank(item[1]["model"]))
+    meeting = [i for i, (_, result) in enumerate(candidates) if result["rtf"] <= target_rtf]
+    if meeting:
+        index = meeting[-1]
+    else:
+        index = min(range(len(candidates)), key=lambda i: candidates[i][1]["rtf"])
+
+    if backlog_per_downgrade > 0:
+        index = max(0, index - backlog // backlog_per_downgrade)
+    spec, result = candidates[index]
+    return spec, result["threads"], result["rtf"]
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📊 {report['host']} ({report['machine']}, {report['cpu_count']} 核), "
+          f"参考音频 {report['clip_seconds']:.0f}秒")
+    print(f"{'模型':<24}{'线程':>6}{'RTF':>10}{'加载':>10}")
+    for r in sorted(report["results"], key=lambda r: (_size_rank(r["model"]), r["threads"])):
+        print(f"{r['backend'] + ':' + r['model']:<24}{r['threads']:>6}{r['rtf']:>10.3f}{r['load_seconds']:>9.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量各 Whisper 模型和线程数的实时率，供 Worker 自动选择模型")
+    parser.add_argument("clip", nargs="?", help=f"参考音频 WAV（默认 {REFERENCE_CLIP}）")
+    parser.add_argument("--url", help=f"下载该视频的前 {REFERENCE_SECONDS} 秒作为参考音频并保存")
+    parser.add_argument("--models", default=",".join(MODEL_SIZES), help="要测量的模型（逗号分隔）")
+    parser.add_argument("--threads", help="要测量的线程数（逗号分隔，默认 1,2,4,... 到 CPU 核数）")
+    parser.add_argument("--backend", help="只测量指定后端（默认自动选择）")
+    parser.add_argument("--language", default="zh", help="语言（默认 zh）")
+    parser.add_argument("--runs", type=int, default=2, help="每个组合转写次数，取最快一次（默认 2）")
+    parser.add_argument("--target-rtf", type=float, default=TARGET_RTF,
+                        help=f"目标实时率（默认 {TARGET_RTF}，即 WHISPER_TARGET_RTF）")
+    parser.add_argument("--output", default=str(CALIBRATION_FILE), help="校准结果文件")
+    args = parser.parse_args()
+
+    if not available_backends():
+        print("❌ 没有可用的 Whisper 后端，请安装 faster-whisper 或 openai-whisper")
+        sys.exit(1)
+
+    try:
+        clip = load_reference_clip(args.clip, args.url)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    thread_counts = [int(t) for t in args.threads.split(",")] if args.threads else default_thread_counts()
+    report = calibrate(clip, models, thread_counts, args.language, args.runs, args.backend)
+    if not report["results"]:
+        print("❌ 所有组合都测量失败")
+        sys.exit(1)
+
+    save_calibration(report, Path(args.output))
+    print_report(report)
+    spec, threads, rtf = select_model(report, args.target_rtf)
+    print(f"\n✅ 已保存: {args.output}")
+    print(f"🎯 目标 RTF {args.target_rtf}: 选择 {spec} × {threads} 线程 (RTF {rtf:.3f})")
+    print("   Worker 设置 WHISPER_MODEL=auto（默认）即按此结果选择模型")
+
+
+if __name__ == "__main__":
+    main()
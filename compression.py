@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+请求体压缩
+较大的结果上报以 gzip 压缩的 JSON 发送（Content-Encoding: gzip），
+中文转录文本（UTF-8 每字 3 字节、时间戳重复）压缩效果明显，可减少请求体积和流量；
+用 benchmark_compression.py 可在真实转录上测量压缩率
+"""
+
+import gzip
+import json
+import os
+from typing import Any, Dict, Tuple
+
+# 压缩上报的请求体（COMPRESS_UPLOADS=1 开启，需要已部署支持 gzip 请求体的 API），
+# 小于 COMPRESS_MIN_BYTES 的请求体不压缩
+COMPRESS_UPLOADS = os.getenv('COMPRESS_UPLOADS', '0') == '1'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+
+
+def encode_json_body(payload: Dict[str, Any], compress: bool = COMPRESS_UPLOADS,
+                     min_bytes: int = COMPRESS_MIN_BYTES) -> Tuple[bytes, Dict[str, str]]:
+    """
+    序列化 JSON 请求体，足够大时 gzip 压缩
+
+    Returns:
+        (请求体字节, 请求头)，可直接传给 requests 的 data= 和 headers=
+    """
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    headers = {'Content-Type': 'application/json; charset=utf-8'}
+    if compress and len(body) >= min_bytes:
+        body = gzip.compress(body, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+任务租约心跳
+后台线程定期把当前持有的所有任务 ID 合并成一次请求发给服务端，延长租约；
+工作器崩溃后心跳停止，租约到期的任务会被服务端重新放回队列；
+服务端报告租约已丢失（任务已被重新分配）的任务由工作器在各步骤之间用 check() 放弃
+"""
+
+import logging
+import threading
+from typing import Callable, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLost(Exception):
+    """任务的租约已丢失，继续处理的结果会被服务端拒绝"""
+
+
+class LeaseHeartbeat:
+    def __init__(self, send: Callable[[List[str]], Iterable[str]], interval: float = 30.0):
+        """
+        Args:
+            send: 发送心跳的函数，参数为任务 ID 列表，返回租约已丢失的任务 ID
+            interval: 心跳间隔（秒），应明显小于服务端的租约时长
+        """
+        self.send = send
+        self.interval = interval
+        self.lost: Set[str] = set()
+
+        self._held: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, task_id: str):
+        with self._lock:
+            self._held.add(task_id)
+
+    def remove(self, task_id: str):
+        with self._lock:
+            self._held.discard(task_id)
+            self.lost.discard(task_id)
+
+    def is_lost(self, task_id: str) -> bool:
+        with self._lock:
+            return task_id in self.lost
+
+    def check(self, task_id: str):
+        """
+        租约已丢失时抛出 LeaseLost，工作器在各步骤之间和上报结果前调用
+
+        Raises:
+            LeaseLost: 心跳报告该任务的租约已丢失
+        """
+        if self.is_lost(task_id):
+            raise LeaseLost(f"任务 {task_id} 的租约已丢失")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="lease-heartbeat", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def beat(self):
+        """立即发送一次心跳"""
+        with self._lock:
+            task_ids = sorted(self._held)
+        if not task_ids:
+            return
+        try:
+            lost = set(self.send(task_ids) or [])
+        except Exception as e:
+            logger.warning(f"租约心跳失败: {e}")
+            return
+        if lost:
+            with self._lock:
+                new_lost = (lost & self._held) - self.lost
+                self.lost |= lost & self._held
+            if new_lost:
+                logger.warning(f"任务租约已丢失（可能已被重新分配）: {', '.join(sorted(new_lost))}")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.beat()
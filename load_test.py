@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+工作器压测
+在本地启动内存版任务 API，提交大量任务后用多个 BilibiliTranscriptWorker
+（process_video 替换为固定耗时的桩函数）消费，统计吞吐、领取延迟和每任务 API 调用次数；
+--check-queue 只检查公平队列在租约回收、迟到上报后的轮询顺序
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from typing import List
+
+os.environ.setdefault('TRANSCRIPT_CACHE', '0')
+
+from local_api_server import DEFAULT_PRIORITY, TaskStore, make_server
+from worker import BilibiliTranscriptWorker
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_load_test(tasks: int, workers: int, concurrency: int, prefetch: int,
+                  task_seconds: float, long_poll: int) -> dict:
+    store = TaskStore()
+    server = make_server('127.0.0.1', 0, store)
+    threading.Thread(target=server.serve_forever, name='local-api', daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_port}"
+
+    def stub_process_video(video_url: str, video_id: str, on_segment=None) -> str:
+        time.sleep(task_seconds)
+        line = f"[00:00:00] {video_id}"
+        if on_segment:
+            on_segment(line)
+        return line
+
+    pool = []
+    for n in range(workers):
+        worker = BilibiliTranscriptWorker(api_url, poll_interval=1, concurrency=concurrency,
+                                          prefetch=prefetch, long_poll=long_poll)
+        worker.worker_id = f"load-test-{n}"
+        worker.process_video = stub_process_video
+        pool.append(worker)
+
+    # 任务提交阶段不计入 API 调用统计
+    for i in range(tasks):
+        store.submit(f"https://www.bilibili.com/video/BV1LoadTest{i:05d}")
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=w.run, name=f"worker-{n}", daemon=True) for n, w in enumerate(pool)]
+    for thread in threads:
+        thread.start()
+
+    while True:
+        with store._cond:
+            done = sum(1 for t in store.tasks.values() if t['status'] in ('completed', 'failed'))
+        if done >= tasks:
+            break
+        time.sleep(0.05)
+    elapsed = time.monotonic() - started
+
+    for worker in pool:
+        worker.stop()
+    for thread in threads:
+        thread.join(timeout=long_poll + 5)
+    server.shutdown()
+
+    with store._cond:
+        pickup = [t['_leased'] - t['_created'] for t in store.tasks.values() if '_leased' in t]
+        failed = sum(1 for t in store.tasks.values() if t['status'] == 'failed')
+        calls = dict(store.stats)
+
+    return {
+        'tasks': tasks,
+        'failed': failed,
+        'elapsed': elapsed,
+        'throughput': tasks / elapsed if elapsed > 0 else 0.0,
+        'pickup_p50': percentile(pickup, 50),
+        'pickup_p99': percentile(pickup, 99),
+        'api_calls': calls.get('api_calls', 0),
+        'calls_per_task': calls.get('api_calls', 0) / tasks if tasks else 0.0,
+        'calls': {k: v for k, v in calls.items() if k.startswith(('GET ', 'POST '))},
+    }
+
+
+def check_fair_queue() -> List[str]:
+    """
+    租约回收后迟到的结果把提交者的队列清空，提交者随之移出轮询列表；
+    再次提交时不能重复加入，否则每轮会被服务两次
+
+    Returns:
+        发现的问题，为空表示通过
+    """
+    store = TaskStore()
+    problems = []
+
+    def submit(n: int, submitter: str) -> str:
+        return store.submit(f"https://www.bilibili.com/video/BV1RingTest{n:03d}", submitter=submitter)[1]['taskId']
+
+    first = submit(0, 'alice')
+    leased = store.lease(1, 'worker-a', 0)
+    if [t['taskId'] for t in leased] != [first]:
+        return [f"首次领取应得到 {first}，实际为 {[t['taskId'] for t in leased]}"]
+    # 租约到期被回收、任务重新排队，之后原工作器迟到上报结果
+    with store._cond:
+        store._reap(time.time() + store.lease_seconds + 1)
+    status, _ = store.complete(first, '[00:00:00] late', None, worker_id='worker-a')
+    if status != 200:
+        problems.append(f"迟到的结果应被接受，实际状态码 {status}")
+
+    # alice 再提交两个任务，bob 提交两个任务：轮询顺序应为 alice、bob、alice、bob
+    expected = [submit(1, 'alice'), submit(2, 'bob'), submit(3, 'alice'), submit(4, 'bob')]
+    ring = list(store.rings[DEFAULT_PRIORITY])
+    if sorted(ring) != sorted(set(ring)):
+        problems.append(f"轮询列表中有重复的提交者: {ring}")
+    stats = store.queue_stats()
+    if stats['pending'] != len(expected):
+        problems.append(f"排队任务数应为 {len(expected)}，实际为 {stats['pending']}")
+    order = []
+    for _ in expected:
+        order.extend(t['taskId'] for t in store.lease(1, 'worker-b', 0))
+    if order != expected:
+        problems.append(f"领取顺序应为 alice、bob 交替，实际为 {order}（期望 {expected}）")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工作器压测（本地内存 API + 桩转录）")
+    parser.add_argument('--tasks', type=int, default=2000, help="提交的任务数")
+    parser.add_argument('--workers', type=int, default=4, help="工作器实例数")
+    parser.add_argument('--concurrency', type=int, default=8, help="每个工作器的并发任务数")
+    parser.add_argument('--prefetch', type=int, default=0, help="每个工作器的预取数")
+    parser.add_argument('--task-seconds', type=float, default=0.01, help="桩 process_video 的耗时（秒）")
+    parser.add_argument('--long-poll', type=int, default=1, help="长轮询等待时长（秒）")
+    parser.add_argument('--check-queue', action='store_true', help="只检查公平队列的轮询顺序，不压测")
+    args = parser.parse_args()
+
+    if args.check_queue:
+        problems = check_fair_queue()
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ 公平队列轮询顺序正常")
+        return
+
+    # 压测期间只保留警告以上的日志，避免刷屏
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"🏋️  压测: {args.tasks} 个任务, {args.workers} 个工作器 × {args.concurrency} 并发, "
+          f"预取 {args.prefetch}, 单任务耗时 {args.task_seconds}秒")
+    report = run_load_test(args.tasks, args.workers, args.concurrency, args.prefetch,
+                           args.task_seconds, args.long_poll)
+
+    print(f"\n{'='*60}")
+    print(f"✅ 完成: {report['tasks'] - report['failed']}/{report['tasks']}  用时 {report['elapsed']:.2f}秒")
+    print(f"🚀 吞吐: {report['throughput']:.1f} 任务/秒")
+    print(f"⏱️  领取延迟: p50 {report['pickup_p50'] * 1000:.0f}ms, p99 {report['pickup_p99'] * 1000:.0f}ms")
+    print(f"📡 API 调用: {report['api_calls']} 次 ({report['calls_per_task']:.2f} 次/任务)")
+    for endpoint, count in sorted(report['calls'].items()):
+        print(f"   {endpoint}: {count}")
+    print(f"{'='*60}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+"""
+本地任务 API 服务
+在内存中实现与 api/*.js 相同语义的任务队列，不依赖 Upstash，用于离线开发和压测
+"""
+
+import argparse
+import base64
+import gzip
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import string
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from transcript_cache import extract_part, extract_video_id
+
+# 与 api/_lib 中的默认值保持一致
+TASK_TTL_SECONDS = 86400
+TRANSCRIPT_REUSE_SECONDS = int(os.getenv('TRANSCRIPT_REUSE_SECONDS', str(TASK_TTL_SECONDS)))
+ACTIVE_STATUSES = ('pending', 'processing', 'waiting_children', 'aggregating')
+MAX_LEASE_BATCH = 50
+MAX_WAIT_SECONDS = 25
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+MAX_APPEND_SEGMENTS = 200
+RESULT_COMPRESSION = os.getenv('RESULT_COMPRESSION', '')
+GZIP_BASE64 = 'gzip+base64'
+MIN_COMPRESS_BYTES = 1024
+MAX_CHILDREN = 500
+RESULT_SOURCES = ('subtitles', 'asr', 'cache')
+# 与 api/_lib/queue.js 一致：随结果上传的附加格式（txt 即 result 本身）
+OUTPUT_FORMATS = ('srt', 'vtt', 'json')
+
+# 与 api/_lib/scheduling.js 一致：优先级从高到低，同一优先级内按提交者轮询
+PRIORITIES = ('high', 'normal', 'low')
+DEFAULT_PRIORITY = 'normal'
+ANONYMOUS_SUBMITTER = 'anonymous'
+DURATION_WEIGHT = float(os.getenv('QUEUE_DURATION_WEIGHT', '1'))
+DEFAULT_DURATION_SECONDS = int(os.getenv('QUEUE_DEFAULT_DURATION', '600'))
+
+# 与 api/_lib/video.js 的 isCollectionUrl 一致
+COLLECTION_PATTERNS = [
+    re.compile(r'space\.bilibili\.com/\d+/(?:channel/(?:collectiondetail|seriesdetail)|lists/\d+|favlist)', re.I),
+    re.compile(r'bilibili\.com/(?:medialist/(?:play|detail)|list)/', re.I),
+]
+
+
+def is_collection_url(url: str) -> bool:
+    return any(p.search(url) for p in COLLECTION_PATTERNS)
+
+
+def queue_score(duration: Any, now: float, index: int = 0) -> float:
+    """入队时间加上按时长估计的延后量，越小越先领取"""
+    try:
+        duration = float(duration)
+    except (TypeError, ValueError):
+        duration = 0
+    return now + DURATION_WEIGHT * (duration if duration > 0 else DEFAULT_DURATION_SECONDS) + index / 1000
+
+
+def normalize_submitter(submitter: Any, fallback: str = '') -> str:
+    submitter = (submitter.strip() if isinstance(submitter, str) else '') or fallback.strip()
+    return re.sub(r'[^\w.@:-]', '_', submitter)[:64] or ANONYMOUS_SUBMITTER
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def encode_result(result: Optional[str], compression: str = RESULT_COMPRESSION) -> Dict[str, Any]:
+    """与 api/_lib/compression.js 的 encodeResult 相同的存储格式"""
+    if not result:
+        return {'result': None, 'resultEncoding': None}
+    raw = result.encode('utf-8')
+    if compression == 'gzip' and len(raw) >= MIN_COMPRESS_BYTES:
+        return {'result': base64.b64encode(gzip.compress(raw)).decode('ascii'), 'resultEncoding': GZIP_BASE64}
+    return {'result': result, 'resultEncoding': None}
+
+
+def decode_result(task: Dict[str, Any]) -> Optional[str]:
+    if not task.get('result'):
+        return None
+    if task.get('resultEncoding') == GZIP_BASE64:
+        return gzip.decompress(base64.b64decode(task['result'])).decode('utf-8')
+    return task['result']
+
+
+class TaskStore:
+    def __init__(self, lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS,
+                 max_wait_seconds: float = MAX_WAIT_SECONDS):
+        """内存任务存储，对应 Redis 中的任务哈希、各优先级的公平队列和 processing_tasks 有序集合"""
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_wait_seconds = max_wait_seconds
+
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        # 优先级 → 有排队任务的提交者（轮询顺序），(优先级, 提交者) → [(queueScore, 序号, 任务 ID)] 小顶堆
+        self.rings: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self.queues: Dict[Tuple[str, str], List[Tuple[float, int, str]]] = {}
+        self.pending_since: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self.processing: Dict[str, float] = {}  # 任务 ID → 租约到期时间
+        self.transcripts: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        # (视频 ID, 'p<N>' 或 'all') → 正在处理该视频的任务 ID，重复提交并入该任务
+        self.active: Dict[Tuple[str, str], str] = {}
+        self.segments: Dict[str, List[str]] = {}  # 任务 ID → 已流式追加的片段
+        self.stats: Counter = Counter()
+
+        # 提交新任务时唤醒长轮询中的请求
+        self._cond = threading.Condition()
+
+    def _push(self, task_id: str):
+        """按任务的优先级、提交者和 queueScore 入队（调用方持有锁）"""
+        task = self.tasks[task_id]
+        priority = task.get('priority') or DEFAULT_PRIORITY
+        submitter = task.get('submitter') or ANONYMOUS_SUBMITTER
+        queue = self.queues.setdefault((priority, submitter), [])
+        if not queue:
+            self.rings[priority].append(submitter)
+        heapq.heappush(queue, (task.get('queueScore', time.time()), next(self._seq), task_id))
+        # 对应 pending_since 有序集合：记录入队时间，用于最久等待时间
+        self.pending_since[task_id] = time.time()
+
+    def _pop(self) -> Optional[str]:
+        """按优先级取下一个任务，同一优先级内轮流服务各提交者（调用方持有锁）"""
+        for priority in PRIORITIES:
+            ring = self.rings[priority]
+            while ring:
+                submitter = ring.popleft()
+                queue = self.queues.get((priority, submitter))
+                if not queue:
+                    self.queues.pop((priority, submitter), None)
+                    continue
+                task_id = heapq.heappop(queue)[2]
+                self.pending_since.pop(task_id, None)
+                if queue:
+                    ring.append(submitter)
+                else:
+                    del self.queues[(priority, submitter)]
+                return task_id
+        return None
+
+    def _unqueue(self, task_id: str):
+        """把排队中的任务移出队列（租约被回收后又收到原工作器的结果时，调用方持有锁）"""
+        task = self.tasks[task_id]
+        key = (task.get('priority') or DEFAULT_PRIORITY, task.get('submitter') or ANONYMOUS_SUBMITTER)
+        queue = self.queues.get(key)
+        if queue:
+            queue[:] = [entry for entry in queue if entry[2] != task_id]
+            heapq.heapify(queue)
+            if not queue:
+                # 同 unqueue_task：队列空了就移出轮询列表，否则下次入队会重复加入该提交者
+                del self.queues[key]
+                if key[1] in self.rings[key[0]]:
+                    self.rings[key[0]].remove(key[1])
+        self.pending_since.pop(task_id, None)
+
+    def queue_stats(self) -> Dict[str, Any]:
+        """对应 api/queue-stats.js"""
+        with self._cond:
+            # 同 queue.js 的 OLDEST_PENDING_SCRIPT：先丢弃任务已不存在或不再排队的条目
+            for task_id in [t for t in self.pending_since if self.tasks.get(t, {}).get('status') != 'pending']:
+                if task_id in self.tasks:
+                    self._unqueue(task_id)
+                else:
+                    self.pending_since.pop(task_id)
+            classes = {}
+            for priority in PRIORITIES:
+                submitters = {s: len(self.queues.get((priority, s), [])) for s in dict.fromkeys(self.rings[priority])}
+                classes[priority] = {'depth': sum(submitters.values()), 'submitters': submitters}
+            oldest = min(self.pending_since.values(), default=None)
+            return {
+                'pending': sum(c['depth'] for c in classes.values()),
+                'processing': len(self.processing),
+                'legacy': 0,
+                'oldestPendingSeconds': round(time.time() - oldest, 3) if oldest is not None else None,
+                'classes': classes,
+                'timestamp': _iso(time.time()),
+            }
+
+    def submit(self, video_url: Optional[str], expand: bool = False, priority: Any = DEFAULT_PRIORITY,
+               submitter: str = ANONYMOUS_SUBMITTER, duration: Any = None,
+               dry_run: bool = False) -> Tuple[int, Dict[str, Any]]:
+        if not video_url:
+            return 400, {'error': 'Video URL is required'}
+        if priority not in PRIORITIES:
+            return 400, {'error': f"priority must be one of {', '.join(PRIORITIES)}"}
+        collection = is_collection_url(video_url)
+        video_id = extract_video_id(video_url)
+        if not video_id and not collection:
+            return 400, {'error': 'Invalid Bilibili video URL'}
+        fan_out = collection or (bool(expand) and not re.search(r'[?&]p=\d+', video_url))
+
+        now = time.time()
+        with self._cond:
+            if dry_run:
+                # 只校验和查询，不入队、不计数（供合成监控探测使用）
+                pointer = None if fan_out else self.transcripts.get((video_id, extract_part(video_url)))
+                active_key = (video_id, 'all' if fan_out else f'p{extract_part(video_url)}') if video_id else None
+                return 200, {
+                    'success': True,
+                    'dryRun': True,
+                    'videoId': video_id,
+                    'expand': fan_out,
+                    'cachedTaskId': pointer[0] if pointer and pointer[1] > now else None,
+                    'activeTaskId': self._live_task(active_key),
+                    'message': 'Validated; nothing was queued',
+                }
+            pointer = None
+            if not fan_out and TRANSCRIPT_REUSE_SECONDS > 0:
+                pointer = self.transcripts.get((video_id, extract_part(video_url)))
+            if pointer and pointer[1] > now:
+                cached = self.tasks.get(pointer[0])
+                if cached and cached['status'] == 'completed' and cached.get('result'):
+                    self.stats['transcript_cache_hits'] += 1
+                    return 200, {
+                        'success': True,
+                        'taskId': pointer[0],
+                        'status': 'completed',
+                        'cached': True,
+                        'result': decode_result(cached),
+                        'message': 'Transcript already available',
+                    }
+            if not fan_out:
+                self.stats['transcript_cache_misses'] += 1
+
+            active_key = (video_id, 'all' if fan_out else f'p{extract_part(video_url)}') if video_id else None
+            existing = self._live_task(active_key)
+            if existing:
+                self.tasks[existing]['duplicates'] = self.tasks[existing].get('duplicates', 0) + 1
+                self.stats['coalesced_submissions'] += 1
+                response = {'success': True, 'taskId': existing, 'coalesced': True,
+                            'message': 'Attached to the task already transcribing this video'}
+                if fan_out:
+                    response['expand'] = True
+                return 200, response
+
+            task_id = f"task_{int(now * 1000)}_{''.join(random.choices(string.ascii_lowercase + string.digits, k=9))}"
+            self.tasks[task_id] = {
+                'videoUrl': video_url,
+                'videoId': video_id or '',
+                'status': 'pending',
+                'createdAt': _iso(now),
+                'priority': priority,
+                'submitter': submitter,
+                # 展开很快，父任务按零时长计分
+                'queueScore': now if fan_out else queue_score(duration, now),
+                'result': None,
+                '_created': now,
+            }
+            if fan_out:
+                self.tasks[task_id]['kind'] = 'expand'
+            if active_key:
+                self._claim(active_key, task_id)
+            self._push(task_id)
+            self._cond.notify_all()
+
+        response = {'success': True, 'taskId': task_id, 'message': 'Task submitted successfully'}
+        if fan_out:
+            response['expand'] = True
+        return 200, response
+
+    def expand(self, task_id: Optional[str], worker_id: Optional[str], children: Any) -> Tuple[int, Dict[str, Any]]:
+        """把已领取的多P/合集任务展开为子任务，对应 api/expand-task.js"""
+        if not task_id or not worker_id or not isinstance(children, list):
+            return 400, {'error': 'taskId, workerId and children are required'}
+        entries = [
+            {'videoUrl': c['videoUrl'], 'videoId': extract_video_id(c['videoUrl']), 'title': c.get('title') or '',
+             'duration': c.get('duration')}
+            for c in children if isinstance(c, dict) and isinstance(c.get('videoUrl'), str)
+        ]
+        entries = [e for e in entries if e['videoId']]
+        if not entries:
+            return 400, {'error': 'No valid Bilibili videos in children'}
+        if len(entries) > MAX_CHILDREN:
+            return 413, {'error': f'At most {MAX_CHILDREN} children per task'}
+
+        now = time.time()
+        with self._cond:
+            parent = self.tasks.get(task_id)
+            if not parent or parent['status'] != 'processing' or parent.get('workerId') != worker_id:
+                return 409, {'error': 'Task is not processing under this worker'}
+            child_ids = []
+            for index, entry in enumerate(entries, 1):
+                child_id = f"{task_id}_p{index}"
+                duration = entry.pop('duration')
+                self.tasks[child_id] = {
+                    **entry,
+                    'status': 'pending',
+                    'createdAt': _iso(now),
+                    'parentId': task_id,
+                    'index': index,
+                    'priority': parent.get('priority') or DEFAULT_PRIORITY,
+                    'submitter': parent.get('submitter') or ANONYMOUS_SUBMITTER,
+                    'queueScore': queue_score(duration, now, index - 1),
+                    'result': None,
+                    '_created': now,
+                }
+                active_key = (entry['videoId'], f"p{extract_part(entry['videoUrl'])}")
+                if not self._live_task(active_key):
+                    self._claim(active_key, child_id)
+                self._push(child_id)
+                child_ids.append(child_id)
+            parent.update(status='waiting_children', childCount=len(child_ids), childrenDone=0,
+                          _children=child_ids)
+            self.processing.pop(task_id, None)
+            self._cond.notify_all()
+        return 200, {'success': True, 'childCount': len(child_ids), 'childIds': child_ids}
+
+    def _live_task(self, active_key: Optional[Tuple[str, str]]) -> Optional[str]:
+        """正在处理该视频的任务 ID（调用方持有锁）"""
+        task_id = self.active.get(active_key) if active_key else None
+        if task_id and self.tasks.get(task_id, {}).get('status') in ACTIVE_STATUSES:
+            return task_id
+        return None
+
+    def _claim(self, active_key: Tuple[str, str], task_id: str):
+        self.active[active_key] = task_id
+        self.tasks[task_id]['_activeKey'] = active_key
+
+    def _release(self, task: Dict[str, Any], task_id: str):
+        """任务结束后从进行中索引移除（调用方持有锁）"""
+        active_key = task.get('_activeKey')
+        if active_key and self.active.get(active_key) == task_id:
+            del self.active[active_key]
+
+    def _child_done(self, task: Dict[str, Any]):
+        """子任务结束时计数，最后一个子任务结束后汇总父任务（调用方持有锁）"""
+        parent = self.tasks.get(task.get('parentId') or '')
+        if parent is None:
+            return
+        parent['childrenDone'] += 1
+        if parent['childrenDone'] != parent['childCount'] or parent['status'] != 'waiting_children':
+            return
+
+        sections = []
+        completed = 0
+        for index, child_id in enumerate(parent['_children'], 1):
+            child = self.tasks.get(child_id, {})
+            header = f"=== P{index}{' ' + child['title'] if child.get('title') else ''} ==="
+            if child.get('status') == 'completed':
+                completed += 1
+                sections.append(f"{header}\n{decode_result(child) or ''}")
+            else:
+                sections.append(f"{header}\n[转写失败: {child.get('error') or 'unknown error'}]")
+
+        now = time.time()
+        if completed:
+            parent.update(status='completed', **encode_result('\n\n'.join(sections)))
+        else:
+            parent.update(status='failed', error=f"All {len(sections)} parts failed")
+        parent.update(completedAt=_iso(now), _completed=now)
+        self._release(parent, task['parentId'])
+
+    def _reap(self, now: float):
+        """租约到期的任务按原 queueScore 放回队列，超过最大尝试次数则标记失败"""
+        for task_id, expiry in list(self.processing.items()):
+            if expiry > now:
+                continue
+            del self.processing[task_id]
+            task = self.tasks.get(task_id)
+            if not task or task['status'] != 'processing':
+                continue
+            if task.get('attempts', 0) >= self.max_attempts:
+                task.update(status='failed', error=f"Lease expired after {task['attempts']} attempts",
+                            completedAt=_iso(now))
+                self._release(task, task_id)
+                self._child_done(task)
+            else:
+                task['status'] = 'pending'
+                self.segments.pop(task_id, None)
+                self._push(task_id)
+
+    def _lease_now(self, count: int, worker_id: str, reap: bool = True) -> List[Dict[str, Any]]:
+        now = time.time()
+        if reap:
+            self._reap(now)
+        leased = []
+        while len(leased) < count:
+            task_id = self._pop()
+            if task_id is None:
+                break
+            task = self.tasks.get(task_id)
+            # 队列中的 ID 可能已失效（任务已不存在或已结束），跳过
+            if task is None or task['status'] != 'pending':
+                continue
+            task.update(status='processing', processingStartedAt=_iso(now), workerId=worker_id or '',
+                        attempts=task.get('attempts', 0) + 1, _leased=now)
+            self.processing[task_id] = now + self.lease_seconds
+            leased.append(self._public(task_id))
+        return leased
+
+    def lease(self, max_tasks: int, worker_id: str, wait_seconds: float) -> List[Dict[str, Any]]:
+        count = max(1, min(MAX_LEASE_BATCH, max_tasks))
+        deadline = time.time() + min(max(0.0, wait_seconds), self.max_wait_seconds)
+        with self._cond:
+            # 与 api/_lib/queue.js 一致：过期租约只在第一次尝试时回收
+            reap = True
+            while True:
+                leased = self._lease_now(count, worker_id, reap)
+                reap = False
+                remaining = deadline - time.time()
+                if leased or remaining <= 0:
+                    return leased
+                self._cond.wait(timeout=min(remaining, 1.0))
+
+    def heartbeat(self, task_ids: List[str], worker_id: str) -> List[str]:
+        expiry = time.time() + self.lease_seconds
+        extended = []
+        with self._cond:
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task_id in self.processing and task and task.get('workerId') == worker_id:
+                    self.processing[task_id] = expiry
+                    extended.append(task_id)
+        return extended
+
+    def append(self, task_id: str, worker_id: Optional[str], segments: Any) -> Tuple[int, Dict[str, Any]]:
+        if not isinstance(segments, list) or not segments:
+            return 400, {'error': 'segments must be a non-empty array'}
+        if len(segments) > MAX_APPEND_SEGMENTS:
+            return 413, {'error': f'At most {MAX_APPEND_SEGMENTS} segments per append'}
+        with self._cond:
+            task = self.tasks.get(task_id)
+            if not task or task['status'] != 'processing' or (worker_id and task.get('workerId') != worker_id):
+                return 409, {'error': 'Task is not processing under this worker'}
+            stored = self.segments.setdefault(task_id, [])
+            stored.extend(str(line) for line in segments)
+            return 200, {'success': True, 'segmentCount': len(stored)}
+
+    def status(self, task_id: Optional[str], offset: int, fmt: str = 'txt') -> Tuple[int, Dict[str, Any]]:
+        if not task_id:
+            return 400, {'error': 'Task ID is required'}
+        if fmt != 'txt' and fmt not in OUTPUT_FORMATS:
+            return 400, {'error': f"format must be one of txt, {', '.join(OUTPUT_FORMATS)}"}
+        with self._cond:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return 404, {'error': 'Task not found'}
+            response = {
+                'taskId': task_id,
+                'status': task['status'],
+                'createdAt': task['createdAt'],
+                'processingStartedAt': task.get('processingStartedAt'),
+                'completedAt': task.get('completedAt'),
+                'source': task.get('source'),
+            }
+            offset = max(0, offset)
+            if task['status'] == 'processing':
+                stored = self.segments.get(task_id, [])
+                segments = stored[offset:]
+                response.update(segments=segments, segmentCount=len(stored), next=offset + len(segments))
+            elif task['status'] == 'completed':
+                outputs = task.get('outputs') or {}
+                response['formats'] = ['txt', *outputs]
+                if fmt == 'txt':
+                    response['result'] = decode_result(task)
+                elif fmt not in outputs:
+                    return 404, {'error': f'Format {fmt} not available', 'formats': response['formats']}
+                else:
+                    response.update(format=fmt, output=decode_result(outputs[fmt]))
+            elif task['status'] == 'failed':
+                response['error'] = task.get('error')
+            if task.get('childCount'):
+                response.update(childCount=task['childCount'], childrenDone=task['childrenDone'])
+            return 200, response
+
+    def complete(self, task_id: Optional[str], result: Optional[str], error: Optional[str],
+                 source: Optional[str] = None, outputs: Any = None,
+                 worker_id: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+        if not task_id:
+            return 400, {'error': 'Task ID is required'}
+        if outputs and not error and (not isinstance(outputs, dict) or any(
+                fmt not in OUTPUT_FORMATS or not isinstance(text, str) or not text for fmt, text in outputs.items())):
+            return 400, {'error': f"outputs must map {' / '.join(OUTPUT_FORMATS)} to non-empty strings"}
+        now = time.time()
+        with self._cond:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return 404, {'error': 'Task not found'}
+            # 已完成的任务不再被（例如租约丢失后的）迟到上报覆盖
+            if task['status'] == 'completed':
+                return 409, {'error': 'Task already completed'}
+            # 已流式追加全部片段的工作器可省略 result，由服务端拼接
+            if not error and not result:
+                result = '\n'.join(self.segments.get(task_id, []))
+            # 工作器的上报只接受最后一次领取者的：处理中照常接受；租约已被回收（重新排队或已判失败）时
+            # 只接受非空结果并把任务移出队列，迟到的失败上报不能取消重试
+            if worker_id:
+                late_result = task['status'] in ('pending', 'failed') and not error and result
+                if task.get('workerId') != worker_id or (task['status'] != 'processing' and not late_result):
+                    return 409, {'error': 'Task is no longer leased to this worker'}
+            if task['status'] == 'pending':
+                self._unqueue(task_id)
+            if not error:
+                task.update(encode_result(result))
+                if outputs:
+                    task['outputs'] = {fmt: encode_result(text) for fmt, text in outputs.items()}
+            previous = task['status']
+            task.update(status='failed' if error else 'completed',
+                        error=error or None, completedAt=_iso(now), _completed=now)
+            if source in RESULT_SOURCES:
+                task['source'] = source
+                if not error:
+                    self.stats[f'result_source:{source}'] += 1
+            self.processing.pop(task_id, None)
+            self.segments.pop(task_id, None)
+            self._release(task, task_id)
+            # 先报失败后又报完成的子任务只计一次
+            if previous != 'failed':
+                self._child_done(task)
+            if not error and result:
+                if TRANSCRIPT_REUSE_SECONDS > 0:
+                    self.transcripts[(task['videoId'], extract_part(task['videoUrl']))] = (
+                        task_id, now + TRANSCRIPT_REUSE_SECONDS)
+        return 200, {'success': True, 'message': 'Task updated successfully'}
+
+    def _public(self, task_id: str) -> Dict[str, Any]:
+        """对外返回的任务字段（去掉内部计时字段）"""
+        task = self.tasks[task_id]
+        return {'taskId': task_id, **{k: v for k, v in task.items() if not k.startswith('_')}}
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    store: TaskStore = None  # 由 make_server 注入
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Optional[Dict[str, Any]] = None):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        if body is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        data = self.rfile.read(length)
+        if (self.headers.get('Content-Encoding') or '').lower() == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data)
+
+    def _route(self, method: str):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.store.stats[f"{method} {url.path}"] += 1
+        self.store.stats['api_calls'] += 1
+
+        if method == 'OPTIONS':
+            return self._send(200)
+
+        if url.path == '/api/test':
+            return self._send(200, {'message': 'API is working!', 'timestamp': _iso(time.time()), 'method': method})
+
+        if url.path == '/api/submit-task' and method == 'POST':
+            body = self._json_body()
+            submitter = normalize_submitter(body.get('submitter'), self.client_address[0])
+            return self._send(*self.store.submit(body.get('videoUrl'), body.get('expand', False),
+                                                 body.get('priority', DEFAULT_PRIORITY), submitter,
+                                                 body.get('duration'), bool(body.get('dryRun'))))
+
+        if url.path == '/api/queue-stats' and method == 'GET':
+            return self._send(200, self.store.queue_stats())
+
+        if url.path == '/api/get-pending-task' and method == 'GET':
+            max_tasks = query.get('max')
+            tasks = self.store.lease(int(max_tasks or 1), query.get('worker_id', ''),
+                                     float(query.get('wait') or 0))
+            if max_tasks:
+                return self._send(200, {'tasks': tasks, 'leaseSeconds': self.store.lease_seconds})
+            return self._send(200, {'task': tasks[0] if tasks else None, 'leaseSeconds': self.store.lease_seconds})
+
+        if url.path == '/api/get-pending-task' and method == 'POST':
+            body = self._json_body()
+            if body.get('partial'):
+                if not body.get('taskId'):
+                    return self._send(400, {'error': 'Task ID is required'})
+                return self._send(*self.store.append(body['taskId'], body.get('workerId'), body.get('segments')))
+            return self._send(*self.store.complete(body.get('taskId'), body.get('result'), body.get('error'),
+                                                   body.get('source'), body.get('outputs'), body.get('workerId')))
+
+        if url.path == '/api/expand-task' and method == 'POST':
+            body = self._json_body()
+            return self._send(*self.store.expand(body.get('taskId'), body.get('workerId'), body.get('children')))
+
+        if url.path == '/api/task-status' and method == 'GET':
+            return self._send(*self.store.status(query.get('taskId'), int(query.get('from') or 0),
+                                                 query.get('format', 'txt')))
+
+        if url.path == '/api/heartbeat-task' and method == 'POST':
+            body = self._json_body()
+            task_ids, worker_id = body.get('taskIds'), body.get('workerId')
+            if not isinstance(task_ids, list) or not worker_id:
+                return self._send(400, {'error': 'taskIds and workerId are required'})
+            extended = self.store.heartbeat(task_ids, worker_id)
+            return self._send(200, {
+                'success': True,
+                'extended': extended,
+                'lost': [t for t in task_ids if t not in extended],
+                'leaseSeconds': self.store.lease_seconds,
+            })
+
+        if url.path.startswith('/api/'):
+            return self._send(405, {'error': 'Method not allowed'})
+        self._send(404, {'error': 'Not found'})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_OPTIONS(self):
+        self._route('OPTIONS')
+
+
+def make_server(host: str = '127.0.0.1', port: int = 3000, store: Optional[TaskStore] = None) -> ThreadingHTTPServer:
+    """创建（未启动的）本地 API 服务，port 为 0 时随机分配端口"""
+    handler = type('BoundAPIHandler', (APIHandler,), {'store': store or TaskStore()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地任务 API 服务（内存存储）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, TaskStore(lease_seconds=args.lease_seconds))
+    print(f"🚀 本地 API 服务已启动: http://{args.host}:{server.server_port}")
+    print(f"   运行工作器: python worker.py http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 服务已停止")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Worker 指标
+无依赖的计数器 / 直方图，以 Prometheus 文本格式在内嵌 HTTP 端点 /metrics 上暴露，
+用于在压力下定位瓶颈（领取延迟、下载速度、转码耗时、识别实时率、上报耗时、排队时间、失败原因）
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """按分桶累计的观测值分布，同时给出总和与次数"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # 标签 → ([各桶计数], 总和, 次数)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """记录 with 块的耗时（秒），块内抛出异常时同样记录"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 同名指标只注册一次（例如模块被重复导入），返回已有的实例
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---- Worker 的各项指标（worker.py 与 worker-enhanced.py 共用） ----
+
+POLL_SECONDS = REGISTRY.histogram(
+    "worker_poll_seconds", "领取任务请求的耗时（含长轮询挂起时间）", ["outcome"])
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "worker_queue_wait_seconds", "任务从提交到被领取的排队时间",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200))
+DOWNLOAD_BYTES = REGISTRY.counter(
+    "worker_download_bytes_total", "下载的音频字节数", ["mode"])
+DOWNLOAD_BYTES_PER_SECOND = REGISTRY.histogram(
+    "worker_download_bytes_per_second", "单个任务的音频下载速度（字节/秒）", ["mode"],
+    buckets=(64e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6, 25e6, 50e6))
+FFMPEG_SECONDS = REGISTRY.histogram(
+    "worker_ffmpeg_seconds", "ffmpeg 转码耗时")
+ASR_REAL_TIME_FACTOR = REGISTRY.histogram(
+    "worker_asr_real_time_factor", "语音识别实时率（识别耗时 / 音频时长）", ["model"],
+    buckets=(0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5))
+ASR_BATCH_SIZE = REGISTRY.histogram(
+    "worker_asr_batch_size", "批量解码时每批的音频段数", buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32))
+AUDIO_SECONDS = REGISTRY.counter(
+    "worker_audio_seconds_total", "已识别的音频总时长（秒）", ["model"])
+UPLOAD_SECONDS = REGISTRY.histogram(
+    "worker_upload_seconds", "上报结果 / 追加片段请求的耗时", ["kind"])
+STAGE_SECONDS = REGISTRY.histogram(
+    "worker_stage_seconds", "各处理步骤的耗时", ["stage"])
+POSTPROCESS_SECONDS = REGISTRY.histogram(
+    "worker_postprocess_seconds", "文本后处理各步骤的耗时", ["step"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+TASKS = REGISTRY.counter(
+    "worker_tasks_total", "处理结束的任务数", ["outcome", "source"])
+FAILURES = REGISTRY.counter(
+    "worker_failures_total", "按原因统计的失败次数", ["stage", "cause"])
+
+
+def record_queue_wait(created_at: Optional[str]):
+    """按任务的 createdAt（ISO 8601，UTC）记录排队时间"""
+    if not created_at:
+        return
+    try:
+        created = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    except ValueError:
+        return
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    QUEUE_WAIT_SECONDS.observe(max(0.0, (datetime.now(timezone.utc) - created).total_seconds()))
+
+
+def record_failure(stage: str, error: BaseException):
+    FAILURES.inc(stage=stage, cause=type(error).__name__)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        data = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """在后台线程中启动 /metrics 端点，port 为 0 时随机分配端口"""
+    handler = type("BoundMetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
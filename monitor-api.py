@@ -1,60 +1,242 @@
 #!/usr/bin/env python3
 """
 API 状态监控脚本
+用 asyncio 并发探测多个部署的各个接口，把每次探测的状态码和延迟追加到本地时序文件（JSONL），
+滚动输出各接口的延迟分位数，并报告队列深度和最久等待任务的时长。
+提交接口使用 dryRun 探测，只做校验和查询，不会把任务放进真实队列
+
+    python monitor-api.py                                  # 每 30 秒探测默认部署
+    python monitor-api.py https://a.vercel.app http://localhost:3000 --interval 10
+    python monitor-api.py --once                           # 只探测一轮
+    python monitor-api.py --report --since 24              # 从时序文件统计最近 24 小时
 """
 
-import requests
+import argparse
+import asyncio
+import json
+import math
+import os
 import time
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+DEFAULT_DEPLOYMENTS = ["https://bilibili-transcript.vercel.app"]
+DEPLOYMENTS = [d.strip() for d in os.getenv("MONITOR_DEPLOYMENTS", "").split(",") if d.strip()] or DEFAULT_DEPLOYMENTS
+SERIES_FILE = os.getenv("MONITOR_SERIES_FILE", "monitor-series.jsonl")
+INTERVAL = int(os.getenv("MONITOR_INTERVAL", "30"))
+TIMEOUT = float(os.getenv("MONITOR_TIMEOUT", "10"))
+# 最久等待任务超过这个秒数时告警
+PENDING_AGE_ALERT = float(os.getenv("MONITOR_PENDING_AGE_ALERT", "600"))
+# 滚动分位数使用的最近样本数（每个部署 × 接口）
+WINDOW = 200
+
+# 合成探测用的视频：合法的 URL，dryRun 提交不会入队
+PROBE_VIDEO_URL = "https://www.bilibili.com/video/BV1GJ411x7h7"
+PROBE_TASK_ID = "monitor_probe"
+
+# (名称, 方法, 路径, 请求体, 视为正常的状态码)
+PROBES = [
+    ("test", "GET", "/api/test", None, (200,)),
+    ("submit-dry-run", "POST", "/api/submit-task", {"videoUrl": PROBE_VIDEO_URL, "dryRun": True}, (200,)),
+    # 不存在的任务：只读查询，404 即正常
+    ("task-status", "GET", f"/api/task-status?taskId={PROBE_TASK_ID}", None, (404,)),
+    ("queue-stats", "GET", "/api/queue-stats", None, (200,)),
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """最近秩法的分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _request(session: requests.Session, method: str, url: str, body: Optional[Dict[str, Any]]) -> Tuple[int, Any]:
+    response = session.request(method, url, json=body, timeout=TIMEOUT)
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    return response.status_code, data
+
+
+async def probe(session: requests.Session, deployment: str, name: str, method: str, path: str,
+                body: Optional[Dict[str, Any]], expected: Iterable[int]) -> Dict[str, Any]:
+    """执行一次探测，返回一条时序样本"""
+    sample: Dict[str, Any] = {"ts": time.time(), "deployment": deployment, "endpoint": name}
+    started = time.perf_counter()
+    try:
+        status, data = await asyncio.to_thread(_request, session, method, deployment + path, body)
+    except requests.RequestException as e:
+        sample.update(status=None, ok=False, error=type(e).__name__)
+        data = None
+    else:
+        sample.update(status=status, ok=status in expected)
+    sample["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    if name == "queue-stats" and sample["ok"] and isinstance(data, dict):
+        sample["pending"] = data.get("pending")
+        sample["processing"] = data.get("processing")
+        sample["oldest_pending_seconds"] = data.get("oldestPendingSeconds")
+    return sample
+
+
+async def probe_round(sessions: Dict[str, requests.Session]) -> List[Dict[str, Any]]:
+    """所有部署的所有接口并发探测一轮"""
+    return await asyncio.gather(*(
+        probe(session, deployment, *spec)
+        for deployment, session in sessions.items()
+        for spec in PROBES
+    ))
+
+
+def append_samples(path: str, samples: List[Dict[str, Any]]):
+    with open(path, "a", encoding="utf-8") as f:
+        for sample in samples:
+            f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+
 
-def check_api():
-    """检查 API 状态"""
-    endpoints = [
-        "/api/test",
-        "/api/get-pending-task", 
-        "/api/submit-task"
-    ]
-    
-    base_url = "https://bilibili-transcript.vercel.app"
-    
-    print(f"🔍 检查 {base_url} 的 API 状态...")
-    
-    for endpoint in endpoints:
-        url = base_url + endpoint
-        try:
-            if endpoint == "/api/submit-task":
-                # POST 请求
-                response = requests.post(url, json={"videoUrl": "test"}, timeout=5)
-            else:
-                # GET 请求
-                response = requests.get(url, timeout=5)
-                
-            if response.status_code == 200:
-                print(f"✅ {endpoint}: 工作正常")
+def load_samples(path: str, since: float = 0) -> List[Dict[str, Any]]:
+    samples = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
                 try:
-                    data = response.json()
-                    print(f"   📋 响应: {data}")
-                except:
-                    print(f"   📝 响应: {response.text[:100]}")
-            else:
-                print(f"❌ {endpoint}: {response.status_code}")
-                
-        except Exception as e:
-            print(f"❌ {endpoint}: 连接失败 ({e})")
-    
+                    sample = json.loads(line)
+                except ValueError:
+                    continue
+                if sample.get("ts", 0) >= since:
+                    samples.append(sample)
+    except FileNotFoundError:
+        pass
+    return samples
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return f"{value:.0f}ms" if value is not None else "-"
+
+
+def print_latency_table(latencies: Dict[Tuple[str, str], List[float]], failures: Dict[Tuple[str, str], int],
+                        totals: Dict[Tuple[str, str], int]):
+    header = "".join(f"{'p' + str(p):>10}" for p in PERCENTILES)
+    print(f"   {'部署 / 接口':<56}{header}{'失败率':>10}")
+    for key in sorted(totals):
+        deployment, endpoint = key
+        values = latencies.get(key, [])
+        cells = "".join(f"{_format_ms(percentile(values, p)):>10}" for p in PERCENTILES)
+        rate = failures.get(key, 0) / totals[key] if totals[key] else 0
+        print(f"   {deployment + ' ' + endpoint:<56}{cells}{rate:>10.1%}")
+
+
+def print_round(samples: List[Dict[str, Any]], window: Dict[Tuple[str, str], Deque[Dict[str, Any]]]):
+    print(f"🔍 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    for sample in samples:
+        mark = "✅" if sample["ok"] else "❌"
+        status = sample["status"] if sample["status"] is not None else sample.get("error")
+        print(f"{mark} {sample['deployment']} {sample['endpoint']}: {status} ({sample['latency_ms']:.0f}ms)")
+        if sample["endpoint"] == "queue-stats" and sample["ok"]:
+            oldest = sample.get("oldest_pending_seconds")
+            print(f"   📋 队列: 等待 {sample.get('pending')}，处理中 {sample.get('processing')}，"
+                  f"最久等待 {f'{oldest:.0f}秒' if oldest is not None else '-'}")
+            if oldest is not None and oldest > PENDING_AGE_ALERT:
+                print(f"   ⚠️  最久等待任务已排队 {oldest:.0f} 秒（阈值 {PENDING_AGE_ALERT:.0f} 秒），Worker 可能不足或已停止")
+
+    latencies = {key: [s["latency_ms"] for s in recent if s["ok"]] for key, recent in window.items()}
+    failures = {key: sum(1 for s in recent if not s["ok"]) for key, recent in window.items()}
+    totals = {key: len(recent) for key, recent in window.items()}
+    print(f"📈 最近 {WINDOW} 次探测的延迟:")
+    print_latency_table(latencies, failures, totals)
     print("-" * 50)
 
+
+async def monitor(deployments: List[str], interval: int, series_file: str, once: bool = False):
+    sessions = {deployment.rstrip("/"): requests.Session() for deployment in deployments}
+    window: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(lambda: deque(maxlen=WINDOW))
+    try:
+        while True:
+            started = time.monotonic()
+            samples = await probe_round(sessions)
+            append_samples(series_file, samples)
+            for sample in samples:
+                window[(sample["deployment"], sample["endpoint"])].append(sample)
+            print_round(samples, window)
+            if once:
+                return
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        for session in sessions.values():
+            session.close()
+
+
+def report(series_file: str, since_hours: float):
+    """从时序文件统计各接口的延迟分位数和队列积压"""
+    samples = load_samples(series_file, time.time() - since_hours * 3600)
+    if not samples:
+        print(f"📭 {series_file} 中没有最近 {since_hours:g} 小时的样本")
+        return
+
+    latencies: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+    failures: Dict[Tuple[str, str], int] = defaultdict(int)
+    totals: Dict[Tuple[str, str], int] = defaultdict(int)
+    oldest: Dict[str, float] = {}
+    pending: Dict[str, int] = {}
+    for sample in samples:
+        key = (sample["deployment"], sample["endpoint"])
+        totals[key] += 1
+        if sample.get("ok"):
+            latencies[key].append(sample["latency_ms"])
+        else:
+            failures[key] += 1
+        if sample.get("oldest_pending_seconds") is not None:
+            oldest[sample["deployment"]] = max(oldest.get(sample["deployment"], 0), sample["oldest_pending_seconds"])
+        if sample.get("pending") is not None:
+            pending[sample["deployment"]] = max(pending.get(sample["deployment"], 0), sample["pending"])
+
+    first = datetime.fromtimestamp(min(s["ts"] for s in samples)).strftime("%Y-%m-%d %H:%M")
+    last = datetime.fromtimestamp(max(s["ts"] for s in samples)).strftime("%Y-%m-%d %H:%M")
+    print(f"📊 {series_file}: {len(samples)} 个样本（{first} ~ {last}）")
+    print_latency_table(latencies, failures, totals)
+    for deployment in sorted(set(pending) | set(oldest)):
+        age = oldest.get(deployment)
+        print(f"   📋 {deployment}: 最大等待数 {pending.get(deployment, 0)}，"
+              f"最久等待 {f'{age:.0f}秒' if age is not None else '-'}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="并发探测各部署的 API，记录延迟分位数和队列积压")
+    parser.add_argument("deployments", nargs="*", help="部署地址（默认 MONITOR_DEPLOYMENTS 或线上地址）")
+    parser.add_argument("--interval", type=int, default=INTERVAL, help=f"探测间隔秒数（默认 {INTERVAL}）")
+    parser.add_argument("--output", default=SERIES_FILE, help=f"时序文件（默认 {SERIES_FILE}）")
+    parser.add_argument("--once", action="store_true", help="只探测一轮")
+    parser.add_argument("--report", action="store_true", help="不探测，只统计时序文件")
+    parser.add_argument("--since", type=float, default=24, help="--report 统计最近多少小时（默认 24）")
+    args = parser.parse_args()
+
+    if args.report:
+        report(args.output, args.since)
+        return
+
+    deployments = args.deployments or DEPLOYMENTS
     print("🚀 API 状态监控")
-    print("按 Ctrl+C 停止监控")
+    print(f"🌐 部署: {', '.join(deployments)}")
+    print(f"💾 时序文件: {args.output}")
+    if not args.once:
+        print("按 Ctrl+C 停止监控")
     print("=" * 50)
-    
+
     try:
-        while True:
-            check_api()
-            print("⏳ 等待 30 秒...")
-            time.sleep(30)
+        asyncio.run(monitor(deployments, args.interval, args.output, args.once))
     except KeyboardInterrupt:
         print("\n👋 监控已停止")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+分阶段流水线
+每个阶段有独立的线程和有界输入队列，使下载、转码、转写可以在不同任务之间重叠执行
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1, queue_size: int = 2):
+        """
+        流水线阶段
+
+        Args:
+            name: 阶段名称
+            func: 处理函数，接收任务对象并返回交给下一阶段的任务对象
+            workers: 该阶段的并发线程数
+            queue_size: 输入队列容量（满时上游阻塞，形成背压）
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        """阶段统计：队列深度、忙碌线程数和占用率"""
+        with self._lock:
+            busy_seconds = self.busy_seconds
+            return {
+                'name': self.name,
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'busy': self.busy,
+                'workers': self.workers,
+                'processed': self.processed,
+                'failed': self.failed,
+                'occupancy': busy_seconds / (elapsed * self.workers) if elapsed > 0 else 0.0,
+            }
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage],
+                 on_done: Optional[Callable[[Any], None]] = None,
+                 on_error: Optional[Callable[[Any, Exception, Stage], None]] = None):
+        """
+        由多个阶段串联而成的流水线
+
+        Args:
+            stages: 按顺序排列的阶段
+            on_done: 任务走完最后一个阶段后的回调
+            on_error: 任务在某阶段抛出异常时的回调，该任务不再进入后续阶段
+        """
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.stages = stages
+        self.on_done = on_done
+        self.on_error = on_error
+        self._threads: List[threading.Thread] = []
+        self._in_flight = 0
+        self._in_flight_lock = threading.Condition()
+        self._started_at: Optional[float] = None
+
+    def start(self):
+        """启动所有阶段的工作线程"""
+        self._started_at = time.monotonic()
+        for index, stage in enumerate(self.stages):
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._stage_loop,
+                    args=(stage, next_stage),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def has_capacity(self) -> bool:
+        """第一阶段的输入队列是否还有空位"""
+        return not self.stages[0].queue.full()
+
+    def free_slots(self) -> int:
+        """第一阶段输入队列的剩余空位数"""
+        first = self.stages[0].queue
+        return max(0, first.maxsize - first.qsize())
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> bool:
+        """提交任务到第一阶段，队列已满时最多阻塞 timeout 秒"""
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            self.stages[0].queue.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            self._finish_one()
+            return False
+
+    @property
+    def in_flight(self) -> int:
+        """流水线中尚未完成的任务数"""
+        with self._in_flight_lock:
+            return self._in_flight
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待流水线中的任务全部完成"""
+        with self._in_flight_lock:
+            return self._in_flight_lock.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+
+    def stop(self, drain: bool = True):
+        """停止流水线；drain 为 True 时先等待已提交的任务完成"""
+        if drain:
+            self.join()
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """所有阶段的统计信息"""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return [stage.stats(elapsed) for stage in self.stages]
+
+    def format_stats(self) -> str:
+        """单行格式的阶段统计，便于打印"""
+        parts = []
+        for s in self.stats():
+            parts.append(
+                f"{s['name']}[队列 {s['queue_depth']}/{s['queue_size']} "
+                f"忙碌 {s['busy']}/{s['workers']} 占用 {s['occupancy']:.0%}]"
+            )
+        return " → ".join(parts)
+
+    def _finish_one(self):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+            self._in_flight_lock.notify_all()
+
+    def _stage_loop(self, stage: Stage, next_stage: Optional[Stage]):
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                return
+
+            with stage._lock:
+                stage.busy += 1
+            started = time.monotonic()
+            try:
+                result = stage.func(item)
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+            finally:
+                with stage._lock:
+                    stage.busy -= 1
+                    stage.busy_seconds += time.monotonic() - started
+
+            if error is not None:
+                with stage._lock:
+                    stage.failed += 1
+                if self.on_error:
+                    try:
+                        self.on_error(item, error, stage)
+                    except Exception:
+                        pass
+                self._finish_one()
+                continue
+
+            with stage._lock:
+                stage.processed += 1
+
+            if next_stage is not None:
+                # 下游队列满时在此阻塞，形成背压
+                next_stage.queue.put(result)
+                continue
+
+            if self.on_done:
+                try:
+                    self.on_done(result)
+                except Exception:
+                    pass
+            self._finish_one()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+多P视频与合集展开
+用 yt-dlp --flat-playlist 只读取列表元数据（不下载），得到按顺序排列的各分P/各视频链接，
+由服务端为每一项创建子任务，分发给多个工作器并行处理
+"""
+
+import json
+import subprocess
+from typing import Any, Dict, List
+
+# 读取列表元数据的超时（秒），大合集可能需要分页请求多次
+FLAT_PLAYLIST_TIMEOUT = 120
+
+
+def flat_playlist_command(url: str) -> List[str]:
+    """只读取列表元数据的 yt-dlp 命令，输出一个 JSON"""
+    return ["yt-dlp", "--flat-playlist", "--dump-single-json", "--quiet", "--no-warnings", url]
+
+
+def parse_flat_playlist(info: Dict[str, Any], url: str) -> List[Dict[str, Any]]:
+    """把 yt-dlp --flat-playlist 的 JSON 转成视频列表（格式见 flat_playlist）"""
+    if info.get("_type") != "playlist":
+        return [{"videoUrl": info.get("webpage_url") or url, "title": info.get("title") or "",
+                 "duration": info.get("duration")}]
+
+    videos = []
+    for entry in info.get("entries") or []:
+        video_url = entry.get("url") or entry.get("webpage_url")
+        if not video_url and entry.get("id"):
+            video_url = f"https://www.bilibili.com/video/{entry['id']}"
+        if video_url:
+            videos.append({"videoUrl": video_url, "title": entry.get("title") or "",
+                           "duration": entry.get("duration")})
+    return videos
+
+
+def flat_playlist(url: str) -> List[Dict[str, Any]]:
+    """
+    列出链接包含的所有视频
+
+    Returns:
+        [{"videoUrl": ..., "title": ..., "duration": 秒数或 None}, ...]，单个视频返回一项；
+        duration 供服务端按时长调度
+
+    Raises:
+        subprocess.CalledProcessError: yt-dlp 执行失败
+    """
+    result = subprocess.run(
+        flat_playlist_command(url),
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=FLAT_PLAYLIST_TIMEOUT,
+    )
+    return parse_flat_playlist(json.loads(result.stdout), url)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+转写文本后处理
+语音识别之后依次执行：繁体转简体（OpenCC）、折叠模型循环输出的重复内容、恢复标点。
+每一步都可以单独开关并分别计时，整体只增加毫秒级的耗时
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+import metrics
+from transcriber import Segment, TranscriptionResult
+
+# 各步骤开关：POSTPROCESS_T2S 为 auto 时，安装了 OpenCC 且语言为中文才转换
+POSTPROCESS_T2S = os.getenv("POSTPROCESS_T2S", "auto")
+POSTPROCESS_DEDUP = os.getenv("POSTPROCESS_DEDUP", "1") != "0"
+# 标点恢复：rule（按停顿补标点，不需要模型）、funasr（FunASR ct-punc 模型）、off
+PUNCTUATION = os.getenv("PUNCTUATION", "rule")
+PUNCTUATION_MODEL = os.getenv("PUNCTUATION_MODEL", "ct-punc")
+# 标点模型每批处理的片段数
+PUNCTUATION_BATCH_SIZE = int(os.getenv("PUNCTUATION_BATCH_SIZE", "64"))
+
+# 片段内：周期不超过 DEDUP_MAX_PERIOD 个字的内容连续重复至少 DEDUP_MIN_REPEATS 次时折叠
+DEDUP_MAX_PERIOD = 16
+DEDUP_MIN_REPEATS = 4
+# 片段间：周期不超过 DEDUP_MAX_LINES 行的内容连续重复至少 DEDUP_MIN_LINE_REPEATS 次时折叠
+DEDUP_MAX_LINES = 4
+DEDUP_MIN_LINE_REPEATS = 3
+# 与下一段的间隔超过该秒数（或是最后一段）时按句末处理
+SENTENCE_GAP = 0.8
+
+STEPS = ("t2s", "dedup", "punctuation")
+
+_CJK = "一-鿿㐀-䶿"
+_HAS_CJK = re.compile(f"[{_CJK}]")
+# whisper 常用空格代替中文分句处的标点
+_CJK_SPACE = re.compile(f"(?<=[{_CJK}])\\s+(?=[{_CJK}])")
+_TRAILING_PUNCTUATION = "，。！？；：、…,.!?;:"
+
+
+def repeat_runs(seq: Sequence[Hashable], period: int, min_repeats: int) -> Iterator[Tuple[int, int]]:
+    """
+    一次线性扫描找出 seq 中以 period 为周期连续重复至少 min_repeats 次的区间
+
+    Yields:
+        (起点, 完整重复次数)，区间互不重叠
+    """
+    n = len(seq)
+    run = 0
+    for i in range(n - period + 1):
+        if i + period < n and seq[i] == seq[i + period]:
+            run += 1
+            continue
+        # run 个位置与下一周期相同，即从 i - run 开始有 (run + period) // period 个完整周期
+        if run >= period * (min_repeats - 1):
+            yield i - run, (run + period) // period
+        run = 0
+
+
+def collapse_text(text: str, max_period: int = DEDUP_MAX_PERIOD, min_repeats: int = DEDUP_MIN_REPEATS) -> str:
+    """
+    折叠片段内的循环重复（如「谢谢谢谢谢谢」「我们我们我们我们」），耗时 O(长度 × max_period)
+    单字重复保留两个（「谢谢」「哈哈」），更长的重复保留一个；纯数字不折叠
+    """
+    for period in range(1, min(max_period, len(text) // min_repeats) + 1):
+        parts = []
+        last = 0
+        for start, repeats in repeat_runs(text, period, min_repeats):
+            unit = text[start:start + period]
+            if unit.isdigit() or unit.isspace():
+                continue
+            keep = 2 if period == 1 else 1
+            parts.append(text[last:start + period * keep])
+            last = start + period * repeats
+        if parts:
+            text = "".join(parts) + text[last:]
+    return text
+
+
+def collapse_segments(segments: List[Segment], max_period: int = DEDUP_MAX_LINES,
+                      min_repeats: int = DEDUP_MIN_LINE_REPEATS) -> List[Segment]:
+    """
+    折叠连续重复的片段（如同一句被识别成十几行），保留一个周期，
+    并把它的最后一段延长到被折叠区间的结束时间
+    """
+    for period in range(1, max_period + 1):
+        keys = [s.text.strip() for s in segments]
+        kept = []
+        last = 0
+        for start, repeats in repeat_runs(keys, period, min_repeats):
+            if not any(keys[start:start + period]):
+                continue
+            end = segments[start + period * repeats - 1].end
+            kept.extend(segments[last:start + period - 1])
+            tail = segments[start + period - 1]
+            kept.append(Segment(tail.start, end, tail.text, tail.confidence))
+            last = start + period * repeats
+        if kept:
+            segments = kept + segments[last:]
+    return segments
+
+
+def rule_punctuate(segments: List[Segment]) -> List[str]:
+    """不需要模型的标点：中文之间的空格换成逗号，句末按与下一段的停顿补句号或逗号"""
+    texts = []
+    for i, segment in enumerate(segments):
+        text = segment.text.strip()
+        if not _HAS_CJK.search(text):
+            texts.append(text)
+            continue
+        text = _CJK_SPACE.sub("，", text)
+        if text and text[-1] not in _TRAILING_PUNCTUATION:
+            last = i + 1 == len(segments)
+            text += "。" if last or segments[i + 1].start - segment.end >= SENTENCE_GAP else "，"
+        texts.append(text)
+    return texts
+
+
+class FunASRPunctuator:
+    """FunASR 的标点模型（默认 ct-punc），常驻内存，按批处理片段文本"""
+
+    def __init__(self, model_name: str = PUNCTUATION_MODEL, batch_size: int = PUNCTUATION_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load_model(self):
+        from funasr import AutoModel
+        return AutoModel(model=self.model_name, disable_update=True)
+
+    def __call__(self, segments: List[Segment]) -> List[str]:
+        texts = [s.text.strip() for s in segments]
+        punctuated = []
+        with self._lock:
+            if self._model is None:
+                self._model = self._load_model()
+            for i in range(0, len(texts), self.batch_size):
+                batch = texts[i:i + self.batch_size]
+                # 空文本不送入模型
+                inputs = [t for t in batch if t]
+                outputs = iter(r["text"] for r in self._model.generate(input=inputs)) if inputs else iter(())
+                punctuated.extend(next(outputs) if t else t for t in batch)
+        return punctuated
+
+
+def _load_t2s() -> Optional[Callable[[str], str]]:
+    """OpenCC 繁体转简体（兼容 opencc 与 opencc-python-reimplemented），未安装时返回 None"""
+    try:
+        import opencc
+    except ImportError:
+        return None
+    return opencc.OpenCC("t2s").convert
+
+
+class PostProcessor:
+    def __init__(self, t2s: Optional[str] = None, dedup: Optional[bool] = None,
+                 punctuation: Optional[str] = None):
+        """
+        Args:
+            t2s: 繁体转简体：auto（有 OpenCC 且为中文时）、1、0（默认读取 POSTPROCESS_T2S）
+            dedup: 是否折叠重复内容（默认读取 POSTPROCESS_DEDUP）
+            punctuation: rule、funasr 或 off（默认读取 PUNCTUATION）
+        """
+        self.t2s_mode = (t2s or POSTPROCESS_T2S).lower()
+        self.dedup = POSTPROCESS_DEDUP if dedup is None else dedup
+        self.punctuation = (punctuation or PUNCTUATION).lower()
+        if self.punctuation not in ("rule", "funasr", "off"):
+            raise ValueError(f"未知的标点恢复方式: {self.punctuation}（可选: rule, funasr, off）")
+
+        self._t2s = _load_t2s() if self.t2s_mode != "0" else None
+        if self.t2s_mode == "1" and self._t2s is None:
+            raise RuntimeError("POSTPROCESS_T2S=1 需要安装 OpenCC: pip install opencc-python-reimplemented")
+        self._punctuate = {"rule": rule_punctuate, "funasr": FunASRPunctuator()}.get(self.punctuation)
+
+    def steps(self, language: Optional[str] = None) -> List[str]:
+        """对该语言会执行的步骤"""
+        zh = (language or "zh").startswith("zh")
+        enabled = {
+            "t2s": self._t2s is not None and (self.t2s_mode == "1" or zh),
+            "dedup": self.dedup,
+            "punctuation": self._punctuate is not None,
+        }
+        return [step for step in STEPS if enabled[step]]
+
+    def process(self, result: TranscriptionResult) -> Tuple[TranscriptionResult, Dict[str, float]]:
+        """
+        Returns:
+            (处理后的结果, {步骤: 耗时秒数})；没有启用任何步骤时原样返回
+        """
+        steps = self.steps(result.language)
+        segments = list(result.segments)
+        timings: Dict[str, float] = {}
+        for step in steps:
+            started = time.perf_counter()
+            if step == "t2s":
+                # 整段文本一次转换，避免每段调用一次
+                texts = self._t2s("\n".join(s.text.replace("\n", " ") for s in segments)).split("\n")
+                segments = [Segment(s.start, s.end, t, s.confidence) for s, t in zip(segments, texts)]
+            elif step == "dedup":
+                segments = [Segment(s.start, s.end, collapse_text(s.text), s.confidence) for s in segments]
+                segments = collapse_segments(segments)
+            elif step == "punctuation":
+                texts = self._punctuate(segments)
+                segments = [Segment(s.start, s.end, t, s.confidence) for s, t in zip(segments, texts)]
+            timings[step] = time.perf_counter() - started
+            metrics.POSTPROCESS_SECONDS.observe(timings[step], step=step)
+        if not steps:
+            return result, timings
+        return TranscriptionResult(segments, language=result.language), timings
+
+
+_postprocessor: Optional[PostProcessor] = None
+_postprocessor_lock = threading.Lock()
+
+
+def get_postprocessor() -> PostProcessor:
+    """进程内共用一个后处理器（标点模型只加载一次）"""
+    global _postprocessor
+    with _postprocessor_lock:
+        if _postprocessor is None:
+            _postprocessor = PostProcessor()
+    return _postprocessor
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{step} {seconds * 1000:.1f}ms" for step, seconds in timings.items()) or "未启用"
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+转写片段流式上传
+识别引擎每产出一段就交给 SegmentUploader，按条数或时间间隔攒批追加到服务端，
+用户在任务处理期间即可看到部分结果，最终结果也不必一次性上传
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentUploader:
+    def __init__(self, send: Callable[[List[str]], None], flush_interval: float = 5.0, max_batch: int = 50):
+        """
+        Args:
+            send: 追加片段的函数，参数为一批 `[HH:MM:SS] 文本` 行，失败时抛出异常
+            flush_interval: 距上次上传超过该秒数时立即上传已攒的片段
+            max_batch: 攒够该条数时立即上传（不应超过服务端 MAX_APPEND_SEGMENTS）
+        """
+        self.send = send
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, max_batch)
+        self.sent = 0
+        self.failed = False
+
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @property
+    def delivered_all(self) -> bool:
+        """所有片段是否都已成功追加，此时结束任务时可省略完整结果，由服务端拼接"""
+        with self._lock:
+            return not self.failed and not self._pending and self.sent > 0
+
+    def add(self, line: str):
+        with self._lock:
+            if self.failed:
+                return
+            self._pending.append(line)
+            due = (len(self._pending) >= self.max_batch
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not batch:
+            return
+        try:
+            self.send(batch)
+        except Exception as e:
+            # 服务端列表出现缺口后不再继续追加，最终结果改为完整上传
+            logger.warning(f"转写片段上传失败，改为任务结束后上传完整结果: {e}")
+            with self._lock:
+                self.failed = True
+                self._pending = []
+            return
+        with self._lock:
+            self.sent += len(batch)
+
+    def close(self) -> bool:
+        """上传剩余片段，返回 delivered_all"""
+        self.flush()
+        return self.delivered_all
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Bilibili 字幕快速通道
+视频已有 UP 主上传或 AI 生成的 CC 字幕时，直接读取字幕并转成与 ASR 相同的
+`[HH:MM:SS] 文本` 格式，跳过音频下载和语音识别，几秒内即可完成
+"""
+
+import json
+import os
+import re
+import subprocess
+import urllib.request
+from typing import Dict, List, Optional
+
+from transcriber import Segment, TranscriptionResult
+
+# 字幕语言优先级：人工中文字幕优先，其次 AI 中文字幕
+SUBTITLE_LANGUAGES = [
+    lang.strip() for lang in os.getenv("SUBTITLE_LANGUAGES", "zh-Hans,zh-CN,zh,zh-Hant,ai-zh").split(",")
+    if lang.strip()
+]
+
+# 读取视频元数据（含字幕轨道）的超时（秒）
+PROBE_TIMEOUT = 60
+
+_SRT_TIME = r"(\d+):(\d{2}):(\d{2})[,.](\d{3})"
+_SRT_CUE = re.compile(rf"{_SRT_TIME}\s*-->\s*{_SRT_TIME}[^\n]*\n(.*?)(?:\n\s*\n|\Z)", re.S)
+
+
+def _seconds(h, m, s, ms) -> float:
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
+
+
+def parse_srt(text: str) -> List[Segment]:
+    """解析 SRT / WebVTT 字幕"""
+    segments = []
+    for match in _SRT_CUE.finditer(text.replace("\r\n", "\n")):
+        content = re.sub(r"<[^>]+>", "", match.group(9)).strip()
+        if content:
+            segments.append(Segment(_seconds(*match.group(1, 2, 3, 4)),
+                                    _seconds(*match.group(5, 6, 7, 8)),
+                                    " ".join(content.splitlines())))
+    return segments
+
+
+def parse_bilibili_json(text: str) -> List[Segment]:
+    """解析 Bilibili 字幕接口返回的 JSON（body: [{from, to, content}, ...]）"""
+    body = json.loads(text).get("body") or []
+    return [Segment(float(c["from"]), float(c["to"]), c["content"].strip())
+            for c in body if c.get("content", "").strip()]
+
+
+def probe_command(url: str) -> List[str]:
+    """读取视频元数据（不下载视频）的 yt-dlp 命令，输出一个 JSON"""
+    return ["yt-dlp", "--dump-single-json", "--skip-download", "--no-playlist",
+            "--quiet", "--no-warnings", url]
+
+
+def subtitle_tracks(info: Dict) -> Dict[str, List[Dict]]:
+    """从视频元数据中取出字幕轨道：{语言: [{"ext": ..., "url" 或 "data": ...}, ...]}，不含弹幕"""
+    tracks = {**(info.get("automatic_captions") or {}), **(info.get("subtitles") or {})}
+    tracks.pop("danmaku", None)
+    return tracks
+
+
+def probe_subtitles(url: str) -> Dict[str, List[Dict]]:
+    """读取视频的字幕轨道（不下载视频）"""
+    result = subprocess.run(
+        probe_command(url),
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=PROBE_TIMEOUT,
+    )
+    return subtitle_tracks(json.loads(result.stdout))
+
+
+def pick_track(tracks: Dict[str, List[Dict]], languages: Optional[List[str]] = None) -> Optional[Dict]:
+    """按语言优先级选出一条可解析的字幕"""
+    for lang in languages or SUBTITLE_LANGUAGES:
+        for track in tracks.get(lang) or []:
+            if track.get("ext") in ("srt", "vtt", "json"):
+                return {**track, "lang": lang}
+    return None
+
+
+def parse_track(track: Dict, text: str) -> Optional[TranscriptionResult]:
+    """解析 pick_track 选出的字幕内容，没有任何字幕段时返回 None"""
+    segments = parse_bilibili_json(text) if track["ext"] == "json" else parse_srt(text)
+    if not segments:
+        return None
+    return TranscriptionResult(segments, language=track["lang"])
+
+
+def fetch_subtitles(url: str, languages: Optional[List[str]] = None) -> Optional[TranscriptionResult]:
+    """
+    有匹配的字幕时返回转写结果，否则返回 None（调用方回退到 ASR）
+
+    Raises:
+        subprocess.CalledProcessError: yt-dlp 读取元数据失败
+    """
+    track = pick_track(probe_subtitles(url), languages)
+    if track is None:
+        return None
+
+    # yt-dlp 通常已把 Bilibili 字幕转成 SRT 放在 data 中，否则按 url 下载
+    text = track.get("data")
+    if text is None:
+        with urllib.request.urlopen(track["url"], timeout=30) as response:
+            text = response.read().decode("utf-8")
+    return parse_track(track, text)
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+语音识别引擎
+每个进程只加载一次模型并常驻内存，避免每个任务重新启动 whisper CLI、重复加载权重
+"""
+
+import bisect
+import os
+import json
+import math
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from audio import PCMAudio, split_on_silence
+from transcript_formats import RENDERERS, parse_json
+
+# 音频输入：文件路径，或 audio.stream_pcm() 得到的内存 PCM
+AudioInput = Union[str, PCMAudio]
+
+# 可用后端，按自动选择时的优先级排列
+BACKENDS = ("faster-whisper", "openai-whisper", "cli")
+
+# faster-whisper (CTranslate2) 的计算精度和 CPU 线程数
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))  # 0 表示由后端决定
+# 批量解码时每个窗口的最大时长（秒），与 whisper 的 30 秒输入窗口一致
+BATCH_WINDOW_SECONDS = 30.0
+# 批量解码时一次送入模型的窗口数上限
+BATCH_DECODE_SIZE = int(os.getenv("WHISPER_BATCH_DECODE_SIZE", "16"))
+# 进程内最多常驻的模型数，超出时释放最久未使用的（自动选择模型时会在几个模型之间切换）
+MAX_RESIDENT_MODELS = max(1, int(os.getenv("WHISPER_MAX_RESIDENT_MODELS", "2")))
+
+
+class Segment:
+    def __init__(self, start: float, end: float, text: str, confidence: Optional[float] = None):
+        """带起止时间（秒）的一段转写文本；confidence 为 0~1 的平均词概率，字幕等来源为 None"""
+        self.start = start
+        self.end = end
+        self.text = text
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"Segment({self.start:.2f}, {self.end:.2f}, {self.text!r})"
+
+    @property
+    def timestamped_line(self) -> str:
+        return f"[{format_timestamp(self.start)}] {self.text.strip()}"
+
+
+# 每识别出一段即回调，用于流式上传部分结果
+SegmentCallback = Callable[[Segment], None]
+
+
+def logprob_confidence(avg_logprob: Optional[float]) -> Optional[float]:
+    """whisper 的 avg_logprob → 0~1 的置信度"""
+    if avg_logprob is None:
+        return None
+    return round(math.exp(min(0.0, avg_logprob)), 4)
+
+
+def format_timestamp(seconds: float) -> str:
+    """秒数 → HH:MM:SS"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class TranscriptionResult:
+    def __init__(self, segments: List[Segment], language: Optional[str] = None):
+        self.segments = segments
+        self.language = language
+        self._rendered: Dict[str, str] = {}
+
+    @classmethod
+    def from_json(cls, data: str) -> "TranscriptionResult":
+        """由 render("json") 的输出还原（例如从转录缓存读取）"""
+        segments, language = parse_json(data)
+        return cls([Segment(s["start"], s["end"], s["text"], s.get("confidence")) for s in segments], language)
+
+    @classmethod
+    def from_cache(cls, data: str) -> Optional["TranscriptionResult"]:
+        """转录缓存中的内容：片段 JSON 时还原结果，旧版本缓存的纯文本返回 None"""
+        try:
+            return cls.from_json(data)
+        except ValueError:
+            return None
+
+    def render(self, fmt: str) -> str:
+        """渲染为 txt / srt / vtt / json，首次请求某种格式时才生成"""
+        if fmt not in self._rendered:
+            self._rendered[fmt] = RENDERERS[fmt](self.segments, self.language)
+        return self._rendered[fmt]
+
+    @property
+    def text(self) -> str:
+        """与 whisper `--output_format txt` 一致：每段一行"""
+        return "\n".join(s.text.strip() for s in self.segments)
+
+    @property
+    def timestamped_text(self) -> str:
+        """每段一行并带 [HH:MM:SS] 起始时间，与 worker.py 的输出格式一致"""
+        return self.render("txt")
+
+
+class TranscriptionEngine:
+    """识别引擎基类：load() 只执行一次，之后 transcribe() 复用已加载的模型，unload() 后释放"""
+
+    backend = ""
+
+    def __init__(self, model_name: str, language: Optional[str] = None, threads: Optional[int] = None):
+        self.model_name = model_name
+        self.language = language
+        # CPU 推理线程数，None 时使用 WHISPER_THREADS
+        self.threads = WHISPER_THREADS if threads is None else threads
+        self._model = None
+        self._load_lock = threading.Lock()
+        # 正在进行的转写数；retired 为 True 时最后一个转写结束即释放模型
+        self._active = 0
+        self._retired = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def retired(self) -> bool:
+        """已被移出常驻引擎（unload() 过），不应再为它创建后台线程"""
+        return self._retired
+
+    def load(self):
+        with self._load_lock:
+            if self._model is None:
+                self._model = self._load_model()
+        return self
+
+    def unload(self):
+        """释放模型（被移出常驻引擎时调用），有转写正在进行时等它们结束后释放"""
+        with self._load_lock:
+            self._retired = True
+            if not self._active:
+                self._release()
+
+    def transcribe(self, audio: AudioInput, on_segment: Optional[SegmentCallback] = None) -> TranscriptionResult:
+        """转写音频；on_segment 会按时间顺序收到每一段（支持流式的后端边识别边回调）"""
+        with self._in_use():
+            return self._transcribe(audio, on_segment)
+
+    def transcribe_batch(self, clips: List[PCMAudio]) -> List[TranscriptionResult]:
+        """一次转写多段短音频，结果与 clips 一一对应"""
+        with self._in_use():
+            return self._transcribe_batch(clips)
+
+    @contextmanager
+    def _in_use(self):
+        """加载模型并在转写期间阻止 unload() 释放它"""
+        with self._load_lock:
+            if self._model is None:
+                self._model = self._load_model()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._load_lock:
+                self._active -= 1
+                if self._retired and not self._active:
+                    self._release()
+
+    def _release(self):
+        """丢弃模型引用（调用方持有 _load_lock）"""
+        self._model = None
+
+    def _load_model(self):
+        raise NotImplementedError
+
+    def _transcribe_batch(self, clips: List[PCMAudio]) -> List[TranscriptionResult]:
+        """不支持批量解码的后端逐段转写"""
+        return [self._transcribe(clip, None) for clip in clips]
+
+    def _transcribe(self, audio: AudioInput, on_segment: Optional[SegmentCallback]) -> TranscriptionResult:
+        raise NotImplementedError
+
+
+def _collect(segments: Iterable[Segment], on_segment: Optional[SegmentCallback]) -> List[Segment]:
+    """消费片段迭代器，逐段回调"""
+    collected = []
+    for segment in segments:
+        collected.append(segment)
+        if on_segment:
+            on_segment(segment)
+    return collected
+
+
+def _model_input(audio: AudioInput):
+    """Python 后端可直接接收 float32 数组，无需写文件"""
+    if isinstance(audio, PCMAudio):
+        return audio.to_float32()
+    return audio
+
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """faster-whisper (CTranslate2)，CPU 上默认使用 int8 量化"""
+
+    backend = "faster-whisper"
+
+    def __init__(self, model_name, language=None, threads=None):
+        super().__init__(model_name, language, threads)
+        self._batched = None
+
+    def _load_model(self):
+        from faster_whisper import WhisperModel
+        return WhisperModel(
+            self.model_name,
+            device="cpu",
+            compute_type=WHISPER_COMPUTE_TYPE,
+            cpu_threads=self.threads,
+        )
+
+    def _release(self):
+        super()._release()
+        self._batched = None
+
+    def _transcribe(self, audio, on_segment):
+        # faster-whisper 返回惰性生成器，边解码边回调
+        segments, info = self._model.transcribe(_model_input(audio), language=self.language)
+        return TranscriptionResult(
+            _collect((Segment(s.start, s.end, s.text, logprob_confidence(s.avg_logprob)) for s in segments),
+                     on_segment),
+            language=info.language,
+        )
+
+    def _transcribe_batch(self, clips):
+        """
+        多段音频拼接后交给 BatchedInferencePipeline，一次批量解码；
+        每个解码窗口（≤30 秒，在静音处切分）只属于一段音频，再按偏移（秒）把片段分回各段。
+        clip_timestamps 直接用于切片拼接后的数组，单位是采样点而不是秒。
+        整批只会检测一次语言，未指定语言时逐段转写，各段分别检测
+        """
+        if self.language is None:
+            return super()._transcribe_batch(clips)
+        try:
+            from faster_whisper import BatchedInferencePipeline
+        except ImportError:
+            # faster-whisper < 1.1 没有批量解码
+            return super()._transcribe_batch(clips)
+        if len(clips) < 2:
+            return super()._transcribe_batch(clips)
+        if self._batched is None:
+            self._batched = BatchedInferencePipeline(model=self._model)
+
+        sample_rate = clips[0].sample_rate
+        offsets, windows, data = [], [], []
+        offset = 0.0
+        for clip in clips:
+            offsets.append(offset)
+            for start, chunk in split_on_silence(clip, target_seconds=BATCH_WINDOW_SECONDS * 0.8,
+                                                 max_seconds=BATCH_WINDOW_SECONDS):
+                windows.append({"start": round((offset + start) * sample_rate),
+                                "end": round((offset + start + chunk.duration) * sample_rate)})
+            data.append(clip.data)
+            offset += clip.duration
+
+        segments, _ = self._batched.transcribe(
+            PCMAudio(b"".join(data), sample_rate).to_float32(),
+            language=self.language,
+            batch_size=min(len(windows), BATCH_DECODE_SIZE),
+            vad_filter=False,
+            clip_timestamps=windows,
+        )
+
+        per_clip: List[List[Segment]] = [[] for _ in clips]
+        for s in segments:
+            index = max(0, bisect.bisect_right(offsets, s.start) - 1)
+            base = offsets[index]
+            end = min(s.end - base, clips[index].duration)
+            per_clip[index].append(Segment(s.start - base, end, s.text, logprob_confidence(s.avg_logprob)))
+        return [TranscriptionResult(clip_segments, language=self.language) for clip_segments in per_clip]
+
+
+class OpenAIWhisperEngine(TranscriptionEngine):
+    """openai-whisper (PyTorch)"""
+
+    backend = "openai-whisper"
+
+    def __init__(self, model_name, language=None, threads=None):
+        super().__init__(model_name, language, threads)
+        # PyTorch 模型不保证并发安全，同一进程内串行推理
+        self._infer_lock = threading.Lock()
+
+    def _load_model(self):
+        import whisper
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+        return whisper.load_model(self.model_name, device="cpu")
+
+    def _transcribe(self, audio, on_segment):
+        with self._infer_lock:
+            result = self._model.transcribe(_model_input(audio), language=self.language, fp16=False)
+        return TranscriptionResult(
+            _collect((Segment(s["start"], s["end"], s["text"], logprob_confidence(s.get("avg_logprob")))
+                      for s in result["segments"]), on_segment),
+            language=result.get("language"),
+        )
+
+
+class WhisperCLIEngine(TranscriptionEngine):
+    """调用 whisper 命令行（每次都会重新加载模型），作为没有 Python 后端时的兜底"""
+
+    backend = "cli"
+
+    def _load_model(self):
+        if shutil.which("whisper") is None:
+            raise RuntimeError("未找到 whisper 命令")
+        return "whisper"
+
+    def _transcribe(self, audio, on_segment):
+        output_dir = tempfile.mkdtemp()
+        try:
+            if isinstance(audio, PCMAudio):
+                audio_path = os.path.join(output_dir, "audio.wav")
+                audio.write_wav(audio_path)
+            else:
+                audio_path = audio
+
+            cmd = [
+                "whisper", audio_path,
+                "--model", self.model_name,
+                "--output_format", "json",
+                "--output_dir", output_dir,
+            ]
+            if self.language:
+                cmd += ["--language", self.language]
+            if self.threads:
+                cmd += ["--threads", str(self.threads)]
+            subprocess.run(cmd, check=True, capture_output=True)
+
+            name = os.path.splitext(os.path.basename(audio_path))[0]
+            with open(os.path.join(output_dir, f"{name}.json"), encoding="utf-8") as f:
+                result = json.load(f)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        return TranscriptionResult(
+            _collect((Segment(s["start"], s["end"], s["text"], logprob_confidence(s.get("avg_logprob")))
+                      for s in result["segments"]), on_segment),
+            language=result.get("language"),
+        )
+
+
+ENGINE_CLASSES = {
+    "faster-whisper": FasterWhisperEngine,
+    "openai-whisper": OpenAIWhisperEngine,
+    "cli": WhisperCLIEngine,
+}
+
+
+def backend_available(backend: str) -> bool:
+    """检查后端依赖是否已安装"""
+    if backend == "faster-whisper":
+        try:
+            import faster_whisper  # noqa: F401
+            return True
+        except ImportError:
+            return False
+    if backend == "openai-whisper":
+        try:
+            import whisper  # noqa: F401
+            return True
+        except ImportError:
+            return False
+    if backend == "cli":
+        return shutil.which("whisper") is not None
+    return False
+
+
+def available_backends() -> List[str]:
+    return [b for b in BACKENDS if backend_available(b)]
+
+
+def parse_model_spec(spec: str) -> Tuple[Optional[str], str]:
+    """
+    解析 WHISPER_MODEL
+
+    格式为 `[后端:]模型`，例如 `base`、`faster-whisper:small`、`openai-whisper:medium`、`cli:base`。
+    未指定后端时返回 None，由 create_engine 自动选择。
+    """
+    if ":" in spec:
+        backend, model = spec.split(":", 1)
+        if backend not in ENGINE_CLASSES:
+            raise ValueError(f"未知的识别后端: {backend}（可选: {', '.join(BACKENDS)}）")
+        return backend, model
+    return None, spec
+
+
+def create_engine(spec: str, language: Optional[str] = None, threads: Optional[int] = None) -> TranscriptionEngine:
+    """根据 WHISPER_MODEL 创建引擎（不加载模型）"""
+    backend, model = parse_model_spec(spec)
+    if backend is None:
+        backends = available_backends()
+        if not backends:
+            raise RuntimeError("没有可用的 Whisper 后端，请安装 faster-whisper 或 openai-whisper")
+        backend = backends[0]
+    return ENGINE_CLASSES[backend](model, language, threads)
+
+
+EngineKey = Tuple[str, Optional[str], Optional[int]]
+
+# 按最近使用排序，最多 MAX_RESIDENT_MODELS 个
+_engines: "OrderedDict[EngineKey, TranscriptionEngine]" = OrderedDict()
+_engines_lock = threading.Lock()
+_eviction_callbacks: List[Callable[[TranscriptionEngine], None]] = []
+
+
+def on_engine_evicted(callback: Callable[[TranscriptionEngine], None]):
+    """注册引擎被移出常驻集合时的回调（在释放模型之前调用），用于停止绑定在该引擎上的后台线程"""
+    _eviction_callbacks.append(callback)
+
+
+def get_engine(spec: Optional[str] = None, language: Optional[str] = None,
+               threads: Optional[int] = None) -> TranscriptionEngine:
+    """
+    获取当前进程内常驻的引擎，同一配置只创建一次；
+    常驻引擎超过 MAX_RESIDENT_MODELS 个时释放最久未使用的引擎及其分块转写进程池
+    """
+    spec = spec or os.getenv("WHISPER_MODEL", "base")
+    key = (spec, language, threads)
+    evicted: List[Tuple[EngineKey, TranscriptionEngine]] = []
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = create_engine(spec, language, threads)
+            while len(_engines) > MAX_RESIDENT_MODELS:
+                evicted.append(_engines.popitem(last=False))
+        else:
+            _engines.move_to_end(key)
+        resident = {(s, lang) for s, lang, _ in _engines}
+
+    for (old_spec, old_language, _), old in evicted:
+        for callback in _eviction_callbacks:
+            callback(old)
+        old.unload()
+        if (old_spec, old_language) not in resident:
+            shutdown_chunk_pool(old_spec, old_language)
+    return engine
+
+
+# ---- 长音频：按静音切块后多进程并行转写 ----
+
+# 超过该时长（秒）的音频走分块并行转写
+LONG_AUDIO_SECONDS = float(os.getenv("LONG_AUDIO_SECONDS", "1800"))
+# 每块的目标时长（秒）
+CHUNK_SECONDS = float(os.getenv("CHUNK_SECONDS", "300"))
+# 并行转写的进程数，每个进程各自加载一份模型；0 表示按 CPU 核数 ÷ 每个模型的线程数自动决定
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "0"))
+# 未校准线程数（WHISPER_THREADS=0）时按每个模型占用的线程数估算进程数，与 CTranslate2 的默认值相同
+CHUNK_DEFAULT_THREADS = 4
+
+_chunk_pools: Dict[Tuple[str, Optional[str]], ProcessPoolExecutor] = {}
+_chunk_pools_lock = threading.Lock()
+
+# 分块转写子进程中模型使用的线程数，由 _init_chunk_worker 设置
+_chunk_threads: Optional[int] = None
+
+
+def chunk_pool_size(workers: Optional[int] = None, threads: Optional[int] = None) -> Tuple[int, int]:
+    """
+    分块转写的（进程数, 每个进程的线程数），两者之积不超过 CPU 核数；
+    threads 为单个模型校准出的线程数，未给出时用 WHISPER_THREADS
+    """
+    cpus = os.cpu_count() or 1
+    threads = threads or WHISPER_THREADS or CHUNK_DEFAULT_THREADS
+    workers = max(1, workers or CHUNK_WORKERS or cpus // threads)
+    return workers, max(1, cpus // workers)
+
+
+def _init_chunk_worker(spec: str, language: Optional[str], threads: int):
+    """子进程启动时预加载模型，之后该进程的所有分块复用"""
+    global _chunk_threads
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _chunk_threads = threads
+    get_engine(spec, language, threads).load()
+
+
+def _transcribe_chunk(spec: str, language: Optional[str], data: bytes, sample_rate: int):
+    result = get_engine(spec, language, _chunk_threads).transcribe(PCMAudio(data, sample_rate))
+    return [(s.start, s.end, s.text, s.confidence) for s in result.segments], result.language
+
+
+def get_chunk_pool(spec: str, language: Optional[str] = None, workers: Optional[int] = None,
+                   threads: Optional[int] = None) -> ProcessPoolExecutor:
+    """常驻的分块转写进程池，同一配置只创建一次；进程数和每个进程的线程数见 chunk_pool_size"""
+    key = (spec, language)
+    with _chunk_pools_lock:
+        pool = _chunk_pools.get(key)
+        if pool is None:
+            workers, worker_threads = chunk_pool_size(workers, threads)
+            pool = _chunk_pools[key] = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_chunk_worker,
+                initargs=(spec, language, worker_threads),
+            )
+    return pool
+
+
+def shutdown_chunk_pool(spec: str, language: Optional[str] = None):
+    """释放某个模型的分块转写进程池，已提交的分块仍会转写完成"""
+    with _chunk_pools_lock:
+        pool = _chunk_pools.pop((spec, language), None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+def shutdown_chunk_pools():
+    with _chunk_pools_lock:
+        for pool in _chunk_pools.values():
+            pool.shutdown(wait=True)
+        _chunk_pools.clear()
+
+
+def transcribe_long(audio: PCMAudio, spec: Optional[str] = None, language: Optional[str] = None,
+                    workers: Optional[int] = None, on_segment: Optional[SegmentCallback] = None,
+                    threads: Optional[int] = None) -> TranscriptionResult:
+    """
+    按静音边界把长音频切成约 CHUNK_SECONDS 的块，在进程池中并行转写，
+    再按块的起始偏移修正时间戳后合并为一个结果；on_segment 按块顺序回调。
+    threads 为该模型校准出的线程数，用于决定进程池的大小
+    """
+    spec = spec or os.getenv("WHISPER_MODEL", "base")
+    chunks = split_on_silence(audio, target_seconds=CHUNK_SECONDS, max_seconds=CHUNK_SECONDS * 1.4)
+    pool = get_chunk_pool(spec, language, workers, threads)
+
+    futures = [
+        (offset, pool.submit(_transcribe_chunk, spec, language, chunk.data, chunk.sample_rate))
+        for offset, chunk in chunks
+    ]
+
+    segments = []
+    detected_language = None
+    for offset, future in futures:
+        chunk_segments, chunk_language = future.result()
+        detected_language = detected_language or chunk_language
+        segments.extend(_collect(
+            (Segment(start + offset, end + offset, text, confidence)
+             for start, end, text, confidence in chunk_segments),
+            on_segment,
+        ))
+    return TranscriptionResult(segments, language=language or detected_language)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+本地转录结果缓存
+按 (视频ID, 分P, 模型, 语言) 寻址，超出容量时按最近最少使用淘汰，索引持久化在磁盘上
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "bilibili-transcript" / "transcripts"
+DEFAULT_MAX_MB = 512
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """从链接中提取 BV/av 号，规则与 api/submit-task.js 一致"""
+    match = re.search(r'(?:BV[\w]+|av\d+)', url, re.IGNORECASE)
+    return match.group(0) if match else None
+
+
+def extract_part(url: str) -> int:
+    """从链接的 ?p= 参数中提取分P序号，默认为 1"""
+    try:
+        return max(1, int(parse_qs(urlparse(url).query).get('p', ['1'])[0]))
+    except ValueError:
+        return 1
+
+
+class TranscriptCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            cache_dir: 缓存目录（默认读取 TRANSCRIPT_CACHE_DIR）
+            max_bytes: 缓存容量上限（默认读取 TRANSCRIPT_CACHE_MAX_MB，单位 MB）
+        """
+        self.cache_dir = Path(cache_dir or os.getenv('TRANSCRIPT_CACHE_DIR') or DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.getenv('TRANSCRIPT_CACHE_MAX_MB', str(DEFAULT_MAX_MB))) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.index_file = self.cache_dir / 'index.json'
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    @staticmethod
+    def make_key(video_id: str, part: int, model: str, language: str) -> str:
+        raw = f"{video_id.lower()}\0{part}\0{model}\0{language}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, video_id: str, part: int, model: str, language: str) -> Optional[str]:
+        """查询缓存，命中时返回转录文本并刷新访问时间（只改内存中的索引，随下次 put 写回）"""
+        key = self.make_key(video_id, part, model, language)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                try:
+                    transcript = self._entry_path(key).read_text(encoding='utf-8')
+                except OSError:
+                    # 文件被外部删除，索引失效
+                    del self._index[key]
+                    self._save_index()
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry['last_access'] = time.time()
+            self.hits += 1
+            return transcript
+
+    def put(self, video_id: str, part: int, model: str, language: str, transcript: str):
+        """写入缓存，超出容量时淘汰最久未访问的条目"""
+        key = self.make_key(video_id, part, model, language)
+        data = transcript.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            path = self._entry_path(key)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+            now = time.time()
+            self._index[key] = {
+                'video_id': video_id,
+                'part': part,
+                'model': model,
+                'language': language,
+                'size': len(data),
+                'created': now,
+                'last_access': now,
+            }
+            self._evict()
+            self._save_index()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._index),
+                'bytes': sum(e['size'] for e in self._index.values()),
+            }
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.txt"
+
+    def _evict(self):
+        total = sum(e['size'] for e in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= self._index.pop(key)['size']
+            try:
+                self._entry_path(key).unlink()
+            except OSError:
+                pass
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 丢弃文件已不存在的条目
+        return {k: v for k, v in index.items() if self._entry_path(k).exists()}
+
+    def _save_index(self):
+        tmp = self.index_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp, self.index_file)
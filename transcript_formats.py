@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+转写结果的输出格式
+由同一份片段列表（起止时间、文本、置信度）生成 TXT / SRT / VTT / JSON，一次识别即可得到所有格式
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 与 api/_lib/queue.js 的 OUTPUT_FORMATS 一致；txt 即任务的 result，其余作为附加输出上传
+FORMATS = ("txt", "srt", "vtt", "json")
+# 文件扩展名（json 避免与元数据文件 <name>.json 冲突）
+EXTENSIONS = {"txt": "txt", "srt": "srt", "vtt": "vtt", "json": "segments.json"}
+
+
+def parse_formats(value: str) -> List[str]:
+    """解析逗号分隔的格式列表（如 OUTPUT_FORMATS=txt,srt），去重并保持顺序"""
+    formats = []
+    for name in (value or "").split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in FORMATS:
+            raise ValueError(f"未知的输出格式: {name}（可选: {', '.join(FORMATS)}）")
+        if name not in formats:
+            formats.append(name)
+    return formats
+
+
+def _clock(seconds: float, separator: str) -> str:
+    """秒数 → HH:MM:SS,mmm（SRT）或 HH:MM:SS.mmm（VTT）"""
+    millis = max(0, int(round(seconds * 1000)))
+    hours, millis = divmod(millis, 3600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def render_txt(segments: Sequence[Any], language: Optional[str] = None) -> str:
+    """每段一行并带 [HH:MM:SS] 起始时间（任务 result 的格式）"""
+    return "\n".join(s.timestamped_line for s in segments)
+
+
+def render_srt(segments: Sequence[Any], language: Optional[str] = None) -> str:
+    blocks = [
+        f"{i}\n{_clock(s.start, ',')} --> {_clock(s.end, ',')}\n{s.text.strip()}\n"
+        for i, s in enumerate(segments, 1)
+    ]
+    return "\n".join(blocks)
+
+
+def render_vtt(segments: Sequence[Any], language: Optional[str] = None) -> str:
+    blocks = ["WEBVTT\n"] + [
+        f"{_clock(s.start, '.')} --> {_clock(s.end, '.')}\n{s.text.strip()}\n"
+        for s in segments
+    ]
+    return "\n".join(blocks)
+
+
+def render_json(segments: Sequence[Any], language: Optional[str] = None) -> str:
+    return json.dumps({
+        "language": language,
+        "segments": [
+            {
+                "start": round(s.start, 3),
+                "end": round(s.end, 3),
+                "text": s.text.strip(),
+                "confidence": s.confidence,
+            }
+            for s in segments
+        ],
+    }, ensure_ascii=False)
+
+
+def parse_json(data: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    解析 render_json 的输出
+
+    Returns:
+        (片段字典列表, 语言)
+
+    Raises:
+        ValueError: 不是 render_json 生成的内容
+    """
+    parsed = json.loads(data)
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("segments"), list):
+        raise ValueError("不是片段 JSON")
+    return parsed["segments"], parsed.get("language")
+
+
+def render_outputs(result: Any, formats: Sequence[str]) -> Optional[Dict[str, str]]:
+    """
+    随结果上传的附加格式：formats 中 txt 以外的，只渲染配置了的格式
+
+    Args:
+        result: TranscriptionResult；为 None（例如旧版缓存只有文本）时返回 None
+    """
+    if result is None:
+        return None
+    return {fmt: result.render(fmt) for fmt in formats if fmt != "txt"} or None
+
+
+RENDERERS: Dict[str, Callable[[Sequence[Any], Optional[str]], str]] = {
+    "txt": render_txt,
+    "srt": render_srt,
+    "vtt": render_vtt,
+    "json": render_json,
+}
@@ -10,24 +10,105 @@ import time
 import json
 import subprocess
 import requests
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 import socket
 import tempfile
 import shutil
 
+import metrics
+from audio import PCMAudio, stream_pcm
+from audio_cache import AudioCache
+from backoff import AdaptiveBackoff
+from batching import get_batcher, shutdown_batchers
+from calibration import load_calibration, select_model
+from compression import encode_json_body
+from heartbeat import LeaseHeartbeat, LeaseLost
+from pipeline import Pipeline, Stage
+from playlist import flat_playlist
+from postprocess import format_timings, get_postprocessor
+from segment_stream import SegmentUploader
+from subtitles import fetch_subtitles
+from transcriber import (LONG_AUDIO_SECONDS, TranscriptionResult, available_backends, get_engine,
+                         shutdown_chunk_pools, transcribe_long)
+from transcript_cache import TranscriptCache, extract_part, extract_video_id
+from transcript_formats import EXTENSIONS, parse_formats, render_outputs
+
 # 配置
 API_BASE = "https://bilibili-transcript.vercel.app/api"
 WORKER_ID = socket.gethostname()  # 使用机器名作为 Worker ID
-CHECK_INTERVAL = 30  # 检查间隔（秒）
+CHECK_INTERVAL = 30  # 队列为空时的最长退避间隔（秒），出错后也按此间隔重试
+LONG_POLL_SECONDS = 20  # 长轮询：服务端挂起请求等待新任务的最长时间（秒）
+HEARTBEAT_INTERVAL = 30  # 租约心跳间隔（秒），需明显小于服务端 LEASE_SECONDS（默认 120）
+
+# 所有 API 请求共用一个会话，复用 TCP/TLS 连接（领取、心跳、上传来自多个线程，连接池相应放大）；
+# requests 没有会话级超时，每个请求都显式传入 timeout
+SESSION = requests.Session()
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=16))
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=16))
 
 # iCloud Drive 路径
 ICLOUD_BASE = Path.home() / "Library/Mobile Documents/com~apple~CloudDocs/bilibili transcripts"
 
 # Whisper 配置
-WHISPER_MODEL = "base"  # 可选: tiny, base, small, medium, large-v3
+# 可选: tiny, base, small, medium, large-v3；可加后端前缀，如 faster-whisper:small、openai-whisper:base、cli:base
+# auto：按 calibration.py 在本机测得的实时率选择模型和线程数（未校准时使用 base），
+# 也可指定为 base、faster-whisper:small 等固定模型
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "auto")
+FALLBACK_MODEL = "base"
+# 自动选择模型时查询队列积压的最短间隔（秒），积压越多选越快的模型
+QUEUE_STATS_INTERVAL = 60
+
+# 在该端口暴露 Prometheus 格式的 /metrics（例如 METRICS_PORT=9464），默认不开启
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
 WHISPER_LANGUAGE = "zh"  # 中文
 
+# 本地转录缓存：同一视频、分P、模型、语言的结果直接复用
+TRANSCRIPT_CACHE = TranscriptCache()
+
+# 本地音频缓存：解码好的 PCM 保留到结果上报之后，转写失败重试或换模型重跑时跳过下载和转码；
+# 未完成的下载留在缓存目录中断点续传
+AUDIO_CACHE = AudioCache()
+
+# 输出格式（逗号分隔，可选 txt、srt、vtt、json）：同一次识别的片段按需渲染，
+# 保存到 iCloud 并随结果上传；txt 总是保存，也是任务的 result
+OUTPUT_FORMATS = parse_formats(os.getenv("OUTPUT_FORMATS", "txt"))
+
+# 各结果来源（subtitles / asr / cache）的任务数
+SOURCE_COUNTS = Counter()
+
+# 字幕快速通道：视频已有 CC 字幕（人工或 AI）时直接使用，跳过下载和转写
+SUBTITLE_FAST_PATH = True
+
+# 流式音频：yt-dlp 输出直接经管道交给 ffmpeg 解码为内存 PCM，跳过 MP3 转码和临时文件
+STREAM_AUDIO = True
+
+# 转写过程中把识别出的片段分批追加到服务端，网页可实时看到部分结果；
+# 全部追加成功时结束任务不再上传完整文本，由服务端拼接
+STREAM_PARTIAL_RESULTS = True
+PARTIAL_FLUSH_SECONDS = 5  # 片段攒批上传的最长间隔（秒）
+
+# 短音频批量解码：流水线中同时转写的多个短音频攒成一批交给常驻模型一次解码，
+# 攒够 WHISPER_BATCH_SIZE 段或第一段等满 WHISPER_BATCH_WAIT 秒即开始；1 表示关闭。
+# 只有不超过 WHISPER_BATCH_MAX_CLIP 秒的音频参与批量，更长的仍单独（或分块并行）转写
+BATCH_MAX_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "1"))
+BATCH_MAX_WAIT = float(os.getenv("WHISPER_BATCH_WAIT", "2"))
+BATCH_MAX_CLIP_SECONDS = float(os.getenv("WHISPER_BATCH_MAX_CLIP", "300"))
+
+# 流水线配置：开启后下载、转码、转写在不同任务之间重叠执行
+PIPELINE_ENABLED = True
+# 各阶段的并发线程数和输入队列容量，可根据输出的占用率调整
+# 流式模式下没有 convert 阶段，解码在 download 阶段内完成
+PIPELINE_STAGES = {
+    "download": {"workers": 1, "queue_size": 2},
+    "convert": {"workers": 1, "queue_size": 2},
+    # 批量解码时需要同样多的转写线程同时等待，才能攒成一批
+    "transcribe": {"workers": max(1, BATCH_MAX_SIZE), "queue_size": max(2, BATCH_MAX_SIZE)},
+    "postprocess": {"workers": 1, "queue_size": 4},
+    "save": {"workers": 1, "queue_size": 4},
+}
+
 def setup_directories():
     """创建必要的目录结构"""
     ICLOUD_BASE.mkdir(parents=True, exist_ok=True)
@@ -48,7 +129,7 @@ def get_video_info(url):
     """获取视频标题"""
     try:
         result = subprocess.run(
-            ["yt-dlp", "--get-title", url],
+            ["yt-dlp", "--get-title", "--no-playlist", url],
             capture_output=True,
             text=True,
             check=True
@@ -57,101 +138,402 @@ def get_video_info(url):
     except:
         return "untitled"
 
-def download_and_transcribe(url, task_id):
-    """下载视频并转换为文字"""
-    temp_dir = tempfile.mkdtemp()
+CALIBRATION = load_calibration() if WHISPER_MODEL == "auto" else None
+_auto_state = {"checked": 0.0, "pending": 0, "choice": None}
+
+def fetch_backlog():
+    """队列中待处理的任务数（最多每 QUEUE_STATS_INTERVAL 秒查询一次，失败时沿用上次的值）"""
+    if time.time() - _auto_state["checked"] >= QUEUE_STATS_INTERVAL:
+        _auto_state["checked"] = time.time()
+        try:
+            response = SESSION.get(f"{API_BASE}/queue-stats", timeout=10)
+            response.raise_for_status()
+            _auto_state["pending"] = int(response.json().get("pending") or 0)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"⚠️  查询队列积压失败: {e}")
+    return _auto_state["pending"]
+
+def choose_model():
+    """返回本次转写使用的 (模型, 线程数)，线程数为 None 时由后端决定"""
+    if WHISPER_MODEL != "auto":
+        return WHISPER_MODEL, None
+    if CALIBRATION is None:
+        return FALLBACK_MODEL, None
+    backlog = fetch_backlog()
+    spec, threads, rtf = select_model(CALIBRATION, backlog=backlog)
+    _auto_state["rtf"] = rtf
+    if _auto_state["choice"] != (spec, threads):
+        _auto_state["choice"] = (spec, threads)
+        print(f"🎚️  自动选择模型: {spec} × {threads} 线程 (RTF {rtf:.2f}, 队列积压 {backlog})")
+    return spec, threads
+
+def new_job(url, task_id):
+    """创建任务上下文，在各处理步骤之间传递"""
+    return {
+        "url": url,
+        "task_id": task_id,
+        "temp_dir": None,
+        "audio_key": None,
+    }
+
+def prepare_job(job):
+    """获取视频信息并生成输出文件名"""
+    print(f"📥 获取视频信息...")
+    title = get_video_info(job["url"])
+    safe_title = clean_filename(title)
     
+    # 文件名
+    timestamp = datetime.now().strftime("%H-%M-%S")
+    job["title"] = title
+    job["base_name"] = f"{timestamp}_{safe_title}_{job['task_id'][:8]}"
+    job["model"], job["threads"] = choose_model()
+    return job
+
+def lookup_cache(job):
+    """查询转录缓存，命中时写入 job["text"] 并跳过下载和转写"""
+    video_id = extract_video_id(job["url"])
+    if not video_id:
+        return False
+    job["cache_key"] = (video_id, extract_part(job["url"]), job["model"], WHISPER_LANGUAGE)
+    cached = TRANSCRIPT_CACHE.get(*job["cache_key"])
+    if cached is None:
+        return False
+    print(f"⚡ 命中转录缓存: {video_id}")
+    job["result"] = TranscriptionResult.from_cache(cached)
+    # 旧版本缓存的纯文本结果，只能输出 txt
+    job["text"] = job["result"].timestamped_text if job["result"] else cached
+    job["backend"] = "cache"
+    job["source"] = "cache"
+    return True
+
+def lookup_subtitles(job):
+    """视频有匹配的 CC 字幕时直接写入 job["text"]，跳过下载和转写"""
+    if not SUBTITLE_FAST_PATH:
+        return False
     try:
-        print(f"📥 获取视频信息...")
-        title = get_video_info(url)
-        safe_title = clean_filename(title)
-        
-        # 文件名
-        timestamp = datetime.now().strftime("%H-%M-%S")
-        base_name = f"{timestamp}_{safe_title}_{task_id[:8]}"
-        
-        mp3_file = os.path.join(temp_dir, f"{base_name}.mp3")
-        wav_file = os.path.join(temp_dir, f"{base_name}.wav")
-        
-        # 下载音频
-        print(f"⬇️  下载音频: {title}")
-        subprocess.run([
-            "yt-dlp",
-            "-x",
-            "--audio-format", "mp3",
-            "-o", mp3_file,
-            url
-        ], check=True)
-        
-        # 转换为 WAV
-        print("🔄 转换音频格式...")
+        result = fetch_subtitles(job["url"])
+    except Exception as e:
+        print(f"⚠️  读取字幕失败，改用语音识别: {e}")
+        return False
+    if result is None:
+        return False
+    print(f"💬 使用视频字幕 ({result.language}, {len(result.segments)} 段)，跳过语音识别")
+    job["result"] = result
+    job["text"] = result.timestamped_text
+    job["backend"] = f"subtitles:{result.language}"
+    job["source"] = "subtitles"
+    return True
+
+def lookup_audio(job):
+    """固定该视频的音频缓存条目直到结果上报；已有解码好的 PCM 时写入 job["audio"]，跳过下载和转码"""
+    video_id = extract_video_id(job["url"])
+    if not video_id:
+        return False
+    job["audio_key"] = (video_id, extract_part(job["url"]))
+    AUDIO_CACHE.pin(*job["audio_key"])
+    audio = AUDIO_CACHE.get(*job["audio_key"])
+    if audio is None:
+        return False
+    print(f"⚡ 命中音频缓存: {video_id}（{audio.duration:.0f}秒），直接开始转写")
+    job["audio"] = audio
+    return True
+
+def release_audio(job):
+    """结果上报后解除音频缓存的固定，之后可按容量淘汰"""
+    if job.get("audio_key"):
+        AUDIO_CACHE.unpin(*job.pop("audio_key"))
+
+def stream_audio(job):
+    """下载最佳音频流并经管道直接解码为内存中的 16kHz PCM，不写临时文件"""
+    prepare_job(job)
+    if lookup_cache(job) or lookup_subtitles(job) or lookup_audio(job):
+        return job
+    print(f"⬇️  下载并解码音频: {job['title']}")
+    started = time.perf_counter()
+    job["audio"] = stream_pcm(job["url"])
+    record_download("stream", len(job["audio"].data), time.perf_counter() - started)
+    print(f"🎵 音频时长: {job['audio'].duration:.0f}秒")
+    if job["audio_key"]:
+        AUDIO_CACHE.put(*job["audio_key"], job["audio"])
+    return job
+
+def fetch_audio(job):
+    """获取视频信息并下载 MP3（非流式模式）"""
+    prepare_job(job)
+    if lookup_cache(job) or lookup_subtitles(job) or lookup_audio(job):
+        return job
+    if job["audio_key"]:
+        # 下载到缓存目录，中断后保留 .part 文件，下次从断点续传
+        download_dir = str(AUDIO_CACHE.partial_dir(*job["audio_key"]))
+        job["mp3_file"] = os.path.join(download_dir, "audio.mp3")
+        job["wav_file"] = os.path.join(download_dir, "audio.wav")
+    else:
+        job["temp_dir"] = tempfile.mkdtemp()
+        job["mp3_file"] = os.path.join(job["temp_dir"], f"{job['base_name']}.mp3")
+        job["wav_file"] = os.path.join(job["temp_dir"], f"{job['base_name']}.wav")
+    
+    # 下载音频
+    print(f"⬇️  下载音频: {job['title']}")
+    started = time.perf_counter()
+    subprocess.run([
+        "yt-dlp",
+        "-x",
+        "--no-playlist",
+        "--continue",
+        "--audio-format", "mp3",
+        "-o", job["mp3_file"],
+        job["url"]
+    ], check=True)
+    record_download("file", os.path.getsize(job["mp3_file"]), time.perf_counter() - started)
+    return job
+
+def record_download(mode, size, seconds):
+    """记录下载字节数和速度；流式模式下载与解码重叠，按解码出的 PCM 字节计"""
+    metrics.DOWNLOAD_BYTES.inc(size, mode=mode)
+    if seconds > 0:
+        metrics.DOWNLOAD_BYTES_PER_SECOND.observe(size / seconds, mode=mode)
+
+def convert_audio(job):
+    """转换为 16kHz 单声道 WAV（非流式模式）"""
+    if "text" in job or "audio" in job:
+        return job
+    print("🔄 转换音频格式...")
+    with metrics.FFMPEG_SECONDS.time():
         subprocess.run([
-            "ffmpeg", "-i", mp3_file,
+            "ffmpeg", "-i", job["mp3_file"],
             "-ar", "16000",
             "-ac", "1",
             "-c:a", "pcm_s16le",
-            wav_file,
+            job["wav_file"],
             "-y"
         ], check=True, capture_output=True)
+    job["audio"] = PCMAudio.from_wav(job["wav_file"])
+    if job["audio_key"]:
+        AUDIO_CACHE.put(*job["audio_key"], job["audio"])
+    return job
+
+def transcribe_audio(job):
+    """Whisper 转写（使用进程内常驻的模型），长音频按静音切块后多进程并行转写"""
+    if "text" in job:
+        return job
+    engine = get_engine(job["model"], WHISPER_LANGUAGE, job["threads"])
+    # 转写完成后立即释放内存中的 PCM，不占用下游排队时间（磁盘上的缓存保留到结果上报）
+    audio = job.pop("audio")
+    
+    uploader = None
+    on_segment = None
+    if STREAM_PARTIAL_RESULTS:
+        uploader = SegmentUploader(lambda lines: append_segments(job["task_id"], lines),
+                                   flush_interval=PARTIAL_FLUSH_SECONDS)
+        on_segment = lambda segment: uploader.add(segment.timestamped_line)
+    
+    started = time.perf_counter()
+    batched = BATCH_MAX_SIZE > 1 and audio.duration <= BATCH_MAX_CLIP_SECONDS
+    if batched:
+        print(f"🎯 加入批量转写 ({audio.duration:.0f}秒, 模型: {engine.model_name}, 后端: {engine.backend})...")
+        job["batcher"] = get_batcher(engine, BATCH_MAX_SIZE, BATCH_MAX_WAIT, job["model"])
+        result = job["batcher"].transcribe(audio)
+        if on_segment:
+            for segment in result.segments:
+                on_segment(segment)
+    elif audio.duration > LONG_AUDIO_SECONDS:
+        print(f"🎯 长音频分块转写 ({audio.duration / 60:.0f} 分钟, 模型: {engine.model_name}, 后端: {engine.backend})...")
+        result = transcribe_long(audio, job["model"], WHISPER_LANGUAGE, on_segment=on_segment,
+                                 threads=engine.threads)
+    else:
+        threads = f", {engine.threads} 线程" if engine.threads else ""
+        print(f"🎯 开始转写 (模型: {engine.model_name}, 后端: {engine.backend}{threads})...")
+        result = engine.transcribe(audio, on_segment=on_segment)
+    if audio.duration > 0:
+        # 批量转写的耗时包含攒批等待，实时率由批量转写器按批记录
+        if not batched:
+            metrics.ASR_REAL_TIME_FACTOR.observe((time.perf_counter() - started) / audio.duration, model=job["model"])
+        metrics.AUDIO_SECONDS.inc(audio.duration, model=job["model"])
+    
+    job["streamed"] = uploader.close() if uploader else False
+    job["result"] = result
+    job["text"] = result.timestamped_text
+    job["backend"] = engine.backend
+    job["source"] = "asr"
+    if job.get("cache_key"):
+        # 缓存完整的片段（含时间和置信度），命中时仍可输出所有格式
+        TRANSCRIPT_CACHE.put(*job["cache_key"], result.render("json"))
+    return job
+
+def postprocess_transcript(job):
+    """文本后处理（繁转简、折叠重复、标点），各步骤由 POSTPROCESS_T2S / POSTPROCESS_DEDUP / PUNCTUATION 控制；
+    字幕是人工内容不处理，缓存中保存的是识别原文，命中时同样处理"""
+    if job.get("source") not in ("asr", "cache") or not job.get("result"):
+        return job
+    result, timings = get_postprocessor().process(job["result"])
+    if timings:
+        print(f"✏️  文本后处理: {format_timings(timings)}")
+    text = result.timestamped_text
+    if text != job["text"]:
+        # 已流式追加的是处理前的片段，改为上传完整结果
+        job["streamed"] = False
+    job["result"] = result
+    job["text"] = text
+    return job
+
+def save_transcript(job):
+    """保存转写结果和元数据到 iCloud"""
+    date_folder = ICLOUD_BASE / datetime.now().strftime("%Y-%m-%d")
+    date_folder.mkdir(exist_ok=True)
+    
+    final_txt = date_folder / f"{job['base_name']}.txt"
+    with open(final_txt, 'w', encoding='utf-8') as f:
+        f.write(job["text"] + "\n")
+    
+    # 其他格式只在配置了时才渲染
+    if job.get("result"):
+        for fmt in OUTPUT_FORMATS:
+            if fmt != "txt":
+                output_file = date_folder / f"{job['base_name']}.{EXTENSIONS[fmt]}"
+                output_file.write_text(job["result"].render(fmt) + "\n", encoding="utf-8")
+    
+    # 创建元数据
+    metadata = {
+        "task_id": job["task_id"],
+        "url": job["url"],
+        "title": job["title"],
+        "timestamp": datetime.now().isoformat(),
+        "model": job.get("model"),
+        "threads": job.get("threads"),
+        "backend": job.get("backend"),
+        "source": job.get("source"),
+        "worker": WORKER_ID
+    }
+    
+    meta_file = date_folder / f"{job['base_name']}.json"
+    with open(meta_file, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    
+    print(f"✅ 转写完成: {final_txt}")
+    cache_stats = TRANSCRIPT_CACHE.stats()
+    audio_stats = AUDIO_CACHE.stats()
+    print(f"📦 缓存命中/未命中: 转录 {cache_stats['hits']}/{cache_stats['misses']}，"
+          f"音频 {audio_stats['hits']}/{audio_stats['misses']}（{audio_stats['bytes'] / 1024 / 1024:.0f}MB）")
+    if BATCH_MAX_SIZE > 1:
+        print_batch_stats(job)
+    SOURCE_COUNTS[job.get("source")] += 1
+    print(f"📊 结果来源: " + ", ".join(f"{k} {v}" for k, v in SOURCE_COUNTS.most_common()))
+    
+    # 发送系统通知
+    send_notification("转写完成", f"{job['title']} 已保存到 iCloud Drive")
+    
+    job["final_txt"] = final_txt
+    return job
+
+def print_batch_stats(job):
+    """批量解码的批大小和吞吐；本机已校准时与单段转写的实时率对比"""
+    # 只看本任务所用的批量转写器，不为此重新获取引擎（可能把常驻的引擎挤出去）
+    if "batcher" not in job:
+        return
+    stats = job["batcher"].stats()
+    if not stats["batches"]:
+        return
+    line = (f"📦 批量解码: {stats['batches']} 批，平均 {stats['mean_batch']:.1f} 段/批，"
+            f"吞吐 {stats['throughput']:.1f} 倍实时")
+    rtf = _auto_state.get("rtf")
+    if rtf:
+        line += f"（单段约 {1 / rtf:.1f} 倍实时，加速 {stats['throughput'] * rtf:.1f}x）"
+    print(line)
+
+def record_failure(job, error):
+    """打印并保存错误信息"""
+    error_msg = str(error)
+    print(f"❌ 处理失败: {error_msg}")
+    
+    error_file = ICLOUD_BASE / "_failed" / f"{job['task_id']}_error.txt"
+    with open(error_file, 'w') as f:
+        f.write(f"URL: {job['url']}\n")
+        f.write(f"Error: {error_msg}\n")
+        f.write(f"Time: {datetime.now()}\n")
+    return error_msg
+
+def cleanup_job(job):
+    """清理临时文件和内存中的音频"""
+    job.pop("audio", None)
+    if job["temp_dir"]:
+        shutil.rmtree(job["temp_dir"], ignore_errors=True)
+
+# 处理步骤（按顺序执行），流水线模式下每一步是一个独立阶段
+if STREAM_AUDIO:
+    PROCESS_STEPS = [
+        ("download", stream_audio),
+        ("transcribe", transcribe_audio),
+        ("postprocess", postprocess_transcript),
+        ("save", save_transcript),
+    ]
+else:
+    PROCESS_STEPS = [
+        ("download", fetch_audio),
+        ("convert", convert_audio),
+        ("transcribe", transcribe_audio),
+        ("postprocess", postprocess_transcript),
+        ("save", save_transcript),
+    ]
+
+def timed_step(name, step):
+    """记录处理步骤的耗时和失败原因；租约已丢失的任务不再进入下一步"""
+    def run(job):
+        try:
+            HEARTBEAT.check(job["task_id"])
+            with metrics.STAGE_SECONDS.time(stage=name):
+                return step(job)
+        except Exception as e:
+            metrics.record_failure(name, e)
+            raise
+    return run
+
+def download_and_transcribe(url, task_id):
+    """下载视频并转换为文字，返回 (job, error)"""
+    job = new_job(url, task_id)
+    
+    try:
+        for name, step in PROCESS_STEPS:
+            timed_step(name, step)(job)
+        return job, None
         
-        # Whisper 转写
-        print(f"🎯 开始转写 (模型: {WHISPER_MODEL})...")
-        whisper_cmd = [
-            "whisper", wav_file,
-            "--model", WHISPER_MODEL,
-            "--language", WHISPER_LANGUAGE,
-            "--output_format", "txt",
-            "--output_dir", temp_dir
-        ]
-        subprocess.run(whisper_cmd, check=True)
-        
-        # 找到生成的 txt 文件
-        txt_file = wav_file.replace('.wav', '.txt')
-        
-        # 保存到 iCloud
-        date_folder = ICLOUD_BASE / datetime.now().strftime("%Y-%m-%d")
-        date_folder.mkdir(exist_ok=True)
-        
-        final_txt = date_folder / f"{base_name}.txt"
-        shutil.copy2(txt_file, final_txt)
-        
-        # 创建元数据
-        metadata = {
-            "task_id": task_id,
-            "url": url,
-            "title": title,
-            "timestamp": datetime.now().isoformat(),
-            "model": WHISPER_MODEL,
-            "worker": WORKER_ID
-        }
-        
-        meta_file = date_folder / f"{base_name}.json"
-        with open(meta_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ 转写完成: {final_txt}")
-        
-        # 发送系统通知
-        send_notification("转写完成", f"{title} 已保存到 iCloud Drive")
-        
-        return str(final_txt), None
-        
+    except LeaseLost as e:
+        release_audio(job)
+        return None, str(e)
     except Exception as e:
-        error_msg = str(e)
-        print(f"❌ 处理失败: {error_msg}")
-        
-        # 保存错误信息
-        error_file = ICLOUD_BASE / "_failed" / f"{task_id}_error.txt"
-        with open(error_file, 'w') as f:
-            f.write(f"URL: {url}\n")
-            f.write(f"Error: {error_msg}\n")
-            f.write(f"Time: {datetime.now()}\n")
-        
-        return None, error_msg
+        release_audio(job)
+        return None, record_failure(job, e)
         
     finally:
-        # 清理临时文件
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        cleanup_job(job)
+
+def build_pipeline():
+    """构建 下载(→ 转码) → 转写 → 后处理 → 保存 流水线"""
+    def on_done(job):
+        cleanup_job(job)
+        try:
+            if HEARTBEAT.is_lost(job["task_id"]):
+                abandon_task(job["task_id"])
+            else:
+                update_task_status(job["task_id"], "completed", result=completed_result(job),
+                                   source=job.get("source"), outputs=completed_outputs(job))
+        finally:
+            release_audio(job)
+    
+    def on_error(job, error, stage):
+        try:
+            if isinstance(error, LeaseLost):
+                abandon_task(job["task_id"])
+            else:
+                update_task_status(job["task_id"], "failed", f"[{stage.name}] {record_failure(job, error)}")
+        finally:
+            cleanup_job(job)
+            release_audio(job)
+    
+    stages = [
+        Stage(name, timed_step(name, func), **PIPELINE_STAGES.get(name, {}))
+        for name, func in PROCESS_STEPS
+    ]
+    return Pipeline(stages, on_done=on_done, on_error=on_error)
 
 def send_notification(title, message):
     """发送 macOS 系统通知"""
@@ -163,53 +545,177 @@ def send_notification(title, message):
     except:
         pass  # 忽略通知错误
 
-def update_task_status(task_id, status, error=None):
-    """更新任务状态（这里可以扩展为上报给服务器）"""
+def send_heartbeat(task_ids):
+    """为持有的任务续租，返回租约已丢失的任务 ID"""
+    response = SESSION.post(
+        f"{API_BASE}/heartbeat-task",
+        json={"taskIds": task_ids, "workerId": WORKER_ID},
+        timeout=10
+    )
+    response.raise_for_status()
+    return response.json().get("lost", [])
+
+def append_segments(task_id, lines):
+    """把一批转写片段追加到任务的部分结果中"""
+    HEARTBEAT.check(task_id)
+    with metrics.UPLOAD_SECONDS.time(kind="partial"):
+        response = SESSION.post(
+            f"{API_BASE}/get-pending-task",
+            json={"taskId": task_id, "workerId": WORKER_ID, "partial": True, "segments": lines},
+            timeout=10
+        )
+    response.raise_for_status()
+
+def completed_result(job):
+    """结束任务时上传的完整结果；片段已全部追加时返回 None，由服务端拼接"""
+    return None if job.get("streamed") else job["text"]
+
+def completed_outputs(job):
+    """随结果上传的附加格式（OUTPUT_FORMATS 中 txt 以外的），只渲染配置了的格式"""
+    return render_outputs(job.get("result"), OUTPUT_FORMATS)
+
+# 从领取到上报结果期间持续续租，Worker 崩溃后任务会被服务端重新入队
+HEARTBEAT = LeaseHeartbeat(send_heartbeat, interval=HEARTBEAT_INTERVAL)
+
+def update_task_status(task_id, status, error=None, result=None, source=None, outputs=None):
+    """
+    上报任务结果到服务器，并停止续租；source 记录结果来源（subtitles / asr / cache），
+    outputs 为 {格式: 内容} 的附加输出（srt / vtt / json）
+    """
     print(f"📝 任务 {task_id} 状态: {status}")
     if error:
         print(f"   错误: {error}")
+    metrics.TASKS.inc(outcome=status, source=source or "none")
+    
+    payload = {"taskId": task_id, "workerId": WORKER_ID}
+    if source:
+        payload["source"] = source
+    if status == "completed":
+        if result is not None:
+            payload["result"] = result
+        if outputs:
+            payload["outputs"] = outputs
+    else:
+        payload["error"] = error or status
+    
+    try:
+        body, headers = encode_json_body(payload)
+        with metrics.UPLOAD_SECONDS.time(kind="result"):
+            response = SESSION.post(f"{API_BASE}/get-pending-task", data=body, headers=headers, timeout=30)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        metrics.record_failure("upload", e)
+        print(f"⚠️  结果上报失败: {e}")
+    finally:
+        HEARTBEAT.remove(task_id)
 
-def main():
-    """主循环"""
-    print("🚀 Bilibili 转文字 Worker 启动")
-    print(f"📍 Worker ID: {WORKER_ID}")
-    print(f"🌐 API: {API_BASE}")
-    print(f"📁 输出目录: {ICLOUD_BASE}")
+def abandon_task(task_id):
+    """租约已丢失（任务已重新分配给其他 Worker）：放弃本地结果，不上报，停止续租"""
+    print(f"⚠️  任务 {task_id} 的租约已丢失，放弃该任务")
+    metrics.TASKS.inc(outcome="lost", source="none")
+    HEARTBEAT.remove(task_id)
+
+def poll_tasks(max_tasks=1):
+    """
+    从 API 批量领取最多 max_tasks 个任务，返回 [(task_id, url), ...]
     
-    setup_directories()
+    队列为空时服务端最多挂起 LONG_POLL_SECONDS 秒，期间有新任务会立即返回
+    """
+    started = time.perf_counter()
+    try:
+        response = SESSION.get(
+            f"{API_BASE}/get-pending-task",
+            params={"worker_id": WORKER_ID, "max": max_tasks, "wait": LONG_POLL_SECONDS},
+            timeout=LONG_POLL_SECONDS + 10
+        )
+    except requests.exceptions.RequestException as e:
+        metrics.POLL_SECONDS.observe(time.perf_counter() - started, outcome="error")
+        metrics.record_failure("poll", e)
+        raise
+    
+    if response.status_code != 200:
+        metrics.POLL_SECONDS.observe(time.perf_counter() - started, outcome="error")
+        print(f"⚠️  API 错误: {response.status_code}")
+        return []
+        
+    data = response.json()
+    leased = data.get("tasks") or []
+    metrics.POLL_SECONDS.observe(time.perf_counter() - started, outcome="task" if leased else "empty")
+    tasks = []
+    for task in leased:
+        metrics.record_queue_wait(task.get("createdAt"))
+        HEARTBEAT.add(task["taskId"])
+        if task.get("kind") == "expand":
+            url = expand_task(task["taskId"], task["videoUrl"])
+            if url:
+                tasks.append((task["taskId"], url))
+        else:
+            tasks.append((task["taskId"], task["videoUrl"]))
+    return tasks
+
+def expand_task(task_id, url):
+    """
+    展开多P视频/合集任务：多于一个视频时由服务端创建子任务（稍后被各 Worker 并行领取），返回 None；
+    只有一个视频时返回该视频链接，按普通任务处理
+    """
+    try:
+        videos = flat_playlist(url)
+        if not videos:
+            raise RuntimeError("链接中没有可处理的视频")
+        if len(videos) == 1:
+            return videos[0]["videoUrl"]
+        
+        response = SESSION.post(
+            f"{API_BASE}/expand-task",
+            json={"taskId": task_id, "workerId": WORKER_ID, "children": videos},
+            timeout=30
+        )
+        response.raise_for_status()
+        print(f"🗂️  任务 {task_id} 已展开为 {response.json().get('childCount')} 个子任务")
+        HEARTBEAT.remove(task_id)
+    except Exception as e:
+        update_task_status(task_id, "failed", f"展开分P/合集失败: {e}")
+    return None
+
+def run_sequential():
+    """逐个处理任务"""
+    backoff = AdaptiveBackoff(initial=0.5, maximum=CHECK_INTERVAL)
     
     while True:
         try:
             # 获取待处理任务
             print(f"\n🔍 检查新任务... ({datetime.now().strftime('%H:%M:%S')})")
             
-            response = requests.get(
-                f"{API_BASE}/get-pending-task",
-                params={"worker_id": WORKER_ID},
-                timeout=10
-            )
+            tasks = poll_tasks()
             
-            if response.status_code == 200:
-                data = response.json()
+            if tasks:
+                backoff.reset()
+                task_id, url = tasks[0]
                 
-                if data.get("taskId"):
-                    task_id = data["taskId"]
-                    url = data["url"]
-                    
-                    print(f"\n📋 获得新任务: {task_id}")
-                    print(f"🔗 URL: {url}")
-                    
-                    # 处理任务
-                    file_path, error = download_and_transcribe(url, task_id)
-                    
-                    if file_path:
-                        update_task_status(task_id, "completed")
-                    else:
-                        update_task_status(task_id, "failed", error)
+                print(f"\n📋 获得新任务: {task_id}")
+                print(f"🔗 URL: {url}")
+                
+                # 处理任务
+                job, error = download_and_transcribe(url, task_id)
+                
+                if HEARTBEAT.is_lost(task_id):
+                    abandon_task(task_id)
+                    if job:
+                        release_audio(job)
+                elif job:
+                    try:
+                        update_task_status(task_id, "completed", result=completed_result(job),
+                                           source=job.get("source"), outputs=completed_outputs(job))
+                    finally:
+                        release_audio(job)
                 else:
-                    print("💤 暂无新任务")
-            else:
-                print(f"⚠️  API 错误: {response.status_code}")
+                    update_task_status(task_id, "failed", error)
+                continue
+                
+            delay = backoff.next_delay()
+            print(f"💤 暂无新任务，{delay:.1f} 秒后重试")
+            time.sleep(delay)
+            continue
                 
         except requests.exceptions.RequestException as e:
             print(f"⚠️  网络错误: {e}")
@@ -219,23 +725,110 @@ def main():
         except Exception as e:
             print(f"❌ 未知错误: {e}")
         
-        # 等待下一次检查
+        # 出错后等待再重试
         time.sleep(CHECK_INTERVAL)
 
+def run_pipelined():
+    """流水线处理：第一阶段有空位时持续领取任务，各阶段在不同任务之间重叠执行"""
+    pipeline = build_pipeline()
+    pipeline.start()
+    backoff = AdaptiveBackoff(initial=0.5, maximum=CHECK_INTERVAL)
+    
+    try:
+        while True:
+            try:
+                if pipeline.in_flight:
+                    print(f"📊 流水线: {pipeline.format_stats()}")
+                
+                # 第一阶段队列已满，等待下游消化
+                if not pipeline.has_capacity():
+                    time.sleep(1)
+                    continue
+                
+                print(f"\n🔍 检查新任务... ({datetime.now().strftime('%H:%M:%S')})")
+                # 按第一阶段的空位数批量领取，一次请求填满流水线入口
+                tasks = poll_tasks(pipeline.free_slots())
+                
+                if tasks:
+                    backoff.reset()
+                    for task_id, url in tasks:
+                        print(f"\n📋 获得新任务: {task_id}")
+                        print(f"🔗 URL: {url}")
+                        
+                        pipeline.submit(new_job(url, task_id))
+                    continue
+                    
+                delay = backoff.next_delay()
+                print(f"💤 暂无新任务，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+                continue
+                
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️  网络错误: {e}")
+            except Exception as e:
+                print(f"❌ 未知错误: {e}")
+            
+            # 出错后等待再重试
+            time.sleep(CHECK_INTERVAL)
+            
+    except KeyboardInterrupt:
+        print(f"\n⏳ 等待流水线中的 {pipeline.in_flight} 个任务完成...")
+        try:
+            pipeline.stop(drain=True)
+        except KeyboardInterrupt:
+            pass
+        print("\n👋 Worker 停止")
+
+def main():
+    """主循环"""
+    print("🚀 Bilibili 转文字 Worker 启动")
+    print(f"📍 Worker ID: {WORKER_ID}")
+    print(f"🌐 API: {API_BASE}")
+    print(f"📁 输出目录: {ICLOUD_BASE}")
+    print(f"🔀 处理模式: {'流水线' if PIPELINE_ENABLED else '逐个处理'}")
+    
+    setup_directories()
+    
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+        print(f"📈 指标端点: http://localhost:{METRICS_PORT}/metrics")
+    
+    # 启动时预加载模型，之后所有任务复用
+    if WHISPER_MODEL == "auto" and CALIBRATION is None:
+        print(f"ℹ️  本机尚未校准，使用 {FALLBACK_MODEL} 模型（运行 python calibration.py 后可自动选择模型）")
+    spec, threads = choose_model()
+    engine = get_engine(spec, WHISPER_LANGUAGE, threads)
+    print(f"🧠 加载 Whisper 模型: {engine.model_name} ({engine.backend})...")
+    engine.load()
+    
+    HEARTBEAT.start()
+    try:
+        if PIPELINE_ENABLED:
+            run_pipelined()
+        else:
+            run_sequential()
+    finally:
+        HEARTBEAT.stop()
+        shutdown_batchers()
+        shutdown_chunk_pools()
+
 if __name__ == "__main__":
     # 检查依赖
-    dependencies = ["yt-dlp", "ffmpeg", "whisper"]
+    dependencies = ["yt-dlp", "ffmpeg"]
     missing = []
     
     for dep in dependencies:
         if subprocess.run(["which", dep], capture_output=True).returncode != 0:
             missing.append(dep)
     
+    if not available_backends():
+        missing.append("whisper")
+    
     if missing:
         print(f"❌ 缺少依赖: {', '.join(missing)}")
         print("\n请安装:")
         print("brew install ffmpeg yt-dlp")
-        print("pip install openai-whisper")
+        print("pip install faster-whisper  # 或 pip install openai-whisper")
         exit(1)
     
     main()
@@ -9,10 +9,30 @@ import time
 import json
 import sys
 import os
-from typing import Optional, Dict, Any
+import signal
+import argparse
+import shutil
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional, Dict, Any, List
 import logging
 from datetime import datetime
 
+import metrics
+from backoff import AdaptiveBackoff
+from compression import encode_json_body
+from heartbeat import LeaseHeartbeat, LeaseLost
+from playlist import flat_playlist
+from postprocess import format_timings, get_postprocessor
+from segment_stream import SegmentUploader
+from subtitles import fetch_subtitles
+from transcript_cache import TranscriptCache, extract_part, extract_video_id
+from transcriber import Segment, TranscriptionResult
+from transcript_formats import parse_formats, render_outputs
+from worker_stats import WorkerStats
+
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -24,91 +44,292 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 转录配置（参与缓存寻址：模型或语言不同的结果不会互相命中）
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
+WHISPER_LANGUAGE = os.getenv('WHISPER_LANGUAGE', 'zh')
+
+# 租约心跳间隔（秒），需明显小于服务端 LEASE_SECONDS（默认 120）
+HEARTBEAT_INTERVAL = int(os.getenv('HEARTBEAT_INTERVAL', '30'))
+
+# 字幕快速通道：视频已有 CC 字幕时直接使用，跳过下载和语音识别。
+# 默认仅在找得到 yt-dlp 时开启，免得每个任务都启动一次必然失败的子进程；
+# SUBTITLE_FAST_PATH=0 关闭，=1 强制开启
+SUBTITLE_FAST_PATH = os.getenv('SUBTITLE_FAST_PATH', '1' if shutil.which('yt-dlp') else '0') != '0'
+
+# 处理期间把转写片段分批追加到服务端（STREAM_PARTIAL_RESULTS=0 关闭），
+# 最长每 PARTIAL_FLUSH_SECONDS 秒上传一次
+STREAM_PARTIAL_RESULTS = os.getenv('STREAM_PARTIAL_RESULTS', '1') != '0'
+PARTIAL_FLUSH_SECONDS = float(os.getenv('PARTIAL_FLUSH_SECONDS', '5'))
+
+# 随结果上传的附加格式（逗号分隔，可选 srt、vtt、json），由同一次识别的片段渲染；txt 即 result
+OUTPUT_FORMATS = parse_formats(os.getenv('OUTPUT_FORMATS', 'txt'))
+
+
+def _ignore_sigint():
+    """进程池子进程忽略 Ctrl+C，由主进程负责排空任务"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def transcribe_audio(video_id: str) -> TranscriptionResult:
+    """
+    语音识别（CPU 密集型），在进程池中执行
+
+    Returns:
+        带起止时间和置信度的片段
+    """
+    time.sleep(2)  # 模拟语音识别过程
+    return TranscriptionResult([
+        Segment(0, 5, "大家好，欢迎观看这个视频", 0.92),
+        Segment(5, 10, "这是一个关于技术分享的内容", 0.88),
+        Segment(10, 15, "我们将深入探讨相关的技术细节", 0.9),
+        Segment(15, 20, "希望对大家有所帮助", 0.95),
+    ], language=WHISPER_LANGUAGE)
+
+
 class BilibiliTranscriptWorker:
-    def __init__(self, api_base_url: str, poll_interval: int = 5):
+    def __init__(self, api_base_url: str, poll_interval: int = 5, concurrency: int = 1,
+                 transcribe_workers: Optional[int] = None, prefetch: int = 0, long_poll: int = 20):
         """
         初始化工作器
         
         Args:
             api_base_url: API 基础URL (例如: https://your-app.vercel.app)
-            poll_interval: 轮询间隔（秒）
+            poll_interval: 队列为空时的最长退避间隔（秒）
+            concurrency: 同时处理的任务数，大于 1 时启用并发池模式
+            transcribe_workers: 语音识别进程数（默认 min(concurrency, CPU 核数)）
+            prefetch: 除空闲槽位外额外预取的任务数
+            long_poll: 长轮询等待时长（秒），服务端在此期间有新任务会立即返回；0 表示不等待
         """
         self.api_base_url = api_base_url.rstrip('/')
         self.poll_interval = poll_interval
+        self.concurrency = max(1, concurrency)
+        self.transcribe_workers = transcribe_workers or min(self.concurrency, os.cpu_count() or 1)
+        self.prefetch = max(0, prefetch)
+        self.long_poll = max(0, long_poll)
+        # 队列为空时从 0.5 秒开始指数退避（带抖动），上限为 poll_interval
+        self.backoff = AdaptiveBackoff(initial=0.5, maximum=poll_interval)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        # requests 不支持会话级超时（Session.timeout 会被忽略），每个请求都显式传入 timeout
         self.session = requests.Session()
-        self.session.timeout = 30
-        
-        # 统计信息
-        self.stats = {
-            'total_processed': 0,
-            'successful': 0,
-            'failed': 0,
-            'start_time': datetime.now()
-        }
         
-    def get_pending_task(self) -> Optional[Dict[str, Any]]:
-        """获取待处理任务"""
+        # 本地预取缓冲：一次批量领取多个任务，逐个分发给空闲槽位
+        self._buffer: deque = deque()
+        
+        # 从领取到上报结果期间持续续租，工作器崩溃后任务会被服务端重新入队
+        self.heartbeat = LeaseHeartbeat(self.send_heartbeat, interval=HEARTBEAT_INTERVAL)
+        
+        # 本地转录缓存（TRANSCRIPT_CACHE=0 时关闭）
+        self.cache = TranscriptCache() if os.getenv('TRANSCRIPT_CACHE', '1') != '0' else None
+        
+        # 语音识别进程池（仅并发池模式下创建）
+        self.transcribe_pool: Optional[ProcessPoolExecutor] = None
+        
+        # stop() 置位后主循环不再领取新任务（供压测等嵌入场景使用）
+        self._stopping = threading.Event()
+        
+        # 统计信息（并发池模式下多个槽位共享，WorkerStats 内部加锁）
+        self.stats = WorkerStats()
+        
+        # 当前线程所处理任务的 ID、结果来源（subtitles / asr / cache）和识别结果，由 handle_task / process_video 设置
+        self._local = threading.local()
+        
+    def lease_tasks(self, max_tasks: int) -> List[Dict[str, Any]]:
+        """一次请求批量领取最多 max_tasks 个任务，队列为空时由服务端挂起最多 long_poll 秒"""
+        started = time.perf_counter()
         try:
-            response = self.session.get(f"{self.api_base_url}/api/get-pending-task")
+            response = self.session.get(
+                f"{self.api_base_url}/api/get-pending-task",
+                params={"max": max_tasks, "wait": self.long_poll, "worker_id": self.worker_id},
+                timeout=self.long_poll + 30
+            )
             response.raise_for_status()
             
             data = response.json()
-            return data.get('task')
+            tasks = data.get('tasks') or []
+            metrics.POLL_SECONDS.observe(time.perf_counter() - started, outcome='task' if tasks else 'empty')
+            for task in tasks:
+                metrics.record_queue_wait(task.get('createdAt'))
+                self.heartbeat.add(task['taskId'])
+            return tasks
             
         except requests.exceptions.RequestException as e:
+            metrics.POLL_SECONDS.observe(time.perf_counter() - started, outcome='error')
+            metrics.record_failure('poll', e)
             logger.error(f"获取任务失败: {e}")
-            return None
+            return []
+            
+    def send_heartbeat(self, task_ids: List[str]) -> List[str]:
+        """为持有的任务续租，返回租约已丢失的任务 ID"""
+        response = self.session.post(
+            f"{self.api_base_url}/api/heartbeat-task",
+            json={"taskIds": task_ids, "workerId": self.worker_id},
+            timeout=10
+        )
+        response.raise_for_status()
+        return response.json().get('lost', [])
+        
+    def append_segments(self, task_id: str, lines: List[str]):
+        """把一批转写片段追加到任务的部分结果中，网页端可在处理期间逐步显示"""
+        self.heartbeat.check(task_id)
+        with metrics.UPLOAD_SECONDS.time(kind='partial'):
+            response = self.session.post(
+                f"{self.api_base_url}/api/get-pending-task",
+                json={"taskId": task_id, "workerId": self.worker_id, "partial": True, "segments": lines},
+                timeout=10
+            )
+        response.raise_for_status()
+        
+    def get_pending_task(self, free_slots: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        获取待处理任务
+        
+        本地缓冲为空时按「空闲槽位 + 预取数」批量领取，之后直接从缓冲中取，
+        避免每个任务都请求一次 API。
+        """
+        if not self._buffer:
+            self._buffer.extend(self.lease_tasks(free_slots + self.prefetch))
+        return self._buffer.popleft() if self._buffer else None
+        
+    def expand_task(self, task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        展开多P视频/合集任务：多于一个视频时在服务端创建子任务并返回 None；
+        只有一个视频时返回指向该视频的任务，按普通任务处理
+        """
+        videos = flat_playlist(task['videoUrl'])
+        if not videos:
+            raise Exception("链接中没有可处理的视频")
+        if len(videos) == 1:
+            video_url = videos[0]['videoUrl']
+            return {**task, 'videoUrl': video_url, 'videoId': extract_video_id(video_url) or task.get('videoId')}
             
-    def update_task(self, task_id: str, result: str = None, error: str = None) -> bool:
-        """更新任务结果"""
+        response = self.session.post(
+            f"{self.api_base_url}/api/expand-task",
+            json={"taskId": task['taskId'], "workerId": self.worker_id, "children": videos},
+            timeout=30
+        )
+        response.raise_for_status()
+        logger.info(f"🗂️ 任务 {task['taskId']} 已展开为 {response.json().get('childCount')} 个子任务")
+        return None
+        
+    def update_task(self, task_id: str, result: str = None, error: str = None, source: str = None,
+                    outputs: Optional[Dict[str, str]] = None) -> bool:
+        """更新任务结果，source 记录结果来源，outputs 为 {格式: 内容} 的附加输出"""
         try:
-            payload = {"taskId": task_id}
+            payload = {"taskId": task_id, "workerId": self.worker_id}
+            if source:
+                payload["source"] = source
             if result:
                 payload["result"] = result
+            if outputs:
+                payload["outputs"] = outputs
             if error:
                 payload["error"] = error
                 
-            response = self.session.post(
-                f"{self.api_base_url}/api/get-pending-task",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
+            # 长转录结果按需 gzip 压缩（COMPRESS_UPLOADS=1）
+            body, headers = encode_json_body(payload)
+            with metrics.UPLOAD_SECONDS.time(kind='result'):
+                response = self.session.post(
+                    f"{self.api_base_url}/api/get-pending-task",
+                    data=body,
+                    headers=headers,
+                    timeout=30
+                )
             response.raise_for_status()
             
             data = response.json()
             return data.get('success', False)
             
         except requests.exceptions.RequestException as e:
+            metrics.record_failure('upload', e)
             logger.error(f"更新任务失败: {e}")
             return False
             
-    def process_video(self, video_url: str, video_id: str) -> str:
+    @staticmethod
+    def render_outputs(result: Optional[TranscriptionResult]) -> Optional[Dict[str, str]]:
+        """按 OUTPUT_FORMATS 渲染附加格式；结果来自缓存（只有文本）时返回 None"""
+        return render_outputs(result, OUTPUT_FORMATS)
+
+    def transcribe(self, video_id: str) -> TranscriptionResult:
+        """语音识别：并发池模式下提交到进程池，否则在当前线程执行"""
+        if self.transcribe_pool is None:
+            return transcribe_audio(video_id)
+        return self.transcribe_pool.submit(transcribe_audio, video_id).result()
+
+    def process_video(self, video_url: str, video_id: str,
+                      on_segment: Optional[Callable[[str], None]] = None) -> str:
         """
         处理视频转文字
         
+        on_segment 会依次收到每一行带时间戳的转写片段，用于流式上传部分结果
+        
         注意：这是示例实现，实际使用时需要集成真实的转录服务
         推荐集成方案：
         1. 使用 yt-dlp 下载视频
         2. 使用 ffmpeg 提取音频
         3. 使用 whisper 或讯飞语音 API 进行语音识别
-        4. 后处理文本（去除重复、格式化等）
+        4. 后处理文本（postprocess.py：繁转简、去除重复、标点）
         """
         logger.info(f"开始处理视频: {video_id}")
         logger.info(f"视频URL: {video_url}")
         
+        part = extract_part(video_url)
+        if self.cache:
+            cached = self.cache.get(video_id, part, WHISPER_MODEL, WHISPER_LANGUAGE)
+            if cached is not None:
+                logger.info(f"⚡ 命中转录缓存: {video_id} P{part}")
+                self._local.source = 'cache'
+                return cached
+        
+        if SUBTITLE_FAST_PATH:
+            try:
+                with metrics.STAGE_SECONDS.time(stage='subtitles'):
+                    subtitles = fetch_subtitles(video_url)
+            except Exception as e:
+                metrics.record_failure('subtitles', e)
+                logger.warning(f"读取字幕失败，改用语音识别: {e}")
+                subtitles = None
+            if subtitles is not None:
+                logger.info(f"💬 使用视频字幕 ({subtitles.language}, {len(subtitles.segments)} 段)，跳过语音识别")
+                self._local.source = 'subtitles'
+                self._local.result = subtitles
+                if on_segment:
+                    for segment in subtitles.segments:
+                        on_segment(segment.timestamped_line)
+                # 与识别结果一样写入缓存，重试时不再读取字幕
+                if self.cache:
+                    self.cache.put(video_id, part, WHISPER_MODEL, WHISPER_LANGUAGE, subtitles.timestamped_text)
+                return subtitles.timestamped_text
+        
+        self._local.source = 'asr'
+        
         try:
+            # 各步骤之间检查租约，租约丢失后不再继续处理
+            self.heartbeat.check(self._local.task_id)
             # 模拟下载和处理过程
             logger.info("步骤 1/4: 下载视频...")
-            time.sleep(1)  # 模拟下载时间
+            with metrics.STAGE_SECONDS.time(stage='download'):
+                time.sleep(1)  # 模拟下载时间
             
             logger.info("步骤 2/4: 提取音频...")
-            time.sleep(1)  # 模拟音频提取
+            with metrics.STAGE_SECONDS.time(stage='extract_audio'), metrics.FFMPEG_SECONDS.time():
+                time.sleep(1)  # 模拟音频提取
             
+            self.heartbeat.check(self._local.task_id)
             logger.info("步骤 3/4: 语音识别...")
-            time.sleep(2)  # 模拟语音识别过程
+            with metrics.STAGE_SECONDS.time(stage='transcribe'):
+                result = self.transcribe(video_id)
             
+            self.heartbeat.check(self._local.task_id)
             logger.info("步骤 4/4: 文本后处理...")
-            time.sleep(0.5)  # 模拟文本处理
+            with metrics.STAGE_SECONDS.time(stage='postprocess'):
+                result, timings = get_postprocessor().process(result)
+            if timings:
+                logger.info(f"文本后处理: {format_timings(timings)}")
+            self._local.result = result
+            timestamped_text = result.timestamped_text
+            if on_segment:
+                for line in timestamped_text.splitlines():
+                    on_segment(line)
             
             # 生成示例转录结果
             mock_transcript = f"""
@@ -116,10 +337,7 @@ class BilibiliTranscriptWorker:
 视频ID: {video_id}
 处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
-[00:00:00] 大家好，欢迎观看这个视频
-[00:00:05] 这是一个关于技术分享的内容
-[00:00:10] 我们将深入探讨相关的技术细节
-[00:00:15] 希望对大家有所帮助
+{timestamped_text}
 
 --- 转录文本 ---
 各位观众朋友们大家好，欢迎来到今天的分享。在这个视频中，我们将为大家带来精彩的内容。
@@ -143,8 +361,12 @@ class BilibiliTranscriptWorker:
             """.strip()
             
             logger.info("视频处理完成！")
+            if self.cache:
+                self.cache.put(video_id, part, WHISPER_MODEL, WHISPER_LANGUAGE, mock_transcript)
             return mock_transcript
             
+        except LeaseLost:
+            raise
         except Exception as e:
             error_msg = f"处理视频时发生错误: {str(e)}"
             logger.error(error_msg)
@@ -183,81 +405,139 @@ class BilibiliTranscriptWorker:
         
     def print_stats(self):
         """打印统计信息"""
-        runtime = datetime.now() - self.stats['start_time']
-        print(f"\n{'='*50}")
-        print(f"📊 工作器统计信息")
-        print(f"{'='*50}")
-        print(f"运行时间: {runtime}")
-        print(f"总处理任务: {self.stats['total_processed']}")
-        print(f"成功处理: {self.stats['successful']}")
-        print(f"处理失败: {self.stats['failed']}")
-        if self.stats['total_processed'] > 0:
-            success_rate = (self.stats['successful'] / self.stats['total_processed']) * 100
-            print(f"成功率: {success_rate:.1f}%")
-        print(f"{'='*50}\n")
+        self.stats.print(self.cache)
+        
+    def _record_result(self, success: bool, source: Optional[str] = None):
+        """记录一次任务结果（线程安全），每 10 个任务打印一次统计"""
+        if self.stats.record(success, source):
+            self.print_stats()
+            
+    def handle_task(self, task: Dict[str, Any]) -> bool:
+        """
+        处理单个任务并上报结果
+        
+        Returns:
+            结果是否成功上报
+        """
+        task_id = task['taskId']
+        logger.info(f"📋 获取到新任务: {task_id}")
+        
+        # 多P视频/合集：先展开为子任务，子任务由各工作器并行领取
+        if task.get('kind') == 'expand':
+            try:
+                task = self.expand_task(task)
+            except Exception as e:
+                metrics.record_failure('expand', e)
+                error_msg = f"展开分P/合集失败: {str(e)}"
+                logger.error(f"❌ {error_msg}")
+                self.update_task(task_id, error=error_msg)
+                self.heartbeat.remove(task_id)
+                self._record_result(False)
+                return False
+            if task is None:
+                self.heartbeat.remove(task_id)
+                return True
+        
+        video_url = task['videoUrl']
+        video_id = task['videoId']
+        logger.info(f"📺 视频ID: {video_id}")
+        
+        uploader = None
+        if STREAM_PARTIAL_RESULTS:
+            uploader = SegmentUploader(lambda lines: self.append_segments(task_id, lines),
+                                       flush_interval=PARTIAL_FLUSH_SECONDS)
+        
+        self._local.task_id = task_id
+        self._local.source = None
+        self._local.result = None
+        try:
+            # 处理视频
+            result = self.process_video(video_url, video_id, on_segment=uploader.add if uploader else None)
+            # 片段已全部追加且与完整结果一致（后处理没有改动文本）时只上报完成，由服务端拼接
+            streamed = uploader.close() if uploader else False
+            if streamed and self._local.result is not None and result == self._local.result.timestamped_text:
+                result = None
+            
+            # 更新任务结果（租约已丢失时任务已重新分配，不再上报）
+            self.heartbeat.check(task_id)
+            source = self._local.source
+            if self.update_task(task_id, result=result, source=source,
+                                outputs=self.render_outputs(self._local.result)):
+                logger.info(f"✅ 任务完成: {task_id}" + (f" (来源: {source})" if source else ""))
+                self._record_result(True, source)
+                return True
+                
+            logger.warning(f"⚠️ 任务结果更新失败: {task_id}")
+            
+        except LeaseLost as e:
+            # 任务已由其他工作器处理，放弃本地结果，也不上报错误
+            metrics.record_failure('lease', e)
+            logger.warning(f"⚠️ {e}，放弃该任务")
+            
+        except Exception as e:
+            metrics.record_failure('process', e)
+            error_msg = f"处理视频时出错: {str(e)}"
+            logger.error(f"❌ {error_msg}")
+            
+            # 更新任务错误状态
+            self.update_task(task_id, error=error_msg)
+            
+        finally:
+            # 结果已上报（或放弃），停止续租
+            self.heartbeat.remove(task_id)
+            
+        self._record_result(False)
+        return False
+        
+    def stop(self):
+        """请求主循环在当前任务完成后退出，效果等同于 Ctrl+C"""
+        self._stopping.set()
         
     def run(self):
         """运行工作器主循环"""
         print(f"🚀 启动 Bilibili 转录工作器")
         print(f"🌐 API URL: {self.api_base_url}")
-        print(f"⏱️  轮询间隔: {self.poll_interval}秒")
+        print(f"⏱️  长轮询: {self.long_poll}秒, 空闲退避上限: {self.poll_interval}秒")
+        print(f"🧵 并发任务数: {self.concurrency}")
         print(f"📝 日志文件: worker.log")
         print(f"{'='*60}")
         
         logger.info("工作器启动成功")
         
+        self.heartbeat.start()
+        try:
+            if self.concurrency > 1:
+                self.run_pool()
+            else:
+                self.run_single()
+        finally:
+            self.heartbeat.stop()
+            
+    def run_single(self):
+        """逐个处理任务的主循环"""
         consecutive_failures = 0
         max_failures = 5
         
-        while True:
+        while not self._stopping.is_set():
             try:
                 # 获取待处理任务
                 task = self.get_pending_task()
                 
                 if not task:
-                    logger.info("暂无待处理任务，等待中...")
-                    time.sleep(self.poll_interval)
+                    delay = self.backoff.next_delay()
+                    logger.info(f"暂无待处理任务，{delay:.1f} 秒后重试...")
+                    self._stopping.wait(delay)
                     consecutive_failures = 0  # 重置失败计数
                     continue
                     
-                task_id = task['taskId']
-                video_url = task['videoUrl']
-                video_id = task['videoId']
-                
-                logger.info(f"📋 获取到新任务: {task_id}")
-                logger.info(f"📺 视频ID: {video_id}")
+                self.backoff.reset()
                 
-                self.stats['total_processed'] += 1
-                
-                try:
-                    # 处理视频
-                    result = self.process_video(video_url, video_id)
-                    
-                    # 更新任务结果
-                    if self.update_task(task_id, result=result):
-                        logger.info(f"✅ 任务完成: {task_id}")
-                        self.stats['successful'] += 1
-                        consecutive_failures = 0
-                    else:
-                        logger.warning(f"⚠️ 任务结果更新失败: {task_id}")
-                        self.stats['failed'] += 1
-                        
-                except Exception as e:
-                    error_msg = f"处理视频时出错: {str(e)}"
-                    logger.error(f"❌ {error_msg}")
-                    
-                    # 更新任务错误状态
-                    self.update_task(task_id, error=error_msg)
-                    self.stats['failed'] += 1
-                    
-                # 定期打印统计信息
-                if self.stats['total_processed'] % 10 == 0:
-                    self.print_stats()
+                if self.handle_task(task):
+                    consecutive_failures = 0
                     
             except KeyboardInterrupt:
                 logger.info("收到中断信号，正在退出...")
-                self.print_stats()
-                print("\n👋 工作器已安全退出")
+                self._stopping.set()
                 break
                 
             except Exception as e:
@@ -269,7 +549,102 @@ class BilibiliTranscriptWorker:
                     break
                     
                 logger.info(f"等待 {self.poll_interval * 2} 秒后重试...")
-                time.sleep(self.poll_interval * 2)
+                self._stopping.wait(self.poll_interval * 2)
+                
+        # 已领取但未开始的任务也要处理完，否则会停留在 processing 状态直到租约到期
+        if self._buffer:
+            logger.info(f"处理预取缓冲中剩余的 {len(self._buffer)} 个任务后退出...")
+        try:
+            while self._buffer:
+                self.handle_task(self._buffer.popleft())
+        except KeyboardInterrupt:
+            logger.warning(f"再次收到中断信号，放弃预取缓冲中的 {len(self._buffer)} 个任务，租约到期后将由服务端重新入队: "
+                           f"{', '.join(t['taskId'] for t in self._buffer)}")
+            
+        if self._stopping.is_set():
+            self.print_stats()
+            print("\n👋 工作器已安全退出")
+                
+    def run_pool(self):
+        """
+        并发池模式主循环
+        
+        最多同时领取 concurrency 个任务：下载和上传在线程槽位中执行，
+        语音识别提交到进程池。收到 Ctrl+C 后停止领取新任务，
+        等待进行中的任务完成后退出；再次 Ctrl+C 则放弃排空立即退出。
+        """
+        slots = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='slot')
+        self.transcribe_pool = ProcessPoolExecutor(
+            max_workers=self.transcribe_workers,
+            initializer=_ignore_sigint
+        )
+        logger.info(f"并发池已启动: {self.concurrency} 个任务槽位, {self.transcribe_workers} 个识别进程")
+        
+        in_flight = set()
+        consecutive_failures = 0
+        max_failures = 5
+        
+        try:
+            while not self._stopping.is_set():
+                try:
+                    in_flight = {f for f in in_flight if not f.done()}
+                    
+                    # 槽位已满，等待任一任务完成
+                    if len(in_flight) >= self.concurrency:
+                        wait(in_flight, return_when=FIRST_COMPLETED)
+                        continue
+                        
+                    task = self.get_pending_task(self.concurrency - len(in_flight))
+                    
+                    if not task:
+                        delay = self.backoff.next_delay()
+                        logger.info(f"暂无待处理任务，{delay:.1f} 秒后重试... (进行中: {len(in_flight)})")
+                        if in_flight:
+                            wait(in_flight, timeout=delay, return_when=FIRST_COMPLETED)
+                        else:
+                            self._stopping.wait(delay)
+                        consecutive_failures = 0  # 重置失败计数
+                        continue
+                        
+                    self.backoff.reset()
+                    
+                    in_flight.add(slots.submit(self.handle_task, task))
+                    consecutive_failures = 0
+                    
+                except KeyboardInterrupt:
+                    raise
+                    
+                except Exception as e:
+                    consecutive_failures += 1
+                    logger.error(f"工作器运行错误: {e}")
+                    
+                    if consecutive_failures >= max_failures:
+                        logger.critical(f"连续失败 {max_failures} 次，工作器退出")
+                        break
+                        
+                    logger.info(f"等待 {self.poll_interval * 2} 秒后重试...")
+                    self._stopping.wait(self.poll_interval * 2)
+                    
+        except KeyboardInterrupt:
+            logger.info(f"收到中断信号，停止领取新任务，等待 {len(in_flight)} 个进行中的任务完成...")
+            
+        # 已领取但未开始的任务也要处理完，否则会停留在 processing 状态
+        while self._buffer:
+            in_flight.add(slots.submit(self.handle_task, self._buffer.popleft()))
+            
+        try:
+            wait(in_flight)
+            slots.shutdown(wait=True)
+            self.transcribe_pool.shutdown(wait=True)
+        except KeyboardInterrupt:
+            logger.warning("再次收到中断信号，放弃未完成的任务")
+            slots.shutdown(wait=False, cancel_futures=True)
+            self.transcribe_pool.shutdown(wait=False, cancel_futures=True)
+        finally:
+            self.transcribe_pool = None
+            
+        self.print_stats()
+        print("\n👋 工作器已安全退出")
 
 
 def main():
@@ -277,11 +652,27 @@ def main():
     print("🎬 Bilibili 视频转文字工作器")
     print("=" * 40)
     
-    # 从环境变量或命令行参数获取配置
-    api_url = os.getenv('API_BASE_URL')
+    parser = argparse.ArgumentParser(description="Bilibili 视频转文字工作器")
+    parser.add_argument('api_url', nargs='?', help="API 基础URL (例如: https://your-app.vercel.app)")
+    parser.add_argument(
+        '--concurrency', type=int,
+        default=int(os.getenv('WORKER_CONCURRENCY', '1')),
+        help="同时处理的任务数（默认读取 WORKER_CONCURRENCY，否则为 1）"
+    )
+    parser.add_argument(
+        '--prefetch', type=int,
+        default=int(os.getenv('WORKER_PREFETCH', '0')),
+        help="批量领取时额外预取的任务数（默认读取 WORKER_PREFETCH，否则为 0）"
+    )
+    parser.add_argument(
+        '--metrics-port', type=int,
+        default=int(os.getenv('METRICS_PORT', '0')),
+        help="在该端口暴露 Prometheus 格式的 /metrics（默认读取 METRICS_PORT，0 表示不开启）"
+    )
+    args = parser.parse_args()
     
-    if not api_url and len(sys.argv) > 1:
-        api_url = sys.argv[1]
+    # 从环境变量或命令行参数获取配置
+    api_url = os.getenv('API_BASE_URL') or args.api_url
         
     if not api_url:
         print("❌ 请提供 API URL")
@@ -293,10 +684,12 @@ def main():
         print("   python worker.py")
         print("\n示例:")
         print("   python worker.py https://bilibili-transcript.vercel.app")
+        print("   python worker.py https://bilibili-transcript.vercel.app --concurrency 8")
         sys.exit(1)
         
-    # 轮询间隔
+    # 空闲退避上限和长轮询时长
     poll_interval = int(os.getenv('POLL_INTERVAL', '5'))
+    long_poll = int(os.getenv('LONG_POLL_SECONDS', '20'))
     
     # 验证 URL 格式
     if not api_url.startswith(('http://', 'https://')):
@@ -304,12 +697,18 @@ def main():
         sys.exit(1)
     
     print(f"✅ API URL: {api_url}")
-    print(f"✅ 轮询间隔: {poll_interval}秒")
+    print(f"✅ 空闲退避上限: {poll_interval}秒")
+    print(f"✅ 长轮询: {long_poll}秒")
+    print(f"✅ 并发任务数: {args.concurrency}")
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+        print(f"✅ 指标端点: http://localhost:{args.metrics_port}/metrics")
     print()
     
     # 创建并运行工作器
     try:
-        worker = BilibiliTranscriptWorker(api_url, poll_interval)
+        worker = BilibiliTranscriptWorker(api_url, poll_interval, concurrency=args.concurrency,
+                                          prefetch=args.prefetch, long_poll=long_poll)
         worker.run()
     except Exception as e:
         logger.critical(f"工作器启动失败: {e}")
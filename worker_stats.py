@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+工作器统计
+worker.py 与 async_worker.py 共用：按结果来源计数成功 / 失败的任务（线程安全），并打印统计信息
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import metrics
+
+
+class WorkerStats:
+    def __init__(self, print_every: int = 10):
+        """
+        Args:
+            print_every: 每处理多少个任务打印一次统计，0 表示不自动打印
+        """
+        self.print_every = print_every
+        self.total_processed = 0
+        self.successful = 0
+        self.failed = 0
+        self.sources: Dict[str, int] = {}
+        self.start_time = datetime.now()
+        self._lock = threading.Lock()
+
+    def record(self, success: bool, source: Optional[str] = None) -> bool:
+        """记录一次任务结果，返回是否到了该打印统计的时候"""
+        metrics.TASKS.inc(outcome='completed' if success else 'failed', source=source or 'none')
+        with self._lock:
+            self.total_processed += 1
+            if success:
+                self.successful += 1
+            else:
+                self.failed += 1
+            if source:
+                self.sources[source] = self.sources.get(source, 0) + 1
+            return bool(self.print_every) and self.total_processed % self.print_every == 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'total_processed': self.total_processed,
+                'successful': self.successful,
+                'failed': self.failed,
+                'sources': dict(self.sources),
+                'start_time': self.start_time,
+            }
+
+    def print(self, cache: Any = None):
+        """打印统计信息；cache 为 TranscriptCache 时附带缓存命中率"""
+        stats = self.snapshot()
+        runtime = datetime.now() - stats['start_time']
+        print(f"\n{'='*50}")
+        print(f"📊 工作器统计信息")
+        print(f"{'='*50}")
+        print(f"运行时间: {runtime}")
+        print(f"总处理任务: {stats['total_processed']}")
+        print(f"成功处理: {stats['successful']}")
+        print(f"处理失败: {stats['failed']}")
+        if stats['total_processed'] > 0:
+            success_rate = (stats['successful'] / stats['total_processed']) * 100
+            print(f"成功率: {success_rate:.1f}%")
+        if stats['sources']:
+            print("结果来源: " + ", ".join(
+                f"{name} {count} ({count / stats['successful']:.0%})"
+                for name, count in sorted(stats['sources'].items(), key=lambda item: -item[1])
+            ))
+        if cache:
+            cache_stats = cache.stats()
+            print(f"缓存命中/未命中: {cache_stats['hits']}/{cache_stats['misses']} "
+                  f"(命中率 {cache_stats['hit_rate']:.1%}, {cache_stats['entries']} 条)")
+        print(f"{'='*50}\n")